@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+"""
+Measures the cold start of the command line tools with `python -X importtime`, by running each of them with --help.
+
+A tool fails when its cumulative import time exceeds the budget, or when it imports one of the heavy
+dependencies (uart libs, numpy, ...) that are only needed once the tool actually does something.
+
+Usage:
+    python3 benchmarks/cli_startup.py [--budget 60] [--runs 5] [--verbose]
+
+Returns a non zero exit code when a tool is over budget, so it can be used in CI.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# console_scripts of setup.py: name -> module with a main() function.
+entryPoints = {
+    "cs_bluenet_log_client": "crownstone_devtools.scripts.cs_bluenet_log_client",
+    "cs_bluenet_extract_log_strings": "crownstone_devtools.scripts.cs_bluenet_extract_log_strings",
+    "cs_microapp_create_header": "crownstone_devtools.scripts.cs_microapp_create_header",
+    "cs_rssi_neighbour_parser": "crownstone_devtools.rssi.cs_rssi_neighbour_parser",
+    "cs_rssi_extract_features": "crownstone_devtools.rssi.cs_rssi_extract_features",
+    "cs_rssi_rollup": "crownstone_devtools.rssi.cs_rssi_rollup",
+}
+
+# top level packages that must not be imported just to show --help.
+heavyModules = [
+    "crownstone_uart", "crownstone_ble", "bluenet_logs", "sshkeyboard", "serial",
+    "pkg_resources", "numpy", "pyarrow", "yaml", "zstandard", "asyncio",
+]
+
+repositoryDirectory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measureImports(module):
+    """
+    Runs `module --help` in a fresh interpreter.
+    Returns (imports, modules): a dict with the cumulative import time in microseconds of each top level import,
+    and the set of all imported modules.
+    """
+    code = F"import sys; sys.argv = ['{module}', '--help']; from {module} import main; main()"
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [repositoryDirectory, env.get("PYTHONPATH")]))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=env, universal_newlines=True)
+
+    # import time: self [us] | cumulative | imported package
+    imports = {}
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            cumulative = int(fields[1])
+        except ValueError:
+            # the header line
+            continue
+        name = fields[2]
+        modules.add(name.strip())
+        if not name.startswith("  "):
+            imports[name.strip()] = cumulative
+    return imports, modules
+
+
+def main():
+    argParser = argparse.ArgumentParser(description="Cold start benchmark of the command line tools.")
+    argParser.add_argument("--budget", type=float, default=60.0,
+                           help="maximum cumulative import time per tool in milliseconds, default: 60")
+    argParser.add_argument("--runs", type=int, default=5,
+                           help="number of runs per tool, the fastest run counts. default: 5")
+    argParser.add_argument("--verbose", "-v", action="store_true",
+                           help="print the slowest top level imports of each tool")
+    args = argParser.parse_args()
+
+    failed = False
+    print(F"{'tool':<32} {'imports [ms]':>12}  result")
+    for name, module in entryPoints.items():
+        runs = [measureImports(module) for _ in range(args.runs)]
+        imports, modules = min(runs, key=lambda run: sum(run[0].values()))
+        total = sum(imports.values()) / 1000
+
+        heavy = sorted(set(imported.split(".")[0] for imported in modules) & set(heavyModules))
+        result = "ok"
+        if heavy:
+            result = F"imports {', '.join(heavy)}"
+        elif total > args.budget:
+            result = F"over budget ({args.budget:.0f} ms)"
+        failed = failed or result != "ok"
+
+        print(F"{name:<32} {total:>12.1f}  {result}")
+        if args.verbose:
+            for imported, cumulative in sorted(imports.items(), key=lambda item: -item[1])[:5]:
+                print(F"    {cumulative / 1000:>8.1f} ms  {imported}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
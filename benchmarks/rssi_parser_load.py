@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+
+"""
+Load test of cs_rssi_neighbour_parser: drives the parser with simulated dev boards (see rssi/FakeDevBoard.py)
+at increasing message rates, and reports the throughput, latency and lost messages per rate.
+
+Latency is measured end to end: from the moment a message is written to the pseudo terminal until the time stamp
+the parser gives it in the log. Messages that the fake board drops on purpose (mesh drops) are not counted as lost.
+
+Usage:
+    python3 benchmarks/rssi_parser_load.py [--rates 100 500 1000 2000] [--duration 10] [--nodes 10] [--boards 1]
+
+With one board the parser reads through crownstone_uart, with more boards through its own UartPortReaders.
+Returns a non zero exit code when no rate was sustained, i.e. every rate lost messages or exceeded --maxLatency.
+"""
+import argparse
+import datetime
+import glob
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+
+repositoryDirectory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repositoryDirectory)
+
+from crownstone_devtools.rssi.FakeDevBoard import FakeDevBoard
+
+
+class LoadTest:
+    def __init__(self, boards, logDirectory, warmupTimeout=30.0):
+        self.boards = boards
+        self.logDirectory = logDirectory
+        self.warmupTimeout = warmupTimeout
+
+        # (receiverId, senderId, msgNumber) -> send times of the messages that were not logged yet.
+        # msgNumber wraps, so the same key can be in flight more than once: matched first in, first out.
+        self.inFlight = defaultdict(deque)
+        self.lock = threading.Lock()
+        self.logOffset = 0
+        self.logBuffer = b""
+        for board in boards:
+            board.onSend = self.onSend
+
+    def onSend(self, key, sendTime):
+        with self.lock:
+            self.inFlight[key].append(sendTime)
+
+    def inFlightCount(self):
+        with self.lock:
+            return sum(len(sendTimes) for sendTimes in self.inFlight.values())
+
+    def readLog(self):
+        """
+        Returns the records that were logged since the last call, as (receiveTime, key) tuples.
+        """
+        paths = sorted(glob.glob(os.path.join(self.logDirectory, "NeighborRssiLog_*.csv")))
+        if not paths:
+            return []
+        with open(paths[-1], "rb") as logFile:
+            logFile.seek(self.logOffset)
+            data = self.logBuffer + logFile.read()
+            self.logOffset = logFile.tell()
+
+        lines = data.split(b"\n")
+        self.logBuffer = lines.pop()
+        records = []
+        for line in lines:
+            fields = line.decode().split(",")
+            if line.startswith(b"#") or len(fields) < 7:
+                continue
+            try:
+                receiveTime = datetime.datetime.fromisoformat(fields[0]).timestamp()
+                records.append((receiveTime, (int(fields[1]), int(fields[2]), int(fields[6]))))
+            except ValueError:
+                continue
+        return records
+
+    def match(self, records, latencies):
+        """ Matches logged records with sent messages. Returns the number of records without a sent message. """
+        unknown = 0
+        with self.lock:
+            for receiveTime, key in records:
+                sendTimes = self.inFlight.get(key)
+                if not sendTimes:
+                    unknown += 1
+                    continue
+                latencies.append(receiveTime - sendTimes.popleft())
+        return unknown
+
+    def warmup(self):
+        """ Sends messages at a low rate until the parser logs them, and forgets about them. """
+        for board in self.boards:
+            board.setRate(20)
+        deadline = time.monotonic() + self.warmupTimeout
+        while not self.readLog():
+            if time.monotonic() > deadline:
+                raise TimeoutError("the parser didn't log any message, is it reading the fake dev board?")
+            time.sleep(0.2)
+        for board in self.boards:
+            board.setRate(0)
+        time.sleep(1.0)
+        self.readLog()
+        with self.lock:
+            self.inFlight.clear()
+
+    def runStep(self, rate, duration, drainTimeout):
+        """
+        Sends messages at `rate` per second (divided over the boards) for `duration` seconds, then waits until all
+        messages are logged or nothing was logged for `drainTimeout` seconds.
+        """
+        statisticsBefore = [board.statistics() for board in self.boards]
+        latencies = []
+        unknown = 0
+        received = 0
+
+        startTime = time.monotonic()
+        for board in self.boards:
+            board.setRate(rate / len(self.boards))
+        while time.monotonic() - startTime < duration:
+            time.sleep(0.1)
+            records = self.readLog()
+            received += len(records)
+            unknown += self.match(records, latencies)
+        for board in self.boards:
+            board.setRate(0)
+        sendDuration = time.monotonic() - startTime
+
+        lastProgress = time.monotonic()
+        while self.inFlightCount() and time.monotonic() - lastProgress < drainTimeout:
+            time.sleep(0.1)
+            records = self.readLog()
+            if records:
+                lastProgress = time.monotonic()
+            received += len(records)
+            unknown += self.match(records, latencies)
+        totalDuration = time.monotonic() - startTime
+
+        statistics = [board.statistics() for board in self.boards]
+        difference = lambda name: sum(after[name] - before[name] for before, after in zip(statisticsBefore, statistics))
+        lost = self.inFlightCount()
+        with self.lock:
+            self.inFlight.clear()
+
+        latencies.sort()
+        percentile = lambda p: latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000 if latencies else float("nan")
+        return {
+            "rate": rate,
+            "sent": difference("sent"),
+            "sentRate": difference("sent") / sendDuration,
+            # including the messages that were dropped on purpose or didn't fit.
+            "offeredRate": (difference("sent") + difference("meshDrops") + difference("overflowDrops")) / sendDuration,
+            "received": received,
+            "throughput": received / totalDuration,
+            "lost": lost,
+            "unknown": unknown,
+            "meshDrops": difference("meshDrops"),
+            "overflowDrops": difference("overflowDrops"),
+            "p50": percentile(50),
+            "p90": percentile(90),
+            "p99": percentile(99),
+            "max": latencies[-1] * 1000 if latencies else float("nan"),
+        }
+
+
+def main():
+    argParser = argparse.ArgumentParser(description="Load test of cs_rssi_neighbour_parser with simulated dev boards.")
+    argParser.add_argument("--rates", type=float, nargs="+", default=[100, 250, 500, 1000, 2000],
+                           help="total messages per second of each step, default: 100 250 500 1000 2000")
+    argParser.add_argument("--duration", type=float, default=10.0, help="seconds per step, default: 10")
+    argParser.add_argument("--nodes", type=int, default=10, help="crownstones in the mesh of each board, default: 10")
+    argParser.add_argument("--boards", type=int, default=1, help="number of simulated dev boards, default: 1")
+    argParser.add_argument("--burst", type=int, default=1, help="messages per burst, default: 1")
+    argParser.add_argument("--poisson", action="store_true", help="exponentially distributed time between bursts")
+    argParser.add_argument("--dropProbability", type=float, default=0.0, help="probability of a mesh drop")
+    argParser.add_argument("--dropEvery", type=int, default=0, help="drop every nth message of each pair")
+    argParser.add_argument("--baudrate", type=int, default=230400, help="byte rate limit of the boards, 0 for none")
+    argParser.add_argument("--maxLatency", type=float, default=500.0,
+                           help="p99 latency in ms above which a rate is not sustained, default: 500")
+    argParser.add_argument("--drainTimeout", type=float, default=5.0,
+                           help="seconds to wait for the last messages of a step, default: 5")
+    argParser.add_argument("--verbose", "-v", action="store_true", help="show the output of the parser")
+    args = argParser.parse_args()
+
+    boards = [FakeDevBoard(nodes=args.nodes, firstNodeId=1 + index * args.nodes, rate=0, burst=args.burst,
+                           poisson=args.poisson, dropProbability=args.dropProbability, dropEvery=args.dropEvery,
+                           baudrate=args.baudrate, seed=index)
+              for index in range(args.boards)]
+    for board in boards:
+        board.start()
+
+    with tempfile.TemporaryDirectory(prefix="rssi_parser_load_") as logDirectory:
+        command = [sys.executable, "-m", "crownstone_devtools.rssi.cs_rssi_neighbour_parser",
+                   "-o", logDirectory, "--no_escape"]
+        for board in boards:
+            command += ["-p", board.port]
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [repositoryDirectory, env.get("PYTHONPATH")]))
+        output = None if args.verbose else subprocess.DEVNULL
+        parser = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=output, stderr=output, env=env)
+
+        results = []
+        try:
+            loadTest = LoadTest(boards, logDirectory)
+            loadTest.warmup()
+
+            print(F"{'rate':>7} {'sent/s':>8} {'logged/s':>9} {'lost':>6} {'overflow':>8} {'dropped':>7} "
+                  F"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+            for rate in args.rates:
+                result = loadTest.runStep(rate, args.duration, args.drainTimeout)
+                results.append(result)
+                print(F"{result['rate']:>7.0f} {result['sentRate']:>8.1f} {result['throughput']:>9.1f} "
+                      F"{result['lost']:>6} {result['overflowDrops']:>8} {result['meshDrops']:>7} "
+                      F"{result['p50']:>8.1f} {result['p90']:>8.1f} {result['p99']:>8.1f} {result['max']:>8.1f}", flush=True)
+                if result["offeredRate"] < 0.95 * rate:
+                    print("        the boards couldn't send at this rate, see --baudrate")
+                if result["unknown"]:
+                    print(F"        {result['unknown']} logged records didn't match a sent message")
+        finally:
+            parser.send_signal(signal.SIGINT)
+            try:
+                parser.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                parser.kill()
+            for board in boards:
+                board.close()
+
+    sustained = [result["rate"] for result in results
+                 if result["lost"] == 0 and result["overflowDrops"] == 0 and result["p99"] <= args.maxLatency
+                 and result["offeredRate"] >= 0.95 * result["rate"]]
+    if sustained:
+        print(F"highest sustained rate: {max(sustained):.0f} msg/s")
+    else:
+        print("no rate was sustained")
+    sys.exit(0 if sustained else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import datetime
+import logging
+import sys
+
+from bluenet_logs import BluenetLogs
+
+from crownstone_devtools.logclient.LogFormatDescriptor import CompiledLogFormat, compileLogFormat
+from crownstone_devtools.logclient.LogStrings import loadLogDescriptors
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class CompiledBluenetLogs(BluenetLogs):
+    """
+    BluenetLogs that formats logs with the format descriptors of the log strings file, see LogFormatDescriptor.
+    Log strings files without descriptors, from an older cs_bluenet_extract_log_strings, are compiled on import.
+    Logs without a descriptor and log arrays are formatted by BluenetLogs.
+
+    Relies on the internals of BluenetLogs: the log strings tables, its LogFormatter and the _onLog and
+    _importLogStringsFile methods.
+    """
+    def __init__(self):
+        # Key:   (filename hash, line number)
+        # Value: CompiledLogFormat
+        self._compiledLogs = {}
+        super().__init__()
+
+    def _importLogStringsFile(self):
+        result = super()._importLogStringsFile()
+        try:
+            descriptors = loadLogDescriptors(self._logStringsFileName)
+        except Exception as e:
+            _LOGGER.warning(f"Failed to import log format descriptors from {self._logStringsFileName}: {e}")
+            descriptors = {}
+
+        self._compiledLogs = {}
+        for fileNameHash, logs in self._logs.items():
+            fileDescriptors = descriptors.get(fileNameHash, {})
+            for lineNr, logFormat in logs.items():
+                descriptor = fileDescriptors[lineNr] if lineNr in fileDescriptors else compileLogFormat(logFormat)
+                if descriptor is not None:
+                    self._compiledLogs[(fileNameHash, lineNr)] = CompiledLogFormat(descriptor)
+        return result
+
+    def _onLog(self, data):
+        if not self._isLogStringsFileSet():
+            return
+
+        self._updateLogStrings()
+        header = data.header
+        compiledLog = self._compiledLogs.get((header.fileNameHash, header.lineNr))
+        fileName = self._fileNames.get(header.fileNameHash)
+        if compiledLog is None or fileName is None:
+            super()._onLog(data)
+            return
+
+        logStr = compiledLog.format(data.argBufs)
+
+        # Same output as LogFormatter.printLog.
+        logFormatter = self._logFormatter
+        if logFormatter._printPrefix:
+            logStr = logFormatter._getPrefix(datetime.datetime.now(), fileName, header.lineNr, header.logLevel) + logStr
+        sys.stdout.write(logStr)
+        if header.newLine:
+            # Next line should be prefixed.
+            logFormatter._printPrefix = True
+            sys.stdout.write(logFormatter._getEndColor())
+            sys.stdout.write('\n')
+        else:
+            logFormatter._printPrefix = False
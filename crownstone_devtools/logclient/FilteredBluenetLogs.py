@@ -0,0 +1,48 @@
+import time
+
+from crownstone_devtools.logclient.CompiledBluenetLogs import CompiledBluenetLogs
+
+
+class FilteredBluenetLogs(CompiledBluenetLogs):
+    """
+    CompiledBluenetLogs that drops logs which don't pass a LogFilter, before they are looked up and formatted.
+
+    Relies on the internals of BluenetLogs: the log strings tables and the _onLog, _onLogArray and
+    _importLogStringsFile methods.
+
+    Logs are filtered on the keys of the current log strings file, so it is checked for changes before filtering,
+    at most once per `reloadInterval` seconds. Otherwise a rebuild that moves the allowed logs to other lines would
+    have them all dropped, without a log reaching the reload in BluenetLogs.
+    """
+    reloadInterval = 1.0
+
+    def __init__(self, logFilter):
+        self.logFilter = logFilter
+        self.nextReloadCheck = 0.0
+        super().__init__()
+
+    def _checkLogStrings(self):
+        now = time.monotonic()
+        if now >= self.nextReloadCheck and self._isLogStringsFileSet():
+            self.nextReloadCheck = now + self.reloadInterval
+            self._updateLogStrings()
+
+    def _importLogStringsFile(self):
+        # the log strings file is imported again when it changes, so the filter has to be compiled again as well.
+        result = super()._importLogStringsFile()
+        self.logFilter.compile(self._fileNames, self._logs, self._logArrays)
+        return result
+
+    def _onLog(self, data):
+        self._checkLogStrings()
+        header = data.header
+        if not self.logFilter.allows(header.fileNameHash, header.lineNr, header.logLevel):
+            return
+        super()._onLog(data)
+
+    def _onLogArray(self, data):
+        self._checkLogStrings()
+        header = data.header
+        if not self.logFilter.allows(header.fileNameHash, header.lineNr, header.logLevel):
+            return
+        super()._onLogArray(data)
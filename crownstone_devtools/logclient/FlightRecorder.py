@@ -0,0 +1,325 @@
+"""
+Keeps the last binary logs in a fixed size ring buffer, and only decodes them when something goes wrong.
+
+Meant for long soak tests: logs are stored as the raw uart payload with a receive timestamp, and are not formatted
+or printed. When a trigger fires, the buffer is decoded and written to a file in `outputDirectory`. Triggers:
+- a regular expression that matches a line of plaintext output, see `plaintextRegex`.
+- a log statement that is received, see `triggerLines`.
+- `trigger()`, e.g. called on a signal or keypress by cs_bluenet_log_client.
+
+The buffer is allocated once, so memory stays the same however long the run is: the oldest records are
+overwritten. A record is a 12 byte header (8B timestamp, 2B op code, 2B payload size) followed by the payload.
+Plaintext output is stored as records too, so it shows up in the dump between the logs.
+"""
+import datetime
+import io
+import os
+import re
+import struct
+import threading
+import time
+from contextlib import redirect_stdout
+from fnmatch import fnmatch
+
+from crownstone_devtools.logclient.LogFormatDescriptor import CompiledLogFormat, compileLogFormat
+from crownstone_devtools.logclient.LogStatistics import logLevelNames
+from crownstone_devtools.logclient.LogStrings import loadLogDescriptors, loadLogStrings
+
+recordHeader = struct.Struct("<dHH")
+
+# Op code of the records with plaintext output, not used by the uart protocol.
+PLAINTEXT_OP_CODE = 0xFFFF
+
+# Plaintext lines longer than this are cut, so a missing newline doesn't grow the line buffer.
+MAX_PLAINTEXT_LINE = 4096
+
+
+def parseSize(value):
+    """
+    Returns the number of bytes for a size like 4096, 512k, 64M or 1G.
+    """
+    value = str(value).strip()
+    multipliers = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+    multiplier = 1
+    if value and value[-1].lower() in multipliers:
+        multiplier = multipliers[value[-1].lower()]
+        value = value[:-1]
+    size = int(float(value) * multiplier)
+    if size < recordHeader.size + 1:
+        raise ValueError(F"flight recorder size must be at least {recordHeader.size + 1} bytes, got {size}")
+    return size
+
+
+def parseTriggerLine(value):
+    """
+    Parses "file:line" into (file pattern, line number), e.g. "cs_MeshCore.cpp:120".
+    """
+    fileName, separator, lineNr = str(value).rpartition(":")
+    if not separator or not fileName:
+        raise ValueError(F"trigger line must be formatted as file:line, got {value}")
+    return fileName, int(lineNr)
+
+
+class FlightRecorder:
+    def __init__(self, size, logStringsFileName=None, outputDirectory=".", plaintextRegex=None, triggerLines=None):
+        """
+        size: size of the ring buffer in bytes.
+        logStringsFileName: used to resolve triggerLines, and to decode the logs when dumping.
+        outputDirectory: where the dumps are written.
+        plaintextRegex: dump when a line of plaintext output matches this regular expression.
+        triggerLines: list of (file pattern, line number), dump when one of these log statements is received.
+            The pattern is matched against the full file name and its base name.
+        """
+        self.size = size
+        self.buffer = bytearray(size)
+        self.logStringsFileName = logStringsFileName
+        self.outputDirectory = outputDirectory
+        self.plaintextRegex = re.compile(plaintextRegex) if plaintextRegex else None
+        self.triggerLines = list(triggerLines or [])
+
+        # write position of the next record, and position of the oldest record.
+        self.head = 0
+        self.tail = 0
+        self.used = 0
+        self.recordCount = 0
+        self.overwrittenRecords = 0
+        self.lock = threading.Lock()
+
+        self.plaintextLine = bytearray()
+        # reason of the trigger, the dump is written by tick() so that it's not done on the uart thread.
+        self.triggerReason = None
+
+        # (file hash, line number) of triggerLines, resolved in subscribe().
+        self.triggerKeys = set()
+
+        self.logOpCode = None
+        self.logArrayOpCode = None
+
+    def subscribe(self):
+        """ Starts recording the log messages and plaintext output of the uart lib. """
+        from crownstone_uart import UartEventBus
+        from crownstone_uart.core.uart.UartTypes import UartRxType
+        from crownstone_uart.topics.SystemTopics import SystemTopics
+
+        self.logOpCode = UartRxType.LOG
+        self.logArrayOpCode = UartRxType.LOG_ARRAY
+        self.resolveTriggerLines()
+        UartEventBus.subscribe(SystemTopics.uartNewMessage, self.onUartMessage)
+        UartEventBus.subscribe(SystemTopics.uartDiscardedData, self.onPlaintext)
+
+    def resolveTriggerLines(self):
+        if not self.triggerLines:
+            return
+        fileNames, _, _ = loadLogStrings(self.logStringsFileName)
+        for pattern, lineNr in self.triggerLines:
+            matches = [fileNameHash for fileNameHash, fileName in fileNames.items()
+                       if fnmatch(fileName, pattern) or fnmatch(os.path.basename(fileName), pattern)]
+            if not matches:
+                print(f"Flight recorder: no file matches trigger {pattern}:{lineNr}")
+            self.triggerKeys.update((fileNameHash, lineNr) for fileNameHash in matches)
+
+    def onUartMessage(self, messagePacket):
+        """ UartEventBus callback, called for every uart message, so keep it cheap. """
+        opCode = messagePacket.opCode
+        if opCode != self.logOpCode and opCode != self.logArrayOpCode:
+            return
+        payload = messagePacket.payload
+        self.record(opCode, payload)
+        if self.triggerKeys and len(payload) >= 6:
+            key = (payload[0] | payload[1] << 8 | payload[2] << 16 | payload[3] << 24, payload[4] | payload[5] << 8)
+            if key in self.triggerKeys:
+                self.trigger(F"log statement {key[0]:08X}:{key[1]}")
+
+    def onPlaintext(self, data):
+        """ UartEventBus callback for data that isn't a uart message: plaintext output. """
+        self.record(PLAINTEXT_OP_CODE, data)
+        if self.plaintextRegex is None:
+            return
+        for byte in data:
+            if byte == ord('\n'):
+                line = self.plaintextLine.decode(errors="replace")
+                self.plaintextLine.clear()
+                if self.plaintextRegex.search(line):
+                    self.trigger(F"plaintext: {line.strip()}")
+            elif len(self.plaintextLine) < MAX_PLAINTEXT_LINE:
+                self.plaintextLine.append(byte)
+
+    def record(self, opCode, payload):
+        """
+        Appends a record to the ring buffer, overwriting the oldest records if needed.
+        """
+        payload = bytes(payload)
+        recordSize = recordHeader.size + len(payload)
+        if recordSize > self.size or len(payload) > 0xFFFF:
+            return
+        header = recordHeader.pack(time.time(), opCode, len(payload))
+        with self.lock:
+            while self.size - self.used < recordSize:
+                # drop the oldest record
+                _, _, oldPayloadSize = recordHeader.unpack(self.read(self.tail, recordHeader.size))
+                oldRecordSize = recordHeader.size + oldPayloadSize
+                self.tail = (self.tail + oldRecordSize) % self.size
+                self.used -= oldRecordSize
+                self.recordCount -= 1
+                self.overwrittenRecords += 1
+            self.write(self.head, header)
+            self.write((self.head + recordHeader.size) % self.size, payload)
+            self.head = (self.head + recordSize) % self.size
+            self.used += recordSize
+            self.recordCount += 1
+
+    def write(self, position, data):
+        first = min(len(data), self.size - position)
+        self.buffer[position:position + first] = data[:first]
+        if first < len(data):
+            self.buffer[0:len(data) - first] = data[first:]
+
+    def read(self, position, size):
+        first = min(size, self.size - position)
+        data = self.buffer[position:position + first]
+        if first < size:
+            data += self.buffer[0:size - first]
+        return data
+
+    def records(self):
+        """
+        Returns the records in the buffer, oldest first, as (timestamp, op code, payload) tuples, and clears it.
+        """
+        with self.lock:
+            records = []
+            position = self.tail
+            for _ in range(self.recordCount):
+                timestamp, opCode, payloadSize = recordHeader.unpack(self.read(position, recordHeader.size))
+                position = (position + recordHeader.size) % self.size
+                records.append((timestamp, opCode, bytes(self.read(position, payloadSize))))
+                position = (position + payloadSize) % self.size
+            self.head = self.tail = self.used = self.recordCount = 0
+        return records
+
+    def trigger(self, reason):
+        """ Requests a dump, it is written at the next tick(). Can be called from any thread or a signal handler. """
+        if self.triggerReason is None:
+            self.triggerReason = reason
+
+    def tick(self):
+        """ Call regularly: writes the dump when a trigger fired. """
+        if self.triggerReason is not None:
+            reason, self.triggerReason = self.triggerReason, None
+            self.dump(reason)
+
+    def dump(self, reason):
+        """
+        Decodes the records in the buffer and writes them to a new file. Returns the path of the file.
+        """
+        records = self.records()
+        fileName = F"flight_recorder_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.log"
+        path = os.path.join(self.outputDirectory, fileName)
+        os.makedirs(self.outputDirectory, exist_ok=True)
+        with open(path, "w") as dumpFile:
+            dumpFile.write(F"# flight recorder dump, trigger: {reason}\n")
+            dumpFile.write(F"# {len(records)} records, {self.overwrittenRecords} older records were overwritten\n")
+            FlightRecorderDecoder(self.logStringsFileName).write(records, dumpFile)
+        self.overwrittenRecords = 0
+        print(f"Flight recorder: wrote {len(records)} records to {os.path.abspath(path)}, trigger: {reason}", flush=True)
+        return path
+
+
+class FlightRecorderDecoder:
+    """
+    Formats the records of a FlightRecorder, like cs_bluenet_log_client prints them, but with the time they were
+    received and without colors.
+    """
+    timestampFormat = "%Y-%m-%d %H:%M:%S.%f"
+
+    def __init__(self, logStringsFileName):
+        from bluenet_logs.LogFormatter import LogFormatter
+        from crownstone_uart.core.uart.UartTypes import UartRxType
+
+        self.logOpCode = UartRxType.LOG
+        self.logArrayOpCode = UartRxType.LOG_ARRAY
+        self.logFormatter = LogFormatter()
+        self.logFormatter.enableColors = False
+
+        self.fileNames, self.logs, self.logArrays = {}, {}, {}
+        descriptors = {}
+        if logStringsFileName:
+            try:
+                self.fileNames, self.logs, self.logArrays = loadLogStrings(logStringsFileName)
+                descriptors = loadLogDescriptors(logStringsFileName)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Failed to load log strings from {logStringsFileName}: {e}")
+        self.descriptors = descriptors
+        # (file hash, line number) -> CompiledLogFormat, or None if the format has no descriptor.
+        self.compiledLogs = {}
+
+    def compiledLog(self, key):
+        if key not in self.compiledLogs:
+            fileNameHash, lineNr = key
+            descriptor = self.descriptors.get(fileNameHash, {}).get(lineNr)
+            if descriptor is None:
+                descriptor = compileLogFormat(self.logs.get(fileNameHash, {}).get(lineNr))
+            self.compiledLogs[key] = CompiledLogFormat(descriptor) if descriptor is not None else None
+        return self.compiledLogs[key]
+
+    def write(self, records, outFile):
+        from crownstone_uart.core.uart.uartPackets.UartLogArrayPacket import UartLogArrayPacket
+        from crownstone_uart.core.uart.uartPackets.UartLogPacket import UartLogPacket
+
+        printPrefix = True
+        for timestamp, opCode, payload in records:
+            if opCode == PLAINTEXT_OP_CODE:
+                outFile.write(payload.decode(errors="replace"))
+                continue
+
+            try:
+                if opCode == self.logOpCode:
+                    packet = UartLogPacket(list(payload))
+                    logStr = self.formatLog(packet)
+                else:
+                    packet = UartLogArrayPacket(list(payload))
+                    logStr = self.formatLogArray(packet)
+            except Exception as e:
+                outFile.write(F"\n# failed to decode {payload.hex()}: {e}\n")
+                printPrefix = True
+                continue
+
+            header = packet.header
+            if printPrefix:
+                receiveTime = datetime.datetime.fromtimestamp(timestamp).strftime(self.timestampFormat)
+                fileName = self.fileNames.get(header.fileNameHash, F"0x{header.fileNameHash:08X}")
+                logStr = F"LOG: [{receiveTime}] [{fileName[-30:]:>30}:{header.lineNr:4n}] " \
+                         F"{logLevelNames.get(header.logLevel, ' ')} {logStr}"
+            outFile.write(logStr)
+            printPrefix = header.newLine
+            if header.newLine:
+                outFile.write("\n")
+
+    def formatLog(self, packet):
+        header = packet.header
+        key = (header.fileNameHash, header.lineNr)
+        compiledLog = self.compiledLog(key)
+        if compiledLog is not None:
+            return compiledLog.format(packet.argBufs)
+        logFormat = self.logs.get(header.fileNameHash, {}).get(header.lineNr)
+        if logFormat is None:
+            return F"<no log format, args: {packet.argBufs}>"
+        return self.capture(self.logFormatter.printLog, logFormat, "", header.lineNr, header.logLevel, False,
+                            packet.argBufs)
+
+    def formatLogArray(self, packet):
+        header = packet.header
+        formats = self.logArrays.get(header.fileNameHash, {}).get(header.lineNr)
+        if formats is None:
+            return F"<no log array format, elements: {packet.elementData}>"
+        startFormat, endFormat, separationFormat, elementFormat = formats
+        return self.capture(self.logFormatter.printLogArray, startFormat, endFormat, separationFormat, elementFormat,
+                            "", header.lineNr, header.logLevel, False, header.reverse, packet.elementType,
+                            packet.elementSize, packet.elementData)
+
+    def capture(self, printFunction, *args):
+        """ Returns what a LogFormatter print function prints, without its prefix. """
+        self.logFormatter._printPrefix = False
+        output = io.StringIO()
+        with redirect_stdout(output):
+            printFunction(*args)
+        return output.getvalue()
@@ -0,0 +1,145 @@
+"""
+Selects which binary logs the log client shows, by file, line, log level and format string.
+
+The options are compiled once against the extracted log strings into a set of allowed (file hash, line number)
+keys, so that a received log can be accepted or dropped with a single set lookup.
+"""
+import os
+import re
+from fnmatch import fnmatch
+
+# Log levels as used by bluenet: a lower number is more severe.
+logLevels = {
+    "verbose": 8,
+    "debug": 7,
+    "info": 6,
+    "warn": 5,
+    "error": 4,
+    "fatal": 3,
+}
+
+
+def parseLogLevel(value):
+    """
+    Returns the numeric log level for a name (info), its first letter (I) or a number (6).
+    """
+    value = str(value).strip().lower()
+    if value.isdigit():
+        return int(value)
+    for name, level in logLevels.items():
+        if value == name or value == name[0]:
+            return level
+    raise ValueError(F"unknown log level: {value}, expected one of {list(logLevels)}, their first letter, or a number")
+
+
+def parseLineRange(value):
+    """
+    Returns (first, last) for "100-200", or (150, 150) for "150". Both are inclusive.
+    """
+    first, separator, last = str(value).partition("-")
+    first = int(first)
+    last = int(last) if separator else first
+    if last < first:
+        raise ValueError(F"invalid line range: {value}")
+    return first, last
+
+
+class LogFilter:
+    def __init__(self, files=None, excludeFiles=None, lineRanges=None, minLevel=None, formatRegex=None):
+        """
+        files: glob patterns, matched against the full file name and its base name. None allows all files.
+        excludeFiles: glob patterns of files to leave out.
+        lineRanges: list of (first, last) inclusive line ranges. None allows all lines.
+        minLevel: least severe log level to show, e.g. logLevels["info"] also shows warnings and errors.
+        formatRegex: only show logs whose format string matches this regular expression.
+        """
+        self.files = list(files or [])
+        self.excludeFiles = list(excludeFiles or [])
+        self.lineRanges = list(lineRanges or [])
+        self.minLevel = minLevel
+        self.formatRegex = re.compile(formatRegex) if formatRegex else None
+
+        # The most verbose log level that is shown, bluenet log levels are at most 8.
+        self.maxLogLevel = minLevel if minLevel is not None else 255
+
+        # Set of (file hash, line number), see compile().
+        self.allowedKeys = frozenset()
+
+    @staticmethod
+    def fromArgs(args):
+        """ Creates a filter from the parsed command line arguments, see addArguments. """
+        return LogFilter(files=args.file,
+                         excludeFiles=args.excludeFile,
+                         lineRanges=args.lineRange,
+                         minLevel=args.minLevel,
+                         formatRegex=args.format)
+
+    @staticmethod
+    def addArguments(argParser):
+        argParser.add_argument('--file',
+                               dest='file',
+                               metavar='pattern',
+                               action='append',
+                               help='Only show logs of files matching this glob pattern, e.g. cs_MeshCore.cpp or "*mesh*". Can be repeated.')
+        argParser.add_argument('--exclude-file',
+                               dest='excludeFile',
+                               metavar='pattern',
+                               action='append',
+                               help='Hide logs of files matching this glob pattern. Can be repeated.')
+        argParser.add_argument('--line-range',
+                               dest='lineRange',
+                               metavar='first-last',
+                               type=parseLineRange,
+                               action='append',
+                               help='Only show logs at these lines, e.g. 100-200 or 150. Can be repeated.')
+        argParser.add_argument('--min-level',
+                               dest='minLevel',
+                               metavar='level',
+                               type=parseLogLevel,
+                               help='Only show logs at this level or more severe: verbose, debug, info, warn, error or fatal.')
+        argParser.add_argument('--format',
+                               dest='format',
+                               metavar='regex',
+                               type=str,
+                               help='Only show logs whose format string matches this regular expression.')
+
+    def isEnabled(self):
+        return bool(self.files or self.excludeFiles or self.lineRanges or self.minLevel is not None or self.formatRegex)
+
+    def compile(self, fileNames, logs, logArrays):
+        """
+        Computes the allowed keys from the log strings tables, as loaded by BluenetLogs:
+        fileNames: file hash -> file name
+        logs: file hash -> line number -> format
+        logArrays: file hash -> line number -> (startFormat, endFormat, separationFormat, elementFormat)
+        """
+        allowedKeys = set()
+        for fileNameHash, fileName in fileNames.items():
+            if not self.allowsFile(fileName):
+                continue
+            for lineNr, logFormat in logs.get(fileNameHash, {}).items():
+                if self.allowsLine(lineNr) and self.allowsFormat(logFormat):
+                    allowedKeys.add((fileNameHash, lineNr))
+            for lineNr, formats in logArrays.get(fileNameHash, {}).items():
+                if self.allowsLine(lineNr) and self.allowsFormat("".join(f for f in formats if f)):
+                    allowedKeys.add((fileNameHash, lineNr))
+        self.allowedKeys = frozenset(allowedKeys)
+        return self.allowedKeys
+
+    def allowsFile(self, fileName):
+        def matches(pattern):
+            return fnmatch(fileName, pattern) or fnmatch(os.path.basename(fileName), pattern)
+
+        if self.files and not any(matches(pattern) for pattern in self.files):
+            return False
+        return not any(matches(pattern) for pattern in self.excludeFiles)
+
+    def allowsLine(self, lineNr):
+        return not self.lineRanges or any(first <= lineNr <= last for first, last in self.lineRanges)
+
+    def allowsFormat(self, logFormat):
+        return self.formatRegex is None or self.formatRegex.search(logFormat) is not None
+
+    def allows(self, fileNameHash, lineNr, logLevel):
+        """ Whether a received log should be shown. """
+        return logLevel <= self.maxLogLevel and (fileNameHash, lineNr) in self.allowedKeys
@@ -0,0 +1,188 @@
+"""
+Pre-parsed printf style log formats, so that the log client doesn't have to interpret a format for every log.
+
+cs_bluenet_extract_log_strings compiles every format into a descriptor, stored next to the format as "log_desc":
+    segments: the literal text around the arguments, one more than there are arguments.
+    args: per argument [type, size, conversion]:
+        type: "i" signed integer, "u" unsigned integer, "f" float, "s" string.
+        size: size in bytes as fixed by the format (a length modifier, or 4 for a float), 0 when it depends on the
+            argument the firmware passes.
+        conversion: python ready conversion: a %-format like "%02X", or a str.format spec like "{:08b}".
+Formats that BluenetLogs can't format (e.g. %c, or a trailing %) get no descriptor, they are left to BluenetLogs.
+
+CompiledLogFormat formats the argument buffers of a log with a descriptor. Per combination of argument sizes
+it caches a struct that unpacks all arguments at once, so a log costs a lookup, one unpack and one %-format.
+The output equals that of the LogFormatter of BluenetLogs.
+"""
+import struct
+from itertools import chain
+
+# printf conversion -> (type, python conversion)
+conversionTypes = {
+    "d": ("i", "d"),
+    "i": ("i", "i"),
+    "u": ("u", "u"),
+    "x": ("u", "x"),
+    "X": ("u", "X"),
+    "o": ("u", "o"),
+    "p": ("u", "x"),  # python doesn't do %p
+    "b": ("u", "b"),
+    "f": ("f", "f"),
+    "F": ("f", "F"),
+    "e": ("f", "e"),
+    "E": ("f", "E"),
+    "g": ("f", "g"),
+    "G": ("f", "G"),
+    "s": ("s", "s"),
+}
+
+flagCharacters = "-+ #0123456789."
+
+# length modifier -> argument size on the (32 bit) firmware
+lengthModifiers = {
+    "hh": 1,
+    "h": 2,
+    "l": 4,
+    "ll": 8,
+    "L": 8,
+    "q": 8,
+    "j": 8,
+    "z": 4,
+    "t": 4,
+}
+
+# argument size -> struct code, per type
+structCodes = {
+    "i": {1: "b", 2: "h", 4: "i", 8: "q"},
+    "u": {1: "B", 2: "H", 4: "I", 8: "Q"},
+    "f": {4: "f"},
+}
+
+# value of an argument that is missing, or has a size that can't be decoded.
+defaultValues = {"i": 0, "u": 0, "f": 0.0, "s": ""}
+
+
+def compileLogFormat(logFormat):
+    """
+    Returns the descriptor of a printf style format, or None if it contains a conversion that can't be compiled.
+    """
+    if logFormat is None:
+        return None
+    segments = [""]
+    args = []
+    i = 0
+    while i < len(logFormat):
+        c = logFormat[i]
+        i += 1
+        if c != "%":
+            segments[-1] += c
+            continue
+        if i < len(logFormat) and logFormat[i] == "%":
+            segments[-1] += "%"
+            i += 1
+            continue
+
+        flags = ""
+        while i < len(logFormat) and logFormat[i] in flagCharacters:
+            flags += logFormat[i]
+            i += 1
+        modifier = ""
+        while i < len(logFormat) and logFormat[i] in "hlLqjzt":
+            modifier += logFormat[i]
+            i += 1
+        if i >= len(logFormat) or logFormat[i] not in conversionTypes:
+            return None
+        if modifier and modifier not in lengthModifiers:
+            return None
+
+        argType, pythonConversion = conversionTypes[logFormat[i]]
+        i += 1
+        size = lengthModifiers.get(modifier, 0) if argType in ("i", "u") else 0
+        if argType == "f":
+            size = 4
+        if pythonConversion == "b":
+            conversion = "{:" + flags + "b}"
+        else:
+            conversion = "%" + flags + pythonConversion
+        args.append([argType, size, conversion])
+        segments.append("")
+
+    return {"segments": segments, "args": args}
+
+
+class CompiledLogFormat:
+    def __init__(self, descriptor):
+        self.segments = descriptor["segments"]
+        self.types = [argType for argType, _, _ in descriptor["args"]]
+        self.conversions = [conversion for _, _, conversion in descriptor["args"]]
+        self.argCount = len(self.types)
+        self.stringIndices = [index for index, argType in enumerate(self.types) if argType == "s"]
+
+        # one %-format for the whole log, unless a conversion needs str.format.
+        self.template = None
+        if not any(conversion.startswith("{") for conversion in self.conversions):
+            escaped = [segment.replace("%", "%%") for segment in self.segments]
+            self.template = escaped[0] + "".join(conversion + segment
+                                                 for conversion, segment in zip(self.conversions, escaped[1:]))
+
+        # tuple of argument sizes -> struct that unpacks all arguments, or None if they can't be unpacked at once.
+        self.unpackers = {}
+        sizes = tuple(size for _, size, _ in descriptor["args"])
+        if self.argCount and all(sizes):
+            self.getUnpacker(sizes)
+
+    def getUnpacker(self, sizes):
+        unpacker = self.unpackers.get(sizes, False)
+        if unpacker is not False:
+            return unpacker
+        codes = "<"
+        for argType, size in zip(self.types, sizes):
+            if argType == "s":
+                codes += F"{size}s"
+                continue
+            code = structCodes[argType].get(size)
+            if code is None:
+                codes = None
+                break
+            codes += code
+        unpacker = struct.Struct(codes) if codes is not None else None
+        self.unpackers[sizes] = unpacker
+        return unpacker
+
+    def format(self, argBufs):
+        """
+        Returns the formatted log, argBufs are the buffers of the arguments as received.
+        """
+        if self.argCount == 0:
+            return self.segments[0]
+        values = None
+        if len(argBufs) >= self.argCount:
+            argBufs = argBufs[:self.argCount]
+            unpacker = self.getUnpacker(tuple(map(len, argBufs)))
+            if unpacker is not None:
+                # the buffers are lists of ints or bytes, depending on the uart lib.
+                values = list(unpacker.unpack(bytes(chain.from_iterable(argBufs))))
+                for index in self.stringIndices:
+                    values[index] = values[index].decode()
+        if values is None:
+            values = [self.decodeArg(index, argBufs[index] if index < len(argBufs) else None)
+                      for index in range(self.argCount)]
+
+        if self.template is not None:
+            return self.template % tuple(values)
+        result = self.segments[0]
+        for value, conversion, segment in zip(values, self.conversions, self.segments[1:]):
+            result += (conversion.format(value) if conversion.startswith("{") else conversion % value) + segment
+        return result
+
+    def decodeArg(self, index, argBuf):
+        """ Decodes a single argument, for the arguments that are missing or have an unexpected size. """
+        argType = self.types[index]
+        if argBuf is None:
+            return defaultValues[argType]
+        if argType == "s":
+            return bytes(argBuf).decode()
+        code = structCodes[argType].get(len(argBuf))
+        if code is None:
+            return defaultValues[argType]
+        return struct.unpack("<" + code, bytes(argBuf))[0]
@@ -0,0 +1,199 @@
+"""
+Counts binary logs per log statement, to find the statements that flood the uart.
+
+Messages are counted on the raw uart message, before the log is parsed or formatted: the file hash, line number
+and log level are read directly from the first bytes of the payload. Counts are kept per interval, the table shows
+the sum of the last `windowIntervals` intervals, the summary covers the whole run.
+"""
+import json
+import os
+import sys
+import time
+from collections import deque
+
+from crownstone_devtools.logclient.LogStrings import loadLogStrings
+
+# Log header: 4B file name hash, 2B line number, 1B log level, 1B flags.
+LOG_HEADER_SIZE = 8
+
+logLevelNames = {8: "V", 7: "D", 6: "I", 5: "W", 4: "E", 3: "F"}
+
+
+class LogStatistics:
+    def __init__(self, logStringsFileName=None, interval=5.0, windowIntervals=6, top=20, summaryFileName=None):
+        """
+        logStringsFileName: used to show file names and formats instead of hashes.
+        interval: seconds between two printed tables.
+        windowIntervals: number of intervals the table is computed over.
+        top: number of rows of the table.
+        summaryFileName: the json summary is written here at the end, None prints it.
+        """
+        self.logStringsFileName = logStringsFileName
+        self.interval = interval
+        self.top = top
+        self.summaryFileName = summaryFileName
+
+        # Key:   (file hash, line number)
+        # Value: [messages, bytes, log level, is array]
+        self.current = {}
+
+        # Counts of the previous intervals, the oldest is added to the totals when it drops out.
+        self.intervals = deque()
+        self.windowIntervals = windowIntervals
+        self.totals = {}
+
+        self.startTime = time.monotonic()
+        self.intervalStartTime = self.startTime
+        self.windowStartTimes = deque()
+
+        self.logOpCode = None
+        self.logArrayOpCode = None
+
+        # Loaded on first use, see describe().
+        self.fileNames = None
+        self.logs = None
+        self.logArrays = None
+
+    def subscribe(self):
+        """ Starts counting the log messages of the uart lib. """
+        from crownstone_uart import UartEventBus
+        from crownstone_uart.core.uart.UartTypes import UartRxType
+        from crownstone_uart.topics.SystemTopics import SystemTopics
+
+        self.logOpCode = UartRxType.LOG
+        self.logArrayOpCode = UartRxType.LOG_ARRAY
+        UartEventBus.subscribe(SystemTopics.uartNewMessage, self.onUartMessage)
+
+    def onUartMessage(self, messagePacket):
+        """ UartEventBus callback, called for every uart message, so keep it cheap. """
+        opCode = messagePacket.opCode
+        if opCode != self.logOpCode and opCode != self.logArrayOpCode:
+            return
+        payload = messagePacket.payload
+        if len(payload) < LOG_HEADER_SIZE:
+            return
+        self.count(payload[0] | payload[1] << 8 | payload[2] << 16 | payload[3] << 24,
+                   payload[4] | payload[5] << 8,
+                   payload[6],
+                   len(payload),
+                   opCode == self.logArrayOpCode)
+
+    def count(self, fileNameHash, lineNr, logLevel, size, isArray=False):
+        key = (fileNameHash, lineNr)
+        entry = self.current.get(key)
+        if entry is None:
+            self.current[key] = [1, size, logLevel, isArray]
+        else:
+            entry[0] += 1
+            entry[1] += size
+
+    def tick(self):
+        """ Call regularly: prints the table when an interval has passed. """
+        if time.monotonic() - self.intervalStartTime >= self.interval:
+            self.nextInterval()
+            self.printTable()
+
+    def nextInterval(self):
+        # Swapping the dict is atomic, counts that still arrive on the old dict are kept, as it stays referenced.
+        counts, self.current = self.current, {}
+        self.intervals.append(counts)
+        self.windowStartTimes.append(self.intervalStartTime)
+        self.intervalStartTime = time.monotonic()
+        while len(self.intervals) > self.windowIntervals:
+            self.addToTotals(self.intervals.popleft())
+            self.windowStartTimes.popleft()
+
+    @staticmethod
+    def addCounts(target, counts):
+        for key, (messages, size, logLevel, isArray) in list(counts.items()):
+            entry = target.get(key)
+            if entry is None:
+                target[key] = [messages, size, logLevel, isArray]
+            else:
+                entry[0] += messages
+                entry[1] += size
+
+    def addToTotals(self, counts):
+        self.addCounts(self.totals, counts)
+
+    def windowCounts(self):
+        window = {}
+        for counts in self.intervals:
+            self.addCounts(window, counts)
+        return window
+
+    def describe(self, key):
+        """ Returns (location, format) of a log statement, based on the log strings file. """
+        if self.fileNames is None:
+            self.fileNames, self.logs, self.logArrays = {}, {}, {}
+            if self.logStringsFileName:
+                try:
+                    self.fileNames, self.logs, self.logArrays = loadLogStrings(self.logStringsFileName)
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Failed to load log strings from {self.logStringsFileName}: {e}")
+
+        fileNameHash, lineNr = key
+        fileName = self.fileNames.get(fileNameHash, f"0x{fileNameHash:08X}")
+        logFormat = self.logs.get(fileNameHash, {}).get(lineNr)
+        if logFormat is None:
+            arrayFormat = self.logArrays.get(fileNameHash, {}).get(lineNr)
+            logFormat = "[array] " + " ".join(f for f in arrayFormat if f) if arrayFormat else ""
+        return f"{fileName}:{lineNr}", logFormat
+
+    def printTable(self):
+        window = self.windowCounts()
+        duration = max(self.intervalStartTime - self.windowStartTimes[0], 1e-6) if self.windowStartTimes else 1.0
+        totalBytes = sum(entry[1] for entry in window.values()) or 1
+        rows = sorted(window.items(), key=lambda item: -item[1][1])[:self.top]
+
+        lines = [f"Log hot spots over the last {duration:.0f} s, {len(window)} statements, "
+                 f"{sum(entry[0] for entry in window.values()) / duration:.0f} msg/s, {totalBytes / duration:.0f} B/s",
+                 f"{'msg/s':>8} {'B/s':>8} {'share':>6}  lvl  {'location':<40} format"]
+        for key, (messages, size, logLevel, isArray) in rows:
+            location, logFormat = self.describe(key)
+            lines.append(f"{messages / duration:>8.1f} {size / duration:>8.0f} {100 * size / totalBytes:>5.1f}%  "
+                         f" {logLevelNames.get(logLevel, ' ')}   {location[-40:]:<40} {logFormat[:60]}")
+
+        if sys.stdout.isatty():
+            # redraw the table in place
+            print("\033[2J\033[H", end="")
+        print("\n".join(lines), flush=True)
+
+    def summary(self):
+        """ Returns the totals of the whole run as a json serializable dict. """
+        totals = dict((key, list(entry)) for key, entry in self.totals.items())
+        for counts in list(self.intervals) + [self.current]:
+            self.addCounts(totals, counts)
+
+        duration = max(time.monotonic() - self.startTime, 1e-6)
+        statements = []
+        for key, (messages, size, logLevel, isArray) in sorted(totals.items(), key=lambda item: -item[1][1]):
+            location, logFormat = self.describe(key)
+            statements.append({
+                "file_hash": key[0],
+                "line_nr": key[1],
+                "location": location,
+                "log_fmt": logFormat,
+                "log_level": logLevel,
+                "array": isArray,
+                "messages": messages,
+                "bytes": size,
+                "messages_per_second": messages / duration,
+                "bytes_per_second": size / duration,
+            })
+        return {
+            "duration": duration,
+            "messages": sum(statement["messages"] for statement in statements),
+            "bytes": sum(statement["bytes"] for statement in statements),
+            "statements": statements,
+        }
+
+    def finish(self):
+        """ Writes or prints the json summary. """
+        summary = self.summary()
+        if self.summaryFileName:
+            with open(self.summaryFileName, "w") as summaryFile:
+                json.dump(summary, summaryFile, indent=2)
+            print(f"Wrote log statistics of {summary['messages']} messages to {os.path.abspath(self.summaryFileName)}")
+        else:
+            print(json.dumps(summary, indent=2))
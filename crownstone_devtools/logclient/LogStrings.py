@@ -0,0 +1,43 @@
+import json
+
+
+def loadLogStrings(fileName):
+    """
+    Loads a log strings file, as written by cs_bluenet_extract_log_strings.
+    Returns (fileNames, logs, logArrays), with the same layout as BluenetLogs uses:
+    fileNames: file hash -> file name
+    logs: file hash -> line number -> format
+    logArrays: file hash -> line number -> (startFormat, endFormat, separationFormat, elementFormat)
+    """
+    with open(fileName, "r") as file:
+        logStringsJson = json.load(file)
+
+    fileNames = {}
+    logs = {}
+    logArrays = {}
+    for entry in logStringsJson["source_files"]:
+        fileNames[entry["file_hash"]] = entry["file_name"]
+
+    for entry in logStringsJson["logs"]:
+        logs.setdefault(entry["file_hash"], {})[entry["line_nr"]] = entry["log_fmt"]
+
+    for entry in logStringsJson["logs_array"]:
+        logArrays.setdefault(entry["file_hash"], {})[entry["line_nr"]] = (
+            entry["start_fmt"], entry["end_fmt"], entry["separator_fmt"], entry["element_fmt"])
+
+    return fileNames, logs, logArrays
+
+
+def loadLogDescriptors(fileName):
+    """
+    Loads the format descriptors of a log strings file, see LogFormatDescriptor.
+    Returns file hash -> line number -> descriptor, for the logs that have one.
+    """
+    with open(fileName, "r") as file:
+        logStringsJson = json.load(file)
+
+    descriptors = {}
+    for entry in logStringsJson["logs"]:
+        if entry.get("log_desc") is not None:
+            descriptors.setdefault(entry["file_hash"], {})[entry["line_nr"]] = entry["log_desc"]
+    return descriptors
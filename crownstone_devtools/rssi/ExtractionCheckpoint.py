@@ -0,0 +1,63 @@
+"""
+Progress of an incremental FeatureExtractor run, so that a next run continues where the previous one stopped.
+
+The checkpoint is a json file with, per input file (by name, without compression suffix, so that a file that is
+latched to the output directory and compressed is still recognised):
+    offset: number of bytes of the uncompressed input that are processed.
+    outputSize: size of the output file after those bytes were processed.
+    final: True when the file was processed completely and won't grow anymore.
+and the state of each parser, e.g. the records in the windows of RssiNeighbourMessageAggregator.
+
+The checkpoint is written after the output is flushed. If the process is killed in between, the output has
+rows the checkpoint doesn't know about: those are truncated on resume, so they are not written twice.
+"""
+import json
+import os
+from pathlib import Path
+
+
+class ExtractionCheckpoint:
+    version = 1
+
+    def __init__(self, path):
+        self.path = Path(path)
+        # input file name -> {"offset": int, "outputSize": int, "final": bool}
+        self.files = {}
+        # checkpoint state of each parser, see FeatureExtractor.parseIncrementally
+        self.parserStates = []
+        self.columnNames = None
+
+    def load(self):
+        """
+        Loads the checkpoint file. Returns False if there is none yet.
+        """
+        if not self.path.exists():
+            return False
+        with open(self.path, "r") as checkpointFile:
+            checkpoint = json.load(checkpointFile)
+        if checkpoint.get("version") != self.version:
+            raise ValueError(F"unsupported checkpoint version {checkpoint.get('version')} in {self.path}")
+        self.files = checkpoint["files"]
+        self.parserStates = checkpoint["parserStates"]
+        self.columnNames = checkpoint["columnNames"]
+        return True
+
+    def save(self):
+        """
+        Writes the checkpoint under a temporary name first, so that a crash never leaves a partial checkpoint.
+        """
+        checkpoint = {
+            "version": self.version,
+            "files": self.files,
+            "parserStates": self.parserStates,
+            "columnNames": self.columnNames,
+        }
+        temporaryPath = Path(str(self.path) + ".tmp")
+        with open(temporaryPath, "w") as checkpointFile:
+            json.dump(checkpoint, checkpointFile, indent=1)
+            checkpointFile.flush()
+            os.fsync(checkpointFile.fileno())
+        os.replace(temporaryPath, self.path)
+
+    def fileEntry(self, name):
+        return self.files.setdefault(name, {"offset": 0, "outputSize": 0, "final": False})
@@ -0,0 +1,231 @@
+"""
+Simulates a dev board that forwards neighbour rssi messages of a mesh, on a pseudo terminal.
+
+The simulated port (e.g. /dev/pts/5) can be passed to cs_rssi_neighbour_parser with -p, which then reads it
+as if a real dev board was connected. Used by benchmarks/rssi_parser_load.py to measure how many messages per
+second the parser sustains, but it can be run by hand as well:
+
+    python3 -m crownstone_devtools.rssi.FakeDevBoard --nodes 10 --rate 200
+
+Only works on systems with pseudo terminals (Linux, macOS).
+"""
+import argparse
+import errno
+import os
+import random
+import threading
+import time
+
+from crownstone_devtools.rssi.UartPortReader import encodeUartMessage
+
+UART_OPCODE_TX_NEIGHBOUR_RSSI = 10111
+
+
+class FakeDevBoard(threading.Thread):
+    """
+    Thread that writes neighbour rssi messages to the master side of a pseudo terminal. `port` is the slave side.
+
+    Messages go round robin over all (receiver, sender) pairs of the mesh, each pair with its own message counter.
+    They are sent in bursts of `burst` messages, with on average `rate` messages per second. The byte rate is
+    limited to what `baudrate` allows, like a real uart.
+
+    A message that is dropped in the mesh (`dropProbability`, or every `dropEvery`th message of a pair) is never
+    sent, but does increase the message counter, so it shows up as a gap. When the reader doesn't keep up and the
+    pseudo terminal buffer is full, messages are dropped as well, like the tx buffer of a dev board overflows.
+
+    `onSend(key, sendTime)` is called for every sent message, with key (receiverId, senderId, msgNumber).
+    """
+    def __init__(self, nodes=5, firstNodeId=1, rate=100.0, burst=1, poisson=False, dropProbability=0.0, dropEvery=0,
+                 baudrate=230400, seed=None, onSend=None, verbose=False):
+        super().__init__(name="FakeDevBoard", daemon=True)
+        import pty
+        import tty
+
+        if nodes < 2 or firstNodeId < 1 or firstNodeId + nodes > 255:
+            raise ValueError(F"crownstone ids must be between 1 and 254, got {nodes} nodes starting at {firstNodeId}")
+
+        self.nodeIds = list(range(firstNodeId, firstNodeId + nodes))
+        self.pairs = [(receiverId, senderId) for receiverId in self.nodeIds for senderId in self.nodeIds
+                      if receiverId != senderId]
+        self.msgNumbers = dict((pair, 0) for pair in self.pairs)
+        self.pairIndex = 0
+
+        self.rate = rate
+        self.burst = max(1, int(burst))
+        self.poisson = poisson
+        self.dropProbability = dropProbability
+        self.dropEvery = dropEvery
+        # a uart byte takes 10 bits: start bit, 8 data bits, stop bit.
+        self.bytesPerSecond = baudrate / 10 if baudrate else None
+        self.random = random.Random(seed)
+        self.onSend = onSend
+        self.verbose = verbose
+
+        self.masterFd, self.slaveFd = pty.openpty()
+        # raw mode, so the terminal line discipline passes all bytes unchanged.
+        tty.setraw(self.slaveFd)
+        os.set_blocking(self.masterFd, False)
+        self.port = os.ttyname(self.slaveFd)
+
+        self.running = False
+        self.pending = bytearray()
+
+        # statistics
+        self.sentMessages = 0
+        self.meshDrops = 0
+        self.overflowDrops = 0
+
+    def setRate(self, rate):
+        """ Changes the message rate, takes effect at the next burst. """
+        self.rate = rate
+
+    def nextMessage(self):
+        """
+        Returns (key, payload) of the next message, or (key, None) if it is dropped in the mesh.
+        """
+        pair = self.pairs[self.pairIndex]
+        self.pairIndex = (self.pairIndex + 1) % len(self.pairs)
+        msgNumber = self.msgNumbers[pair]
+        self.msgNumbers[pair] = (msgNumber + 1) % 256
+        key = (pair[0], pair[1], msgNumber)
+
+        if (self.dropEvery and msgNumber % self.dropEvery == self.dropEvery - 1) or \
+                (self.dropProbability and self.random.random() < self.dropProbability):
+            return key, None
+
+        # int8 rssi values as uint8, 0 when the channel was not heard.
+        rssis = [0 if self.random.random() < 0.1 else self.random.randint(-95, -35) & 0xFF for _ in range(3)]
+        return key, [0, pair[0], pair[1]] + rssis + [0, msgNumber]
+
+    def write(self, data):
+        """
+        Writes as much of data as the pseudo terminal accepts. Returns False if data didn't fit at all.
+        """
+        if self.pending:
+            self.flush()
+            if self.pending:
+                return False
+        self.pending += data
+        self.flush()
+        return True
+
+    def flush(self):
+        try:
+            written = os.write(self.masterFd, self.pending)
+            del self.pending[:written]
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+
+    def drainInput(self):
+        """ Reads and discards what the parser writes to the board, so that its writes never block. """
+        try:
+            while os.read(self.masterFd, 4096):
+                pass
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EIO):
+                raise
+
+    def sendBurst(self):
+        data = bytearray()
+        keys = []
+        for _ in range(self.burst):
+            key, payload = self.nextMessage()
+            if payload is None:
+                self.meshDrops += 1
+                continue
+            data += encodeUartMessage(UART_OPCODE_TX_NEIGHBOUR_RSSI, payload)
+            keys.append(key)
+
+        if not data:
+            return 0
+        if not self.write(data):
+            self.overflowDrops += len(keys)
+            return 0
+
+        sendTime = time.time()
+        self.sentMessages += len(keys)
+        if self.onSend:
+            for key in keys:
+                self.onSend(key, sendTime)
+        return len(data)
+
+    def run(self):
+        self.running = True
+        nextBurstTime = time.monotonic()
+        while self.running:
+            self.drainInput()
+            # read once, setRate may be called from another thread.
+            rate = self.rate
+            if rate <= 0:
+                time.sleep(0.01)
+                nextBurstTime = time.monotonic()
+                continue
+
+            now = time.monotonic()
+            if now < nextBurstTime:
+                if self.pending:
+                    self.flush()
+                time.sleep(min(nextBurstTime - now, 0.01))
+                continue
+
+            size = self.sendBurst()
+
+            interval = self.burst / rate
+            if self.poisson:
+                interval = self.random.expovariate(1 / interval)
+            if self.bytesPerSecond:
+                interval = max(interval, size / self.bytesPerSecond)
+            # don't try to catch up after a stall of more than a second, like a real mesh wouldn't.
+            nextBurstTime = max(nextBurstTime + interval, time.monotonic() - 1.0)
+
+    def stop(self):
+        self.running = False
+
+    def close(self):
+        self.stop()
+        if self.is_alive():
+            self.join()
+        os.close(self.masterFd)
+        os.close(self.slaveFd)
+        if self.verbose:
+            print(F"FakeDevBoard {self.port} closed: {self.statistics()}")
+
+    def statistics(self):
+        return {
+            "sent": self.sentMessages,
+            "meshDrops": self.meshDrops,
+            "overflowDrops": self.overflowDrops,
+        }
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Simulates a dev board that forwards neighbour rssi messages, on a pseudo terminal.")
+    argparser.add_argument("-n", "--nodes", type=int, default=5, help="number of crownstones in the mesh, default 5.")
+    argparser.add_argument("-r", "--rate", type=float, default=100.0, help="messages per second, default 100.")
+    argparser.add_argument("-b", "--burst", type=int, default=1, help="messages per burst, default 1.")
+    argparser.add_argument("--poisson", action='store_true', help="exponentially distributed time between bursts.")
+    argparser.add_argument("--dropProbability", type=float, default=0.0, help="probability that a message is lost in the mesh.")
+    argparser.add_argument("--dropEvery", type=int, default=0, help="drop every nth message of each pair.")
+    argparser.add_argument("--baudrate", type=int, default=230400, help="limits the byte rate, 0 for no limit.")
+    argparser.add_argument("-v", "--verbose", action='store_true')
+    pargs = argparser.parse_args()
+
+    board = FakeDevBoard(nodes=pargs.nodes, rate=pargs.rate, burst=pargs.burst, poisson=pargs.poisson,
+                         dropProbability=pargs.dropProbability, dropEvery=pargs.dropEvery,
+                         baudrate=pargs.baudrate, verbose=pargs.verbose)
+    print(F"fake dev board on {board.port}, run: cs_rssi_neighbour_parser -p {board.port}")
+    board.start()
+    try:
+        while True:
+            time.sleep(5)
+            print(board.statistics())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        board.close()
+        print(board.statistics())
+
+
+if __name__ == "__main__":
+    main()
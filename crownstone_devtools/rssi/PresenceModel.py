@@ -0,0 +1,129 @@
+"""
+Serialised presence models for RssiPresenceInference. A model turns a batch of feature vectors into labels.
+
+Supported files, by extension:
+    .npz: NumPy weights of a linear classifier, see NumpyPresenceModel.
+    .onnx: an ONNX classifier, run with onnxruntime.
+    .pkl, .pickle, .joblib: a pickled estimator with a `predict` method, e.g. from scikit-learn.
+numpy is needed for all of them, onnxruntime and joblib only for their own format.
+
+Only load pickles you trust: unpickling can run arbitrary code.
+"""
+from pathlib import Path
+
+
+def _importNumpy(modelType):
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError(F"{modelType} requires numpy, install it with: pip install numpy")
+    return numpy
+
+
+class NumpyPresenceModel:
+    """
+    Linear classifier stored as a .npz file with the arrays:
+        weights: features x classes
+        bias: classes
+        classes: the labels of the classes, e.g. ["a", "b"]
+    and optionally:
+        mean, scale: per feature, features are standardised as (x - mean) / scale before the weights are applied.
+        features: the names of the feature columns the model was trained on, checked against the feature spec.
+    Missing features (NaN) count as the mean.
+    """
+    def __init__(self, path):
+        self.np = _importNumpy(type(self).__name__)
+        with self.np.load(path, allow_pickle=False) as model:
+            self.weights = model["weights"].astype(self.np.float32)
+            self.bias = model["bias"].astype(self.np.float32) if "bias" in model else 0
+            self.classes = [str(label) for label in model["classes"]]
+            self.mean = model["mean"].astype(self.np.float32) if "mean" in model else None
+            self.scale = model["scale"].astype(self.np.float32) if "scale" in model else None
+            self.featureNames = [str(name) for name in model["features"]] if "features" in model else None
+        if self.weights.ndim != 2 or self.weights.shape[1] != len(self.classes):
+            raise ValueError(F"weights of {path} should be features x classes, got {self.weights.shape} for {len(self.classes)} classes")
+
+    @staticmethod
+    def save(path, weights, classes, bias=None, mean=None, scale=None, features=None):
+        numpy = _importNumpy("NumpyPresenceModel")
+        arrays = {"weights": numpy.asarray(weights, dtype=numpy.float32), "classes": numpy.asarray(classes, dtype=str)}
+        for name, value in [("bias", bias), ("mean", mean), ("scale", scale)]:
+            if value is not None:
+                arrays[name] = numpy.asarray(value, dtype=numpy.float32)
+        if features is not None:
+            arrays["features"] = numpy.asarray(features, dtype=str)
+        numpy.savez(path, **arrays)
+
+    def predict(self, features):
+        if self.mean is not None:
+            features = features - self.mean
+        if self.scale is not None:
+            features = features / self.scale
+        features = self.np.nan_to_num(features, nan=0.0)
+        scores = features @ self.weights + self.bias
+        return [self.classes[index] for index in scores.argmax(axis=1)]
+
+
+class OnnxPresenceModel:
+    """
+    ONNX classifier, e.g. converted with skl2onnx. The first output must be the predicted labels.
+    """
+    def __init__(self, path):
+        self.np = _importNumpy(type(self).__name__)
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError(F"{type(self).__name__} requires onnxruntime, install it with: pip install onnxruntime")
+        self.session = onnxruntime.InferenceSession(str(path))
+        self.inputName = self.session.get_inputs()[0].name
+        self.outputName = self.session.get_outputs()[0].name
+        self.featureNames = None
+
+    def predict(self, features):
+        labels = self.session.run([self.outputName], {self.inputName: features.astype(self.np.float32)})[0]
+        return [label.decode() if isinstance(label, bytes) else str(label) for label in labels]
+
+
+class PicklePresenceModel:
+    """
+    Pickled estimator with a predict(features) method, e.g. a scikit-learn classifier or pipeline.
+    Its `feature_names_in_` are checked against the feature spec, if it has them.
+    """
+    def __init__(self, path):
+        self.np = _importNumpy(type(self).__name__)
+        if Path(path).suffix == ".joblib":
+            try:
+                import joblib
+            except ImportError:
+                raise ImportError(F"loading {path} requires joblib, install it with: pip install joblib")
+            self.estimator = joblib.load(path)
+        else:
+            import pickle
+            with open(path, "rb") as modelFile:
+                self.estimator = pickle.load(modelFile)
+        if not hasattr(self.estimator, "predict"):
+            raise ValueError(F"{path} doesn't contain a model with a predict method: {type(self.estimator).__name__}")
+        featureNames = getattr(self.estimator, "feature_names_in_", None)
+        self.featureNames = [str(name) for name in featureNames] if featureNames is not None else None
+
+    def predict(self, features):
+        return [str(label) for label in self.estimator.predict(features)]
+
+
+presenceModels = {
+    ".npz": NumpyPresenceModel,
+    ".onnx": OnnxPresenceModel,
+    ".pkl": PicklePresenceModel,
+    ".pickle": PicklePresenceModel,
+    ".joblib": PicklePresenceModel,
+}
+
+
+def loadPresenceModel(path):
+    """
+    Returns the model in the given file, its type is chosen by the file extension.
+    """
+    suffix = Path(path).suffix.lower()
+    if suffix not in presenceModels:
+        raise ValueError(F"unknown model file type: {path}, expected one of {list(presenceModels)}")
+    return presenceModels[suffix](path)
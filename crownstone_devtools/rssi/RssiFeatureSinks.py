@@ -0,0 +1,304 @@
+"""
+Output sinks for the rows produced by RssiNeighbourMessageAggregator.
+
+A sink receives the column names once and then one row per record. The csv sink writes the classic
+comma separated text file. The typed sinks (npz, arrow) write a float32 feature matrix together with
+timestamp, pair and label columns in chunks of `chunkSize` rows. Missing statistics become NaN.
+
+numpy (and pyarrow for the arrow sink) are only imported when a typed sink is constructed.
+"""
+import json
+
+from crownstone_devtools.util.Tracing import getTracer
+
+_TRACER = getTracer("rssi.sink")
+
+
+class RssiFeatureCsvSink:
+    """
+    Writes rows as comma separated text, preceded by a commented header line.
+    A row is incomplete when any of its values stringifies to an empty string.
+    """
+    binaryOutput = False
+    outputExtension = None
+
+    def __init__(self, allowIncompleteRecords=False, dryRun=False, verbose=False, **kwargs):
+        self.allowIncompleteRecords = allowIncompleteRecords
+        self.dryRun = dryRun
+        self.verbose = verbose
+        self.outFile = None
+
+    def open(self, outFile, columnNames, writeHeader=True):
+        """
+        writeHeader: False when appending to a file that already has the header.
+        """
+        self.outFile = outFile
+        if writeHeader:
+            self.writeLine(F"# {', '.join(columnNames)}")
+
+    def writeComment(self, line):
+        self.writeLine(line)
+
+    def accepts(self, columnValues):
+        """
+        Returns False if `write` would skip the row because it is incomplete.
+        """
+        return self.allowIncompleteRecords or all(str(val) for val in columnValues)
+
+    def write(self, record, columnValues):
+        """
+        Writes a row. Returns True if it was written, False if it was skipped because it was incomplete.
+        """
+        strings = [str(val) for val in columnValues]
+        outputline = ",".join(strings)
+
+        if _TRACER.enabled and _TRACER.sampled():
+            _TRACER.event("output", line=outputline)
+
+        if not self.allowIncompleteRecords and not all(strings):
+            print("*** skipping incomplete record ***")
+            return False
+
+        self.writeLine(outputline)
+        return True
+
+    def writeLine(self, line):
+        if not self.dryRun:
+            print(line, file=self.outFile)
+
+    def close(self):
+        self.outFile = None
+
+
+class RssiFeatureTypedSink:
+    """
+    Base class of the columnar sinks. Buffers rows and hands full chunks to `writeChunk`.
+
+    Columns whose statistic is "label" are categorical and are not part of the float32 feature matrix,
+    the label of the record itself is stored in the `label` column instead.
+    Completeness of a row is checked on its NaN mask.
+    """
+    binaryOutput = True
+    outputExtension = None
+
+    def __init__(self, allowIncompleteRecords=False, dryRun=False, verbose=False, chunkSize=None, **kwargs):
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError(F"{type(self).__name__} requires numpy, install it with: pip install numpy")
+        self.np = numpy
+
+        self.allowIncompleteRecords = allowIncompleteRecords
+        self.dryRun = dryRun
+        self.verbose = verbose
+        self.chunkSize = chunkSize or 4096
+
+        self.outFile = None
+        self.featureNames = []
+        self.featureIndices = []
+        self.chunkIndex = 0
+        self.resetChunk()
+
+    def resetChunk(self):
+        self.timestamps = []
+        self.receiverIds = []
+        self.senderIds = []
+        self.labels = []
+        self.rows = []
+
+    def open(self, outFile, columnNames, writeHeader=True):
+        if not writeHeader:
+            raise ValueError(F"{type(self).__name__} can't append to an existing file")
+        self.outFile = outFile
+        self.chunkIndex = 0
+        self.resetChunk()
+        self.featureIndices = [i for i, name in enumerate(columnNames) if not name.endswith("_label")]
+        self.featureNames = [columnNames[i] for i in self.featureIndices]
+        self.schema = {
+            "header": ", ".join(columnNames),
+            "features": self.featureNames,
+            "dropped": [name for name in columnNames if name.endswith("_label")],
+            "columns": ["timestamp", "receiverId", "senderId", "label", "features"],
+        }
+
+    def writeComment(self, line):
+        # comments have no place in a columnar file, labels are stored per row.
+        pass
+
+    def accepts(self, columnValues):
+        """
+        Returns False if `write` would skip the row because it is incomplete.
+        """
+        if self.allowIncompleteRecords:
+            return True
+        # missing values and NaN (which isn't equal to itself) become NaN in the row.
+        return not any(columnValues[i] in ("", None) or columnValues[i] != columnValues[i] for i in self.featureIndices)
+
+    def write(self, record, columnValues):
+        """
+        Buffers a row. Returns True if it was accepted, False if it was skipped because it was incomplete.
+        """
+        nan = float("nan")
+        row = self.np.array([nan if columnValues[i] in ("", None) else columnValues[i] for i in self.featureIndices],
+                            dtype=self.np.float32)
+
+        if _TRACER.enabled and _TRACER.sampled():
+            _TRACER.event("output", timestamp=record.timestamp.isoformat(), receiverId=record.receiverId,
+                          senderId=record.senderId, label=record.labelchr, features=row.tolist())
+
+        if not self.allowIncompleteRecords and self.np.isnan(row).any():
+            print("*** skipping incomplete record ***")
+            return False
+
+        self.timestamps.append(record.timestamp)
+        self.receiverIds.append(record.receiverId)
+        self.senderIds.append(record.senderId)
+        self.labels.append(record.labelchr)
+        self.rows.append(row)
+
+        if len(self.rows) >= self.chunkSize:
+            self.flush()
+        return True
+
+    def chunkArrays(self):
+        np = self.np
+        return {
+            "timestamp": np.array(self.timestamps, dtype="datetime64[us]"),
+            "receiverId": np.array(self.receiverIds, dtype=np.uint8),
+            "senderId": np.array(self.senderIds, dtype=np.uint8),
+            "label": np.array(self.labels, dtype=str),
+            "features": np.vstack(self.rows) if self.rows else np.empty((0, len(self.featureNames)), dtype=np.float32),
+        }
+
+    def flush(self):
+        if self.rows and not self.dryRun:
+            self.writeChunk(self.chunkArrays())
+            self.chunkIndex += 1
+        self.resetChunk()
+
+    def writeChunk(self, arrays):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+        self.outFile = None
+
+
+class RssiFeatureNpzSink(RssiFeatureTypedSink):
+    """
+    Writes a .npz archive. Every chunk adds one member per column, named `{column}.{chunkIndex:05d}`,
+    and the schema is stored as json in the `schema` member. Use `load` to get the concatenated columns.
+    """
+    outputExtension = "npz"
+
+    def open(self, outFile, columnNames, writeHeader=True):
+        super().open(outFile, columnNames, writeHeader)
+        self.archive = None
+        if self.dryRun:
+            return
+        import zipfile
+        self.archive = zipfile.ZipFile(outFile, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True)
+        self.archive.writestr("schema.json", json.dumps(self.schema))
+
+    def writeChunk(self, arrays):
+        for column, array in arrays.items():
+            with self.archive.open(F"{column}.{self.chunkIndex:05d}.npy", mode="w", force_zip64=True) as member:
+                self.np.lib.format.write_array(member, array, allow_pickle=False)
+
+    def close(self):
+        self.flush()
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+        self.outFile = None
+
+    @staticmethod
+    def load(path):
+        """
+        Returns (columns, schema): a dict with the concatenated column arrays and the schema dict.
+        """
+        import numpy
+        import zipfile
+
+        with zipfile.ZipFile(path) as archive:
+            schema = json.loads(archive.read("schema.json"))
+
+        with numpy.load(path, allow_pickle=False) as npz:
+            columns = {}
+            for column in schema["columns"]:
+                keys = sorted(key for key in npz.files if key.split(".")[0] == column)
+                if keys:
+                    columns[column] = numpy.concatenate([npz[key] for key in keys])
+                elif column == "features":
+                    columns[column] = numpy.empty((0, len(schema["features"])), dtype=numpy.float32)
+                else:
+                    columns[column] = numpy.empty((0,))
+        return columns, schema
+
+
+class RssiFeatureArrowSink(RssiFeatureTypedSink):
+    """
+    Writes an Arrow IPC file with one record batch per chunk. Each feature is a float32 column,
+    the schema is attached as metadata under the key `crownstone.rssi.features`.
+    """
+    outputExtension = "arrow"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError("RssiFeatureArrowSink requires pyarrow, install it with: pip install pyarrow")
+        self.pa = pyarrow
+        self.writer = None
+
+    def open(self, outFile, columnNames, writeHeader=True):
+        super().open(outFile, columnNames, writeHeader)
+        pa = self.pa
+        fields = [
+            pa.field("timestamp", pa.timestamp("us")),
+            pa.field("receiverId", pa.uint8()),
+            pa.field("senderId", pa.uint8()),
+            pa.field("label", pa.string()),
+        ] + [pa.field(name, pa.float32()) for name in self.featureNames]
+        self.arrowSchema = pa.schema(fields, metadata={"crownstone.rssi.features": json.dumps(self.schema)})
+
+        self.writer = None
+        if not self.dryRun:
+            import pyarrow.ipc
+            self.writer = pyarrow.ipc.new_file(outFile, self.arrowSchema)
+
+    def writeChunk(self, arrays):
+        pa = self.pa
+        features = arrays["features"]
+        columns = [
+            pa.array(arrays["timestamp"], type=pa.timestamp("us")),
+            pa.array(arrays["receiverId"], type=pa.uint8()),
+            pa.array(arrays["senderId"], type=pa.uint8()),
+            pa.array(arrays["label"].tolist(), type=pa.string()),
+        ] + [pa.array(features[:, i], type=pa.float32()) for i in range(features.shape[1])]
+        self.writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=self.arrowSchema))
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        self.outFile = None
+
+
+featureSinks = {
+    "csv": RssiFeatureCsvSink,
+    "npz": RssiFeatureNpzSink,
+    "arrow": RssiFeatureArrowSink,
+}
+
+
+def createFeatureSink(outputFormat, **kwargs):
+    """
+    Returns a sink for the given format name (csv, npz or arrow). kwargs are passed to its constructor.
+    """
+    outputFormat = outputFormat or "csv"
+    if outputFormat not in featureSinks:
+        raise ValueError(F"unknown output format: {outputFormat}, expected one of {list(featureSinks)}")
+    return featureSinks[outputFormat](**kwargs)
@@ -0,0 +1,621 @@
+"""
+Declarative description of the features computed by RssiNeighbourMessageAggregator, and the plan it compiles to.
+
+A spec is a json (or yaml, if PyYAML is installed) file like:
+
+    {
+        "historySize": 50,
+        "channels": [0, 1, 2, null],
+        "windows": [
+            {"name": "last-5-records", "count": 5, "statistics": ["label", "mean", "stdev"]},
+            {"name": "last-30-seconds", "seconds": 30, "statistics": ["mean", "min_max_gap"]}
+        ]
+    }
+
+`channels`: 0 based channel ids, null (or "all") for 'all non-zero values'.
+`windows`: either the last `count` records or the records of the last `seconds`, relative to the last record
+    that has a value for the channel. `name` is optional.
+`statistics`: any of `RssiFeaturePlan.statistics`, defaults to all of them. Column order follows the spec.
+    Parametrized statistics are also available:
+    - "p<percentile>", e.g. "p10" or "p90": percentile, linearly interpolated between the closest values.
+    - "ewma_<half life>s", e.g. "ewma_30s": mean weighted by age relative to the newest record of the window,
+      a value that is <half life> seconds older weighs half as much.
+    - "hist_<from>_<to>", e.g. "hist_-80_-70": fraction of the values in [from, to), within -128 and 128.
+      "hist" is short for the bins of `RssiFeatureSpec.histogramEdges`.
+`generators`: optional, feature generators with the setChannel/load/columnNames/values protocol of RssiFeatures,
+    added after the statistics of the window. Given by name, "basic", "extended", "quantiles", "ewma" or "histogram",
+    or as objects when the spec is built in python. `statistics` defaults to none for a window with generators.
+`historySize`: number of records kept in memory, at least the largest count window.
+
+See feature_spec.template.json for the spec that reproduces the default columns.
+
+The plan shares work between all windows: the rssi value of every channel is extracted once per record,
+and all windows of a channel are computed in a single pass from the newest record backwards. Nested windows
+snapshot the running aggregates of that pass instead of recomputing them. Only the statistics that are
+requested by at least one window are accumulated. Generators are loaded with the records of their window, like
+the statsGenerator of a record filter, so they don't share work.
+
+A count window holds at most `count` values, so its percentiles and histograms are computed exactly from the
+sorted values. A time window can hold all `historySize` records, so its percentiles, EWMAs and histograms are computed
+by the constant memory generators of RssiStreamingFeatures instead, fed in the same pass: P² sketches, which are
+exact up to `RssiFeaturePlan.quantileExactCount` values, decayed sums and int8 bin counts. The values are then only
+sorted for median_grouped.
+"""
+import json
+import math
+import re
+from bisect import bisect_left, bisect_right, insort
+from datetime import timedelta
+from fractions import Fraction
+
+
+def _sqrtOfFraction(fraction):
+    """
+    Correctly rounded square root of a non-negative Fraction, equal to what statistics.stdev returns.
+    """
+    n, m = fraction.numerator, fraction.denominator
+    if n == 0:
+        return 0.0
+    q = (n.bit_length() - m.bit_length() - 109) // 2
+    if q >= 0:
+        m <<= 2 * q
+        shift, denominator = q, 1
+    else:
+        n <<= -2 * q
+        shift, denominator = 0, 1 << -q
+    root = math.isqrt(n // m)
+    # round to odd, so the conversion to float rounds correctly
+    root |= (root * root * m != n)
+    return (root << shift) / denominator
+
+
+class RssiFeatureWindowAccumulator:
+    """
+    Running aggregates over the values of one channel, fed from the newest record backwards.
+    Only the aggregates in `needs` are maintained.
+    """
+    __slots__ = ["needs", "n", "total", "totalSq", "exact", "minimum", "maximum", "sortedValues",
+                 "labelCounts", "lastValue", "lastLabel", "halfLives", "newestTimestamp", "ewmaSums", "ewmaWeights"]
+    def __init__(self, needs, halfLives=()):
+        self.needs = needs
+        self.n = 0
+        self.total = 0
+        self.totalSq = 0
+        # True while all values are ints, so that total and totalSq are plain ints.
+        self.exact = True
+        self.minimum = None
+        self.maximum = None
+        self.sortedValues = []
+        self.labelCounts = {}
+        self.lastValue = None
+        self.lastLabel = None
+        self.halfLives = halfLives
+        self.newestTimestamp = None
+        self.ewmaSums = [0.0] * len(halfLives)
+        self.ewmaWeights = [0.0] * len(halfLives)
+
+    def add(self, value, label, timestamp=None):
+        needs = self.needs
+        self.n += 1
+        self.lastValue = value
+        self.lastLabel = label
+
+        if "sum" in needs:
+            if self.exact and type(value) is not int:
+                self.exact = False
+                self.total = Fraction(self.total)
+                self.totalSq = Fraction(self.totalSq)
+            exactValue = value if self.exact else Fraction(value)
+            self.total += exactValue
+            self.totalSq += exactValue * exactValue
+        if "minmax" in needs:
+            if self.minimum is None or value < self.minimum:
+                self.minimum = value
+            if self.maximum is None or value > self.maximum:
+                self.maximum = value
+        if "sorted" in needs:
+            insort(self.sortedValues, value)
+        if "label" in needs:
+            # counted newest first, the dict keeps the order of first occurrence.
+            self.labelCounts[label] = self.labelCounts.get(label, 0) + 1
+        if "ewma" in needs:
+            if self.newestTimestamp is None:
+                self.newestTimestamp = timestamp
+            age = (self.newestTimestamp - timestamp).total_seconds()
+            for i, halfLife in enumerate(self.halfLives):
+                weight = 0.5 ** (age / halfLife)
+                self.ewmaSums[i] += weight * value
+                self.ewmaWeights[i] += weight
+
+    def mean(self):
+        if self.exact:
+            if self.total % self.n == 0:
+                return self.total // self.n
+            return self.total / self.n
+        return float(self.total / self.n)
+
+    def stdev(self):
+        n = self.n
+        if self.exact:
+            return _sqrtOfFraction(Fraction(n * self.totalSq - self.total * self.total, n * (n - 1)))
+        return _sqrtOfFraction((self.totalSq - self.total * self.total / n) / (n - 1))
+
+    def median_grouped(self):
+        data = self.sortedValues
+        n = len(data)
+        x = data[n // 2]
+        i = bisect_left(data, x)
+        j = bisect_right(data, x, lo=i)
+        return float(x) - 0.5 + 1.0 * (n / 2 - i) / (j - i)
+
+    def label(self):
+        # equal to statistics.multimode(reversed(labels))[-1]
+        maxCount = max(self.labelCounts.values())
+        return [label for label, count in self.labelCounts.items() if count == maxCount][-1]
+
+    def min_max_gap(self):
+        return self.maximum - self.minimum
+
+    def quantile(self, q):
+        data = self.sortedValues
+        position = q * (len(data) - 1)
+        lower = int(position)
+        if lower + 1 >= len(data):
+            return float(data[lower])
+        return data[lower] + (data[lower + 1] - data[lower]) * (position - lower)
+
+    def ewma(self, halfLifeIndex):
+        return self.ewmaSums[halfLifeIndex] / self.ewmaWeights[halfLifeIndex]
+
+    def histogram(self, lower, upper):
+        data = self.sortedValues
+        return (bisect_left(data, upper) - bisect_left(data, lower)) / self.n
+
+    def statistic(self, name, args=()):
+        """
+        Returns the named statistic, or "" if it cannot be computed from the values seen so far.
+        `args` are the parameters of parametrized statistics, see RssiFeaturePlan.parseStatistic.
+        """
+        if self.n == 0:
+            return ""
+        if self.n == 1:
+            if name in ("mean", "median_grouped", "quantile", "ewma"):
+                return self.lastValue
+            if name == "label":
+                return self.lastLabel
+            if name != "histogram":
+                return ""
+        return getattr(self, name)(*args)
+
+
+class RssiFeatureWindowState:
+    """
+    The records a plan is evaluated on, with the per-channel values extracted once per record.
+    """
+    def __init__(self, plan):
+        self.plan = plan
+        self.records = []
+        self.values = []
+
+    def update(self, record):
+        """
+        Add record to the end the list, removing the oldest entry if max capacity is reached.
+        """
+        self.records.append(record)
+        self.values.append(self.plan.extract(record))
+        overflow = len(self.records) - self.plan.historySize
+        if overflow > 0:
+            del self.records[:overflow]
+            del self.values[:overflow]
+
+
+class RssiFeaturePlan:
+    """
+    Compiled RssiFeatureSpec. Use `newState()` to get a window state, `state.update(record)` for every record
+    and `evaluate(state)` to obtain the values for `columnNames()`.
+    """
+    statistics = ["label", "mean", "stdev", "median_grouped", "min_max_gap"]
+
+    # aggregates needed per statistic
+    needsPerStatistic = {
+        "label": {"label"},
+        "mean": {"sum"},
+        "stdev": {"sum"},
+        "median_grouped": {"sorted"},
+        "min_max_gap": {"minmax"},
+        "quantile": {"sorted"},
+        "ewma": {"ewma"},
+        "histogram": {"sorted"},
+        "streaming": set(),
+    }
+    # statistics that are computed by the generators of RssiStreamingFeatures in time windows.
+    streamingStatistics = ("quantile", "ewma", "histogram")
+    # values up to which the quantile sketches are exact, see P2QuantileEstimator.
+    quantileExactCount = 32
+
+    def __init__(self, spec):
+        self.channels = list(spec.channels)
+        self.channelNames = [F"channel-{channel}" if channel is not None else "all-channels" for channel in self.channels]
+        self.windows = list(spec.windows)
+        self.windowGenerators = [window["generators"] for window in self.windows]
+        # the records of the window are only collected for generators.
+        self.collectsRecords = any(self.windowGenerators)
+
+        # per window: the (accumulator method, arguments) of its statistics.
+        self.windowStatistics = []
+        self.halfLives = []
+        self.streamingGenerators = []
+        streamingArguments = {}
+        for window in self.windows:
+            windowStatistics = []
+            for statistic in window["statistics"]:
+                method, args = self.parseStatistic(statistic)
+                if method in self.streamingStatistics and "seconds" in window:
+                    streamingArguments.setdefault(method, set()).add(args)
+                    windowStatistics.append(("streaming", (method, args)))
+                    continue
+                if method == "ewma":
+                    if args[0] not in self.halfLives:
+                        self.halfLives.append(args[0])
+                    args = (self.halfLives.index(args[0]),)
+                windowStatistics.append((method, args))
+            self.windowStatistics.append(windowStatistics)
+        if streamingArguments:
+            self.createStreamingGenerators(streamingArguments)
+
+        self.needs = set()
+        for windowStatistics in self.windowStatistics:
+            for method, _ in windowStatistics:
+                self.needs |= self.needsPerStatistic[method]
+
+        # windows in execution order: count windows ascending, time windows ascending.
+        self.countWindows = sorted([(window["count"], index) for index, window in enumerate(self.windows)
+                                    if "count" in window])
+        self.timeWindows = sorted([(timedelta(seconds=window["seconds"]), index) for index, window in enumerate(self.windows)
+                                   if "seconds" in window])
+
+        largestCount = max([count for count, _ in self.countWindows], default=1)
+        self.historySize = max(spec.historySize or 0, largestCount)
+
+        # offset of the first column of each window within a channel block
+        self.windowOffsets = []
+        offset = 0
+        for window in self.windows:
+            self.windowOffsets.append(offset)
+            offset += len(window["statistics"])
+            offset += sum(len(generator.columnNames()) for generator in window["generators"])
+        self.channelWidth = offset
+
+        # number of values each window needs for all its columns to have a value, see isComplete.
+        self.windowMinimumCounts = []
+        for window, windowStatistics in zip(self.windows, self.windowStatistics):
+            minimumCount = 2 if any(method in ("stdev", "min_max_gap") for method, _ in windowStatistics) else 1
+            for generator in window["generators"]:
+                minimumCount = max(minimumCount, getattr(generator, "minimumRecords", 1))
+            self.windowMinimumCounts.append(minimumCount)
+
+    def createStreamingGenerators(self, streamingArguments):
+        """
+        Creates one generator per kind for the streaming statistics of all time windows, and replaces their
+        arguments in windowStatistics by (generator index, first column, end column) of the generator values.
+        """
+        from crownstone_devtools.rssi.RssiStreamingFeatures import RssiChannelQuantileFeatures, \
+            RssiChannelEwmaFeatures, RssiChannelHistogramFeatures
+
+        columns = {}
+        if "quantile" in streamingArguments:
+            quantiles = sorted(args[0] for args in streamingArguments["quantile"])
+            for i, quantile in enumerate(quantiles):
+                columns[("quantile", (quantile,))] = (len(self.streamingGenerators), i, i + 1)
+            self.streamingGenerators.append(RssiChannelQuantileFeatures(quantiles, self.quantileExactCount))
+        if "ewma" in streamingArguments:
+            halfLives = sorted(args[0] for args in streamingArguments["ewma"])
+            for i, halfLife in enumerate(halfLives):
+                columns[("ewma", (halfLife,))] = (len(self.streamingGenerators), i, i + 1)
+            self.streamingGenerators.append(RssiChannelEwmaFeatures(halfLives))
+        if "histogram" in streamingArguments:
+            # bins between all edges, a requested bin is the sum of the bins it covers.
+            edges = sorted({edge for args in streamingArguments["histogram"] for edge in args})
+            for lower, upper in streamingArguments["histogram"]:
+                columns[("histogram", (lower, upper))] = (len(self.streamingGenerators), edges.index(lower), edges.index(upper))
+            self.streamingGenerators.append(RssiChannelHistogramFeatures(edges=edges))
+
+        for windowStatistics in self.windowStatistics:
+            for i, (method, args) in enumerate(windowStatistics):
+                if method == "streaming":
+                    windowStatistics[i] = (method, columns[args])
+
+    @staticmethod
+    def parseStatistic(name):
+        """
+        Returns (accumulator method, arguments) of a statistic name, see the module docstring.
+        Raises ValueError for unknown statistics.
+        """
+        if name in RssiFeaturePlan.statistics:
+            return name, ()
+        match = re.fullmatch(r"p(\d+(?:\.\d+)?)", name)
+        if match and float(match.group(1)) <= 100:
+            return "quantile", (float(match.group(1)) / 100,)
+        match = re.fullmatch(r"ewma_(\d+(?:\.\d+)?)s", name)
+        if match and float(match.group(1)) > 0:
+            return "ewma", (float(match.group(1)),)
+        match = re.fullmatch(r"hist_(-?\d+)_(-?\d+)", name)
+        if match and -128 <= int(match.group(1)) < int(match.group(2)) <= 128:
+            return "histogram", (int(match.group(1)), int(match.group(2)))
+        raise ValueError(F"unknown statistic '{name}', expected one of {RssiFeaturePlan.statistics}, "
+                         F"p<percentile>, ewma_<half life>s, hist or hist_<from>_<to>")
+
+    def newState(self):
+        return RssiFeatureWindowState(self)
+
+    def columnNames(self):
+        return [F"{channelName}_{window['name']}_{statistic}"
+                for channelName in self.channelNames
+                for window in self.windows
+                for statistic in window["statistics"] + self.generatorColumnNames(window)]
+
+    @staticmethod
+    def generatorColumnNames(window):
+        return [columnName for generator in window["generators"] for columnName in generator.columnNames()]
+
+    def extract(self, record):
+        """
+        Returns the rssi value of each channel of the plan, None when the record has no value for it.
+        The 'all channels' value is the mean of the non-zero channels.
+        """
+        values = []
+        for channel in self.channels:
+            if channel is not None:
+                rssi = record.rssis[channel]
+                values.append(rssi if rssi != 0 else None)
+                continue
+            nonzeroes = [rssi for rssi in record.rssis if rssi != 0]
+            if not nonzeroes:
+                values.append(None)
+                continue
+            total = sum(nonzeroes)
+            # same types as statistics.mean: int when exact.
+            values.append(total // len(nonzeroes) if total % len(nonzeroes) == 0 else total / len(nonzeroes))
+        return values
+
+    def isComplete(self, state):
+        """
+        Returns True if evaluate(state) gives a value for every column, without computing the statistics.
+        Only the newest two values of every channel are looked at: no window needs more than 2 values.
+        Generators without a `minimumRecords` attribute are assumed to need 1 record.
+        """
+        records = state.records
+        values = state.values
+        for channelIndex in range(len(self.channels)):
+            # of the newest two values of the channel, newest first.
+            timestamps = []
+            for i in range(len(records) - 1, -1, -1):
+                if values[i][channelIndex] is not None:
+                    timestamps.append(records[i].timestamp)
+                    if len(timestamps) == 2:
+                        break
+
+            for window, minimumCount in zip(self.windows, self.windowMinimumCounts):
+                if "count" in window:
+                    available = min(window["count"], len(timestamps))
+                elif len(timestamps) == 2 and timestamps[1] > timestamps[0] - timedelta(seconds=window["seconds"]):
+                    available = 2
+                else:
+                    available = len(timestamps) and 1
+                if available < minimumCount:
+                    return False
+        return True
+
+    def evaluate(self, state):
+        """
+        Returns the values of all columns for the current state.
+        """
+        row = [""] * (self.channelWidth * len(self.channels))
+        for channelIndex in range(len(self.channels)):
+            self.evaluateChannel(state, channelIndex, row, channelIndex * self.channelWidth)
+        return row
+
+    def evaluateChannel(self, state, channelIndex, row, rowOffset):
+        records = state.records
+        values = state.values
+        countWindows = self.countWindows
+        timeWindows = self.timeWindows
+        countIndex = 0
+        timeIndex = 0
+        thresholds = None
+        # newest first, only when a window has generators.
+        windowRecords = []
+
+        accumulator = RssiFeatureWindowAccumulator(self.needs, self.halfLives)
+        streamingGenerators = self.streamingGenerators
+        for generator in streamingGenerators:
+            generator.reset()
+        for i in range(len(records) - 1, -1, -1):
+            value = values[i][channelIndex]
+            if value is None:
+                continue
+            record = records[i]
+
+            if thresholds is None:
+                thresholds = [record.timestamp - seconds for seconds, _ in timeWindows]
+            while timeIndex < len(timeWindows) and record.timestamp <= thresholds[timeIndex]:
+                self.snapshot(accumulator, timeWindows[timeIndex][1], row, rowOffset, channelIndex, windowRecords)
+                timeIndex += 1
+
+            accumulator.add(value, record.labelchr, record.timestamp)
+            for generator in streamingGenerators:
+                generator.addValue(value, record)
+            if self.collectsRecords:
+                windowRecords.append(record)
+
+            while countIndex < len(countWindows) and countWindows[countIndex][0] == accumulator.n:
+                self.snapshot(accumulator, countWindows[countIndex][1], row, rowOffset, channelIndex, windowRecords)
+                countIndex += 1
+
+            if countIndex == len(countWindows) and timeIndex == len(timeWindows):
+                return
+
+        # windows that are larger than the available records get all of them.
+        for _, windowIndex in countWindows[countIndex:] + timeWindows[timeIndex:]:
+            self.snapshot(accumulator, windowIndex, row, rowOffset, channelIndex, windowRecords)
+
+    def snapshot(self, accumulator, windowIndex, row, rowOffset, channelIndex, windowRecords):
+        offset = rowOffset + self.windowOffsets[windowIndex]
+        streamingValues = None
+        for method, args in self.windowStatistics[windowIndex]:
+            if method != "streaming":
+                row[offset] = accumulator.statistic(method, args)
+            elif accumulator.n > 0:
+                if streamingValues is None:
+                    streamingValues = [generator.values() for generator in self.streamingGenerators]
+                generatorIndex, start, end = args
+                values = streamingValues[generatorIndex]
+                row[offset] = values[start] if end == start + 1 else sum(values[start:end])
+            offset += 1
+
+        generators = self.windowGenerators[windowIndex]
+        if not generators or accumulator.n == 0:
+            # the columns of the generators stay "", they can't be computed without records.
+            return
+        records = windowRecords[::-1]
+        for generator in generators:
+            generator.setChannel(self.channels[channelIndex])
+            generator.load(records)
+            values = generator.values()
+            row[offset:offset + len(values)] = values
+            offset += len(values)
+
+
+class RssiFeatureSpec:
+    """
+    Channels, windows and statistics to compute. See the module docstring for the file format.
+    """
+    basicStatistics = ["label", "mean"]
+    extendedStatistics = ["label", "mean", "stdev", "median_grouped", "min_max_gap"]
+    # bins of the "hist" statistic
+    histogramEdges = list(range(-100, -29, 10))
+
+    def __init__(self, channels=None, windows=None, historySize=None):
+        self.channels = [0, 1, 2, None] if channels is None else [self.parseChannel(channel) for channel in channels]
+        self.windows = [self.parseWindow(window) for window in (windows or [])]
+        self.historySize = historySize
+
+        if not self.windows:
+            raise ValueError("feature spec has no windows")
+
+    @staticmethod
+    def parseChannel(channel):
+        if channel is None or channel == "all":
+            return None
+        if channel not in range(3):
+            raise ValueError(F"channel id must be 0,1,2 or null, got {channel}")
+        return channel
+
+    def parseWindow(self, window):
+        window = dict(window)
+        if ("count" in window) == ("seconds" in window):
+            raise ValueError(F"window needs either a count or seconds: {window}")
+
+        if "count" in window:
+            if int(window["count"]) < 1:
+                raise ValueError(F"window count must be at least 1: {window}")
+            window["count"] = int(window["count"])
+            window.setdefault("name", F"last-{window['count']}-records")
+        else:
+            if float(window["seconds"]) <= 0:
+                raise ValueError(F"window seconds must be positive: {window}")
+            window.setdefault("name", F"last-{window['seconds']}-seconds")
+
+        window["generators"] = [self.createGenerator(generator) if isinstance(generator, str) else generator
+                                for generator in window.get("generators", [])]
+
+        statistics = []
+        defaultStatistics = [] if window["generators"] else RssiFeaturePlan.statistics
+        for statistic in window.get("statistics", defaultStatistics):
+            if statistic == "hist":
+                edges = self.histogramEdges
+                statistics += [F"hist_{edges[i]}_{edges[i + 1]}" for i in range(len(edges) - 1)]
+                continue
+            RssiFeaturePlan.parseStatistic(statistic)
+            statistics.append(statistic)
+        window["statistics"] = statistics
+        return window
+
+    @staticmethod
+    def createGenerator(name):
+        """
+        Returns a new feature generator of RssiFeatures or RssiStreamingFeatures by name, with its default settings.
+        """
+        from crownstone_devtools.rssi.RssiFeatures import RssiChannelBasicFeatures, RssiChannelExtendedFeatures
+        from crownstone_devtools.rssi.RssiStreamingFeatures import RssiChannelQuantileFeatures, \
+            RssiChannelEwmaFeatures, RssiChannelHistogramFeatures
+
+        generators = {
+            "basic": RssiChannelBasicFeatures,
+            "extended": RssiChannelExtendedFeatures,
+            "quantiles": RssiChannelQuantileFeatures,
+            "ewma": RssiChannelEwmaFeatures,
+            "histogram": RssiChannelHistogramFeatures,
+        }
+        if name not in generators:
+            raise ValueError(F"unknown generator '{name}', expected one of {list(generators)}")
+        return generators[name]()
+
+    @staticmethod
+    def default():
+        """
+        The spec that reproduces the original, hard coded, columns.
+        """
+        basic = RssiFeatureSpec.basicStatistics
+        extended = RssiFeatureSpec.extendedStatistics
+        return RssiFeatureSpec(
+            channels=[0, 1, 2, None],
+            windows=[
+                {"name": "last-1-record", "count": 1, "statistics": basic},
+                {"name": "last-5-records", "count": 5, "statistics": extended},
+                {"name": "last-10-records", "count": 10, "statistics": extended},
+                {"name": "last-50-records", "count": 50, "statistics": extended},
+                {"name": "last-10-seconds", "seconds": 10, "statistics": extended},
+                {"name": "last-30-seconds", "seconds": 30, "statistics": extended},
+                {"name": "last-5-minutes", "seconds": 60*5, "statistics": extended},
+            ],
+            historySize=50)
+
+    @staticmethod
+    def fromDict(spec):
+        return RssiFeatureSpec(channels=spec.get("channels", None),
+                               windows=spec.get("windows", None),
+                               historySize=spec.get("historySize", None))
+
+    @staticmethod
+    def fromRecordFilters(tailFilters, channels=None, historySize=None):
+        """
+        Builds a spec from record filters of RssiFeatures, RssiRecordFilterByCount or RssiRecordFilterByTime,
+        with a window per filter that computes the columns of its statsGenerator.
+        """
+        windows = []
+        for tailFilter in tailFilters:
+            window = {"name": tailFilter.name, "statistics": [], "generators": [tailFilter.statsGenerator]}
+            if hasattr(tailFilter, "count"):
+                window["count"] = tailFilter.count
+            else:
+                window["seconds"] = tailFilter.seconds
+            windows.append(window)
+        return RssiFeatureSpec(channels=channels, windows=windows, historySize=historySize)
+
+    @staticmethod
+    def fromFile(path):
+        """
+        Loads a spec from a .json, .yaml or .yml file.
+        """
+        with open(path, "r") as specFile:
+            if str(path).endswith((".yaml", ".yml")):
+                try:
+                    import yaml
+                except ImportError:
+                    raise ImportError("Loading a yaml feature spec requires PyYAML, install it with: pip install pyyaml")
+                return RssiFeatureSpec.fromDict(yaml.safe_load(specFile))
+            return RssiFeatureSpec.fromDict(json.load(specFile))
+
+    def compile(self):
+        return RssiFeaturePlan(self)
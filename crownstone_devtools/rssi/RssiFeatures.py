@@ -13,6 +13,9 @@ class RssiChannelBasicFeatures:
     `channel`: 0 based channel id. or None for 'all non-zero values'.
     `records`: list of RssiNeighbourMessageRecord instances.
     """
+    # number of records needed for all features to be computed.
+    minimumRecords = 1
+
     def __init__(self):
         self.channel = None
         self.recordCount = None
@@ -96,6 +99,9 @@ class RssiChannelExtendedFeatures:
     `channel`: 0 based channel id. or None for 'all non-zero values'.
     `records`: list of RssiNeighbourMessageRecord instances.
     """
+    # number of records needed for all features to be computed.
+    minimumRecords = 2
+
     def __init__(self):
         self.channel = None
         self.recordCount = None
@@ -0,0 +1,63 @@
+import heapq
+
+from crownstone_devtools.util.Compression import openLogFile
+
+
+class RssiLogMerger:
+    """
+    Merges several log files (e.g. of multiple dev boards, or consecutive rotations) into a single
+    timestamp ordered stream of lines. Each file must be ordered by itself.
+
+    Uses a heap based k-way merge, so only one line per file is kept in memory.
+    Records are ordered by their timestamp field. Comments that start with a timestamp (keyboard events)
+    are ordered by it as well, other comments and lines stay right behind the preceding line of their file.
+    Ties are resolved in the order of `paths`.
+
+    Iterating the merger yields lines, so it can be passed to a parser's run() in place of a file.
+    """
+    def __init__(self, paths, verbose=False):
+        self.paths = list(paths)
+        self.verbose = verbose
+        self.lineCount = 0
+
+    def __str__(self):
+        return F"RssiLogMerger({', '.join(str(path) for path in self.paths)})"
+
+    def __iter__(self):
+        return self.lines()
+
+    def lines(self):
+        self.lineCount = 0
+        keyedLines = [self.keyedLines(path) for path in self.paths]
+        for key, line in heapq.merge(*keyedLines, key=lambda keyedLine: keyedLine[0]):
+            self.lineCount += 1
+            yield line
+
+        if self.verbose:
+            print(F"RssiLogMerger merged {self.lineCount} lines from {len(self.paths)} files")
+
+    def keyedLines(self, path):
+        """
+        Yields (key, line) for the lines in path. The key is the iso formatted timestamp string,
+        which sorts chronologically as long as all files use the same format.
+        """
+        key = ""
+        with openLogFile(path, "r") as logFile:
+            for line in logFile:
+                if not line.endswith("\n"):
+                    line += "\n"
+                timestamp = self.getTimestamp(line)
+                if timestamp is not None:
+                    key = timestamp
+                yield key, line
+
+    @staticmethod
+    def getTimestamp(line):
+        """
+        Returns the timestamp string of a record line or a timestamped comment, None if there is none.
+        """
+        field = line.lstrip("# ").split(",", 1)[0].strip()
+        # 2022-07-02T12:16:15.685190
+        if len(field) >= 19 and field[4] == "-" and field[10] == "T" and field[:4].isdigit():
+            return field
+        return None
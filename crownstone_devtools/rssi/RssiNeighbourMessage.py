@@ -1,5 +1,4 @@
 from crownstone_core.util.Conversion import Conversion
-from statistics import mean
 
 class RssiNeighbourMessage:
 	""" parses raw uart packet into python object and adds a human readible stringificator """
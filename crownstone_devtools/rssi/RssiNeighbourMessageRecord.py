@@ -24,13 +24,15 @@ class RssiNeighbourMessageRecord:
         # value will be a human readible/semantic value corresponding to labelchr
         self.labelstr = ""
 
+        # serial port of the dev board that received the message, None in logs from before it was logged.
+        self.port = None
+
         # runtime state, internal use only
         self.initialized = False
 
     def loadFromString(self, s):
-        print(F"s:={s}")
         vals = s.split(",")
-        i = iter(range(10))
+        i = iter(range(11))
         self.timestamp = datetime.fromisoformat(vals[next(i)])
         self.receiverId = int(vals[next(i)])
         self.senderId = int(vals[next(i)])
@@ -40,6 +42,7 @@ class RssiNeighbourMessageRecord:
         self.msgNumber = int(vals[next(i)])
         self.labelchr = vals[next(i)]
         self.labelstr = str(vals[next(i)]).strip()
+        self.port = vals[next(i)].strip() if len(vals) > 9 else None
         self.initialized = True
         return self
 
@@ -49,15 +52,18 @@ class RssiNeighbourMessageRecord:
         return msg.loadFromString(s)
 
     def __str__(self):
-        return ",".join([str(x) for x in [self.timestamp.isoformat(),
-                                           self.receiverId,
-                                           self.senderId,
-                                           self.rssis[0],
-                                           self.rssis[1],
-                                           self.rssis[2],
-                                           self.msgNumber,
-                                           self.labelchr,
-                                           self.labelstr]])
+        fields = [self.timestamp.isoformat(),
+                  self.receiverId,
+                  self.senderId,
+                  self.rssis[0],
+                  self.rssis[1],
+                  self.rssis[2],
+                  self.msgNumber,
+                  self.labelchr,
+                  self.labelstr]
+        if self.port is not None:
+            fields.append(self.port)
+        return ",".join([str(x) for x in fields])
         # return str(self.__dict__)
 
 if __name__ == "__main__":
@@ -0,0 +1,285 @@
+"""
+Multi-resolution rollups of RSSI logs in a local sqlite database.
+
+For every pair, channel and time bucket the store keeps: count, sum, sum of squares, min, max and the number of
+dropped messages (gaps in msgNumber). Buckets are kept at 1 second, 1 minute and 1 hour resolution, so that range
+queries can be answered from the coarsest resolution that fits, without touching the raw logs again.
+
+Channels 0-2 are the advertisement channels, channel 3 (ALL_CHANNELS) holds the mean of the non-zero channels of
+each record, like the 'all-channels' features. Drops are counted per pair, so every channel of a pair reports the
+same number of drops.
+
+Timestamps in the logs are naive, they are converted to seconds since 1970-01-01 as if they were UTC.
+"""
+import math
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+from crownstone_devtools.util.Compression import openLogFile, stripCompressionSuffix
+
+ALL_CHANNELS = 3
+
+# bucket sizes in seconds, finest first
+RESOLUTIONS = [1, 60, 3600]
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def toSeconds(timestamp):
+    return int((timestamp - EPOCH) // timedelta(seconds=1))
+
+
+def fromSeconds(seconds):
+    return EPOCH + timedelta(seconds=seconds)
+
+
+class RssiRollupStore:
+    """
+    Append-only rollup store. Use `ingestFile` to add raw logs and `query` to read aggregates.
+    """
+    def __init__(self, path, verbose=False):
+        self.path = path
+        self.verbose = verbose
+        self.connection = sqlite3.connect(str(path))
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.createTables()
+
+        # Key: resolution
+        # Value: map with:
+        #        Key:   (bucket, receiverId, senderId, channel)
+        #        Value: [count, sum, sumSq, minimum, maximum, drops]
+        self.pending = {resolution: {} for resolution in RESOLUTIONS}
+        self.pendingBucket = {resolution: None for resolution in RESOLUTIONS}
+
+        # Key:   (receiverId, senderId)
+        # Value: last msgNumber
+        self.lastMsgNumbers = dict(((r, s), n) for r, s, n in self.connection.execute(
+            "SELECT receiverId, senderId, msgNumber FROM lastMessage"))
+
+    def createTables(self):
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS rollup (
+                resolution INTEGER NOT NULL,
+                receiverId INTEGER NOT NULL,
+                senderId INTEGER NOT NULL,
+                channel INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                sum REAL NOT NULL,
+                sumSq REAL NOT NULL,
+                minimum REAL,
+                maximum REAL,
+                drops INTEGER NOT NULL,
+                PRIMARY KEY (resolution, receiverId, senderId, channel, bucket)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS ingested (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                records INTEGER NOT NULL,
+                file TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS lastMessage (
+                receiverId INTEGER NOT NULL,
+                senderId INTEGER NOT NULL,
+                msgNumber INTEGER NOT NULL,
+                PRIMARY KEY (receiverId, senderId)
+            );
+        """)
+
+    def close(self):
+        self.connection.close()
+
+    #################
+    #   Ingestion   #
+    #################
+
+    def ingestFile(self, path):
+        """
+        Adds the records of a raw log file. Files that were ingested before are skipped.
+        Files are identified by their name without compression suffix, so log.csv.gz is skipped when log.csv was
+        ingested before, e.g. after it was compressed by cs_rssi_neighbour_parser.
+        Returns the number of ingested records.
+        """
+        path = os.path.abspath(str(path))
+        key = str(stripCompressionSuffix(path))
+        stat = os.stat(path)
+        previous = self.connection.execute("SELECT file, size, mtime FROM ingested WHERE path = ?", (key,)).fetchone()
+        if previous is not None:
+            ingestedFile, size, mtime = previous
+            if ingestedFile != path:
+                if self.verbose:
+                    print(F"{path} was ingested before as {ingestedFile}, skipping it.")
+            elif (size, mtime) != (stat.st_size, stat.st_mtime):
+                print(F"{path} changed since it was ingested, skipping it. Only ingest completed log files.")
+            elif self.verbose:
+                print(F"{path} was ingested before, skipping it.")
+            return 0
+
+        records = 0
+        with openLogFile(path, "r") as logFile:
+            for line in logFile:
+                if self.ingestLine(line):
+                    records += 1
+        self.flush()
+
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO ingested VALUES (?, ?, ?, ?, ?)",
+                                    (key, stat.st_size, stat.st_mtime, records, path))
+            self.connection.executemany("INSERT OR REPLACE INTO lastMessage VALUES (?, ?, ?)",
+                                        [(r, s, n) for (r, s), n in self.lastMsgNumbers.items()])
+        if self.verbose:
+            print(F"ingested {records} records from {path}")
+        return records
+
+    def ingestLine(self, line):
+        """
+        Adds a single line of a raw log. Returns False for comments and lines that are not a record.
+        """
+        if not line.strip() or line[0] == "#":
+            return False
+        try:
+            vals = line.split(",", 8)
+            timestamp = datetime.fromisoformat(vals[0])
+            receiverId = int(vals[1])
+            senderId = int(vals[2])
+            rssis = [int(vals[3]), int(vals[4]), int(vals[5])]
+            msgNumber = int(vals[6])
+        except (ValueError, IndexError):
+            if self.verbose:
+                print(F"skipping line: '{line.strip()}'")
+            return False
+
+        drops = 0
+        previous = self.lastMsgNumbers.get((receiverId, senderId))
+        if previous is not None:
+            # msgNumber is a uint8, a repeated number is a duplicate rather than 255 drops.
+            drops = (msgNumber - previous - 1) % 256
+            if drops == 255:
+                drops = 0
+        self.lastMsgNumbers[(receiverId, senderId)] = msgNumber
+
+        seconds = toSeconds(timestamp)
+        nonzeroes = [rssi for rssi in rssis if rssi != 0]
+        values = [rssi if rssi != 0 else None for rssi in rssis]
+        allChannels = sum(nonzeroes) / len(nonzeroes) if nonzeroes else None
+
+        for resolution in RESOLUTIONS:
+            bucket = seconds - seconds % resolution
+            if self.pendingBucket[resolution] is not None and bucket > self.pendingBucket[resolution]:
+                self.flushResolution(resolution)
+            self.pendingBucket[resolution] = bucket
+
+            pending = self.pending[resolution]
+            for channel, rssi in enumerate(values):
+                self.accumulate(pending, (bucket, receiverId, senderId, channel), rssi, drops)
+            self.accumulate(pending, (bucket, receiverId, senderId, ALL_CHANNELS), allChannels, drops)
+        return True
+
+    @staticmethod
+    def accumulate(pending, key, value, drops):
+        aggregate = pending.get(key)
+        if aggregate is None:
+            aggregate = pending[key] = [0, 0, 0, None, None, 0]
+        aggregate[5] += drops
+        if value is None:
+            return
+        aggregate[0] += 1
+        aggregate[1] += value
+        aggregate[2] += value * value
+        if aggregate[3] is None or value < aggregate[3]:
+            aggregate[3] = value
+        if aggregate[4] is None or value > aggregate[4]:
+            aggregate[4] = value
+
+    def flush(self):
+        for resolution in RESOLUTIONS:
+            self.flushResolution(resolution)
+
+    def flushResolution(self, resolution):
+        pending = self.pending[resolution]
+        if not pending:
+            return
+        rows = [(resolution, receiverId, senderId, channel, bucket) + tuple(aggregate)
+                for (bucket, receiverId, senderId, channel), aggregate in pending.items()]
+        with self.connection:
+            # buckets that already exist (e.g. a bucket spanning two files) are merged.
+            self.connection.executemany("""
+                INSERT INTO rollup VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (resolution, receiverId, senderId, channel, bucket) DO UPDATE SET
+                    count = count + excluded.count,
+                    sum = sum + excluded.sum,
+                    sumSq = sumSq + excluded.sumSq,
+                    minimum = min(coalesce(minimum, excluded.minimum), coalesce(excluded.minimum, minimum)),
+                    maximum = max(coalesce(maximum, excluded.maximum), coalesce(excluded.maximum, maximum)),
+                    drops = drops + excluded.drops
+            """, rows)
+        pending.clear()
+
+    #################
+    #     Query     #
+    #################
+
+    def timeRange(self):
+        """ Returns (first, last) bucket start in seconds of the stored data, (None, None) when empty. """
+        return self.connection.execute("SELECT min(bucket), max(bucket) FROM rollup WHERE resolution = ?",
+                                       (RESOLUTIONS[0],)).fetchone()
+
+    @staticmethod
+    def selectResolution(start, end, step):
+        """
+        Returns the coarsest resolution whose buckets fit exactly in the range and in each step.
+        """
+        for resolution in reversed(RESOLUTIONS):
+            if start % resolution == 0 and end % resolution == 0 and step % resolution == 0:
+                return resolution
+        return RESOLUTIONS[0]
+
+    def query(self, start, end, step=None, receiverId=None, senderId=None, channel=ALL_CHANNELS):
+        """
+        Returns a list of dicts, one per step in [start, end), with count, mean, stdev, min, max and drops.
+        start, end: datetime or seconds. step: seconds, None for a single row for the whole range.
+        receiverId, senderId: None matches any crownstone.
+        """
+        start = toSeconds(start) if isinstance(start, datetime) else int(start)
+        end = toSeconds(end) if isinstance(end, datetime) else int(end)
+        step = int(step) if step else end - start
+        if step <= 0 or end <= start:
+            return []
+
+        resolution = self.selectResolution(start, end, step)
+        conditions = ["resolution = ?", "channel = ?", "bucket >= ?", "bucket < ?"]
+        parameters = [resolution, channel, start, end]
+        if receiverId is not None:
+            conditions.append("receiverId = ?")
+            parameters.append(receiverId)
+        if senderId is not None:
+            conditions.append("senderId = ?")
+            parameters.append(senderId)
+
+        sql = F"""
+            SELECT (bucket - ?) / ? AS slot, sum(count), sum(sum), sum(sumSq), min(minimum), max(maximum), sum(drops)
+            FROM rollup WHERE {" AND ".join(conditions)}
+            GROUP BY slot ORDER BY slot
+        """
+        if self.verbose:
+            print(F"query at resolution {resolution}s")
+
+        results = []
+        for slot, count, total, totalSq, minimum, maximum, drops in self.connection.execute(sql, [start, step] + parameters):
+            mean = total / count if count else None
+            stdev = None
+            if count and count > 1:
+                stdev = math.sqrt(max(totalSq - total * total / count, 0) / (count - 1))
+            results.append({
+                "start": fromSeconds(start + slot * step),
+                "count": count,
+                "mean": mean,
+                "stdev": stdev,
+                "min": minimum,
+                "max": maximum,
+                "drops": drops,
+            })
+        return results
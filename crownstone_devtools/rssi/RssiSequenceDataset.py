@@ -0,0 +1,97 @@
+"""
+Reads the record sequences written by RssiSequenceExport (cs_rssi_extract_features --sequenceLength K).
+
+The members of the archive are memory mapped, nothing is copied until a window is used:
+
+    dataset = RssiSequenceDataset("NeighborRssiLog_2022-07-02_12h00.sequences.npz")
+    rssis = dataset.windows("rssis")              # view: records - K + 1 x K x 3
+    batch = rssis[dataset.windowStarts[0:256]]    # copies only this batch
+    labels = dataset.labels[dataset.windowStarts[0:256] + dataset.sequenceLength - 1]
+
+Windows that start at an index that is not in windowStarts span two pairs and should not be used.
+"""
+import json
+import zipfile
+
+# size of the fixed part of a zip local file header, see the zip specification.
+ZIP_LOCAL_HEADER_SIZE = 30
+
+
+def memmapNpzMembers(path):
+    """
+    Returns a dict with the arrays of an uncompressed .npz archive, memory mapped read only.
+    Compressed members are loaded into memory instead.
+    """
+    import numpy
+
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as archiveFile:
+        for info in archive.infolist():
+            if not info.filename.endswith(".npy"):
+                continue
+            name = info.filename[:-len(".npy")]
+            if info.compress_type != zipfile.ZIP_STORED:
+                with archive.open(info) as member:
+                    arrays[name] = numpy.lib.format.read_array(member, allow_pickle=False)
+                continue
+
+            # the member data follows its local header, which has its own name and extra field lengths.
+            archiveFile.seek(info.header_offset)
+            localHeader = archiveFile.read(ZIP_LOCAL_HEADER_SIZE)
+            nameLength = int.from_bytes(localHeader[26:28], "little")
+            extraLength = int.from_bytes(localHeader[28:30], "little")
+            archiveFile.seek(info.header_offset + ZIP_LOCAL_HEADER_SIZE + nameLength + extraLength)
+
+            version = numpy.lib.format.read_magic(archiveFile)
+            if version == (1, 0):
+                shape, fortranOrder, dtype = numpy.lib.format.read_array_header_1_0(archiveFile)
+            else:
+                shape, fortranOrder, dtype = numpy.lib.format.read_array_header_2_0(archiveFile)
+            if 0 in shape:
+                arrays[name] = numpy.empty(shape, dtype=dtype)
+            else:
+                arrays[name] = numpy.memmap(path, dtype=dtype, mode="r", offset=archiveFile.tell(), shape=shape,
+                                            order="F" if fortranOrder else "C")
+    return arrays
+
+
+class RssiSequenceDataset:
+    def __init__(self, path):
+        with zipfile.ZipFile(path) as archive:
+            self.schema = json.loads(archive.read("schema.json"))
+        self.sequenceLength = self.schema["sequenceLength"]
+
+        arrays = memmapNpzMembers(path)
+        self.rssis = arrays["rssis"]
+        self.timeDeltas = arrays["timeDeltas"]
+        self.msgNumberGaps = arrays["msgNumberGaps"]
+        self.labels = arrays["labels"]
+        self.labelNames = [str(label) for label in arrays["labelNames"]]
+        self.pairs = arrays["pairs"]
+        self.windowStarts = arrays["windowStarts"]
+
+    def __len__(self):
+        return len(self.windowStarts)
+
+    def windows(self, name):
+        """
+        Returns a strided view with a window of sequenceLength records at every record index of the given member,
+        e.g. windows("rssis")[i] is rssis[i:i + sequenceLength]. Only the indices in windowStarts are valid.
+        """
+        import numpy
+
+        values = getattr(self, name)
+        if len(values) < self.sequenceLength:
+            return numpy.empty((0, self.sequenceLength) + values.shape[1:], dtype=values.dtype)
+        view = numpy.lib.stride_tricks.sliding_window_view(values, self.sequenceLength, axis=0)
+        # sliding_window_view puts the window axis last, move it next to the record axis.
+        return numpy.moveaxis(view, -1, 1)
+
+    def window(self, index):
+        """
+        Returns the members of window `index` (an index in windowStarts) as views, and the label of its last record.
+        """
+        start = int(self.windowStarts[index])
+        end = start + self.sequenceLength
+        return (self.rssis[start:end], self.timeDeltas[start:end], self.msgNumberGaps[start:end],
+                self.labelNames[self.labels[end - 1]])
@@ -0,0 +1,193 @@
+"""
+Stratified sampling of the rows produced by RssiNeighbourMessageAggregator.
+
+Labelled captures are dominated by long stretches of one label, e.g. "None". The sampler keeps a subset of the
+rows of every stratum, a (receiverId, senderId, labelchr) combination, with a target per label:
+    ratio: keep this fraction of the rows, spread evenly: row n of the stratum is kept when n * ratio passes an integer.
+    count: keep this many rows, chosen uniformly with reservoir sampling (seeded, so runs are reproducible).
+Labels without a target keep all their rows, unless the label "*" has a target, which then applies to them.
+
+The sampler only decides which rows are written. The aggregator still adds every record to its windows, and only
+evaluates the statistics of the selected rows, so those are identical to the rows of a full run.
+"""
+import random
+
+
+def parseSampleTarget(string):
+    """
+    Parses a command line target "label=value" into (label, value), e.g. "None=0.05" or "a=500".
+    """
+    label, separator, value = string.rpartition("=")
+    if not separator or not label:
+        raise ValueError(F"expected label=value, got {string}")
+    return label, float(value)
+
+
+class RssiSamplingStratum:
+    __slots__ = ["seen", "kept", "reservoir"]
+
+    def __init__(self):
+        self.seen = 0
+        self.kept = 0
+        # count targets: indices of the buffered rows in the reservoir.
+        self.reservoir = []
+
+
+class RssiStratifiedSampler:
+    """
+    Wraps a feature sink (see RssiFeatureSinks): `select(record)` decides whether the row of a record is wanted,
+    the selected rows are then written to the sampler as to a sink.
+
+    With only ratio targets the rows are passed on directly. With count targets a row can be replaced by a later one,
+    so all rows and comments are buffered until `close`, and written in input order.
+
+    Rows that the sink would skip as incomplete are not counted as seen, so the targets apply to the rows that are
+    written, and reservoir sampling stays uniform over them. `select` is told whether a row is complete before its
+    statistics are computed, see RssiFeaturePlan.isComplete. A selected row that still turns out to be incomplete
+    when it is written is taken back, as if it wasn't seen.
+    """
+    def __init__(self, sink, ratios=None, counts=None, seed=0, verbose=False):
+        self.sink = sink
+        self.ratios = dict(ratios or {})
+        self.counts = {label: int(count) for label, count in (counts or {}).items()}
+        self.seed = seed
+        self.verbose = verbose
+
+        for label in self.ratios.keys() & self.counts.keys():
+            raise ValueError(F"label {label} has both a sample ratio and a sample count")
+        for label, ratio in self.ratios.items():
+            if not 0 <= ratio <= 1:
+                raise ValueError(F"sample ratio of label {label} must be between 0 and 1, got {ratio}")
+        for label, count in self.counts.items():
+            if count < 0:
+                raise ValueError(F"sample count of label {label} can't be negative, got {count}")
+
+        self.buffered = bool(self.counts)
+        self.binaryOutput = sink.binaryOutput
+        self.outputExtension = sink.outputExtension
+        self.reset()
+
+    def reset(self):
+        self.random = random.Random(self.seed)
+        # (receiverId, senderId, labelchr) -> RssiSamplingStratum
+        self.strata = {}
+        # row index -> (record, columnValues), or (None, comment line)
+        self.rows = {}
+        self.rowIndex = 0
+        # the stratum of the selected row and, for count targets, its reservoir position, used by write.
+        self.pendingStratum = None
+        self.pendingPosition = None
+
+    def target(self, label):
+        """
+        Returns ("ratio", value), ("count", value) or (None, None) for the given label.
+        """
+        for key in (label, "*"):
+            if key in self.ratios:
+                return "ratio", self.ratios[key]
+            if key in self.counts:
+                return "count", self.counts[key]
+        return None, None
+
+    def select(self, record, complete=True):
+        """
+        Returns True if the row of this record should be written.
+        complete: False if the sink would skip the row as incomplete. It is skipped without being counted.
+        """
+        if not complete:
+            print("*** skipping incomplete record ***")
+            return False
+
+        label = str(record.labelchr)
+        key = (record.receiverId, record.senderId, label)
+        stratum = self.strata.get(key)
+        if stratum is None:
+            stratum = self.strata[key] = RssiSamplingStratum()
+        stratum.seen += 1
+
+        kind, value = self.target(label)
+        if kind is None:
+            selected = True
+        elif kind == "ratio":
+            selected = int(stratum.seen * value) > int((stratum.seen - 1) * value)
+        elif len(stratum.reservoir) < value:
+            selected = True
+            self.pendingPosition = len(stratum.reservoir)
+            stratum.reservoir.append(None)
+        else:
+            # algorithm R: the n-th row replaces a random one of the reservoir with probability count / n.
+            position = self.random.randrange(stratum.seen)
+            selected = position < value
+            if selected:
+                self.pendingPosition = position
+
+        if selected:
+            self.pendingStratum = stratum
+            if kind != "count":
+                self.pendingPosition = None
+        return selected
+
+    def open(self, outFile, columnNames, writeHeader=True):
+        self.reset()
+        self.sink.open(outFile, columnNames, writeHeader=writeHeader)
+
+    def writeComment(self, line):
+        if not self.buffered:
+            self.sink.writeComment(line)
+            return
+        self.rows[self.rowIndex] = (None, line)
+        self.rowIndex += 1
+
+    def write(self, record, columnValues):
+        """
+        Writes the row of the record that was selected last.
+        Returns True if it was written, False if the sink skips it because it is incomplete.
+        """
+        stratum, position = self.pendingStratum, self.pendingPosition
+        self.pendingStratum = self.pendingPosition = None
+        if not self.buffered:
+            written = self.sink.write(record, columnValues)
+            stratum.kept += written
+            stratum.seen -= not written
+            return written
+
+        if not self.sink.accepts(columnValues):
+            print("*** skipping incomplete record ***")
+            # as if the row wasn't there, so the reservoir stays a uniform sample of the written rows.
+            stratum.seen -= 1
+            if position is not None and stratum.reservoir[position] is None:
+                stratum.reservoir.pop()
+            return False
+
+        if position is not None:
+            replaced = stratum.reservoir[position]
+            if replaced is not None:
+                del self.rows[replaced]
+                stratum.kept -= 1
+            stratum.reservoir[position] = self.rowIndex
+        stratum.kept += 1
+        self.rows[self.rowIndex] = (record, columnValues)
+        self.rowIndex += 1
+        return True
+
+    def close(self):
+        for index in sorted(self.rows):
+            record, value = self.rows[index]
+            if record is None:
+                self.sink.writeComment(value)
+            else:
+                self.sink.write(record, value)
+        self.rows = {}
+        self.sink.close()
+        self.printStatistics()
+
+    def printStatistics(self):
+        labels = {}
+        for (receiverId, senderId, label), stratum in self.strata.items():
+            seen, kept = labels.get(label, (0, 0))
+            labels[label] = (seen + stratum.seen, kept + stratum.kept)
+        summary = ", ".join(F"{label}: {kept}/{seen}" for label, (seen, kept) in sorted(labels.items()))
+        print(F"RssiStratifiedSampler kept rows per label: {summary}")
+        if self.verbose:
+            for key, stratum in sorted(self.strata.items()):
+                print(F"    {key}: {stratum.seen} rows")
@@ -0,0 +1,295 @@
+"""
+Feature generators that use constant memory, regardless of the number of records they are fed.
+
+They follow the same protocol as RssiChannelExtendedFeatures: `setChannel()`, `load(records)`, `columnNames()` and
+`values()`, so they can be used as `statsGenerator` of any record filter. On top of that `reset()` and
+`update(record)` allow feeding records one by one, without keeping them in a list. RssiFeaturePlan uses them for
+the percentiles, EWMAs and histograms of time windows, fed through `addValue` with the values it already extracted.
+
+Features that cannot be computed are set to "".
+"""
+import math
+from array import array
+from bisect import bisect_right, insort
+
+from crownstone_devtools.rssi.RssiFeatures import RssiChannelBasicFeatures
+
+
+class P2QuantileEstimator:
+    """
+    Estimates a single quantile with the P² algorithm (Jain & Chlamtac, 1985), using 5 markers.
+    The first `exactCount` values are kept, so the estimate is exact up to that many values. After that the markers
+    start at the ranks of the kept values, which is more accurate than starting from the first 5 values.
+
+    `quantile`: between 0 and 1, e.g. 0.9 for the 90th percentile.
+    `exactCount`: at least 5.
+    """
+    __slots__ = ["quantile", "exactCount", "values", "heights", "positions", "desired", "increments"]
+
+    def __init__(self, quantile, exactCount=5):
+        if not 0 <= quantile <= 1:
+            raise ValueError(F"quantile must be between 0 and 1, got {quantile}")
+        if exactCount < 5:
+            raise ValueError(F"exactCount must be at least 5, got {exactCount}")
+        self.quantile = quantile
+        self.exactCount = exactCount
+        q = quantile
+        self.increments = [0, q/2, q, (1 + q)/2, 1]
+        self.reset()
+
+    def reset(self):
+        # sorted values, until there are more than exactCount.
+        self.values = []
+        self.heights = None
+        self.positions = None
+        self.desired = None
+
+    def startMarkers(self):
+        """
+        Places the markers at the ranks of the kept values.
+        """
+        values = self.values
+        n = len(values)
+        self.desired = [1 + (n - 1) * increment for increment in self.increments]
+        positions = [1 + round(desired - 1) for desired in self.desired]
+        # markers need distinct positions.
+        for i in range(3, -1, -1):
+            positions[i] = min(positions[i], positions[i+1] - 1)
+        for i in range(1, 5):
+            positions[i] = max(positions[i], positions[i-1] + 1)
+        self.positions = positions
+        self.heights = [values[position - 1] for position in positions]
+        self.values = []
+
+    def add(self, value):
+        if self.heights is None:
+            insort(self.values, value)
+            if len(self.values) > self.exactCount:
+                self.startMarkers()
+            return
+        heights = self.heights
+
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = bisect_right(heights, value) - 1
+
+        positions = self.positions
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        desired = self.desired
+        increments = self.increments
+        for i in range(5):
+            desired[i] += increments[i]
+
+        for i in range(1, 4):
+            delta = desired[i] - positions[i]
+            if (delta >= 1 and positions[i+1] - positions[i] > 1) or (delta <= -1 and positions[i-1] - positions[i] < -1):
+                step = 1 if delta > 0 else -1
+                height = self.parabolic(i, step)
+                if not heights[i-1] < height < heights[i+1]:
+                    height = heights[i] + step * (heights[i+step] - heights[i]) / (positions[i+step] - positions[i])
+                heights[i] = height
+                positions[i] += step
+
+    def parabolic(self, i, step):
+        heights = self.heights
+        positions = self.positions
+        return heights[i] + step / (positions[i+1] - positions[i-1]) * (
+            (positions[i] - positions[i-1] + step) * (heights[i+1] - heights[i]) / (positions[i+1] - positions[i]) +
+            (positions[i+1] - positions[i] - step) * (heights[i] - heights[i-1]) / (positions[i] - positions[i-1]))
+
+    def value(self):
+        """
+        Returns the estimate, or None if no values were added.
+        """
+        if self.heights is not None:
+            return self.heights[2]
+        values = self.values
+        if not values:
+            return None
+        # exact, linear interpolation between the closest ranks.
+        position = self.quantile * (len(values) - 1)
+        lower = int(position)
+        if lower + 1 >= len(values):
+            return values[lower]
+        return values[lower] + (values[lower+1] - values[lower]) * (position - lower)
+
+
+class RssiChannelStreamingFeatures:
+    """
+    Base class of the constant memory generators.
+    Subclasses implement reset(), add(rssi, record), columnNames() and values().
+    """
+    # number of records needed for all features to be computed.
+    minimumRecords = 1
+
+    def __init__(self):
+        self.channel = None
+        self.reset()
+
+    def setChannel(self, channel):
+        if channel not in range(3) and channel is not None:
+            raise ValueError(F"channel id must be 0,1 or 2, got {channel}")
+
+        self.channel = channel
+
+    # same definition as the other generators
+    toRssi = RssiChannelBasicFeatures.toRssi
+
+    def reset(self):
+        self.recordCount = 0
+
+    def update(self, record):
+        """
+        Adds a single record. Records without a value for the channel are ignored.
+        """
+        self.addValue(self.toRssi(record), record)
+
+    def addValue(self, rssi, record):
+        """
+        Adds the rssi value of a record, for callers that already extracted it. None and 0 are ignored.
+        """
+        if rssi is None or rssi == 0:
+            return
+        self.recordCount += 1
+        self.add(rssi, record)
+
+    def load(self, records):
+        """
+        Computes the features of `records` (a list of RssiNeighbourMessageRecord objects), forgetting earlier records.
+        """
+        self.reset()
+        for record in records:
+            self.update(record)
+
+    def __str__(self):
+        """
+        creates a comma separated string of the values of the columns.
+        """
+        return ",".join([str(val) for val in self.values()])
+
+
+class RssiChannelQuantileFeatures(RssiChannelStreamingFeatures):
+    """
+    Quantiles of the rssi values, estimated with a P² sketch per quantile.
+
+    `quantiles`: between 0 and 1. Columns are named after the percentile: 0.1 becomes "p10".
+    `exactCount`: number of values up to which the quantiles are exact, see P2QuantileEstimator.
+    """
+    def __init__(self, quantiles=(0.1, 0.5, 0.9), exactCount=5):
+        self.estimators = [P2QuantileEstimator(quantile, exactCount) for quantile in quantiles]
+        super().__init__()
+
+    def reset(self):
+        super().reset()
+        for estimator in self.estimators:
+            estimator.reset()
+
+    def add(self, rssi, record):
+        for estimator in self.estimators:
+            estimator.add(rssi)
+
+    def columnNames(self):
+        return [F"p{estimator.quantile * 100:g}" for estimator in self.estimators]
+
+    def values(self):
+        if self.recordCount == 0:
+            return [""] * len(self.estimators)
+        return [estimator.value() for estimator in self.estimators]
+
+
+class RssiChannelEwmaFeatures(RssiChannelStreamingFeatures):
+    """
+    Exponentially weighted means of the rssi values, weighted by the age of the record relative to the newest record:
+    a record that is `halfLife` seconds older than the newest record weighs half as much.
+    Records can be added in any order, e.g. newest first.
+
+    `halfLives`: in seconds, one column "ewma_<halfLife>s" per half life.
+    """
+    def __init__(self, halfLives=(10, 60, 300)):
+        self.halfLives = list(halfLives)
+        if any(halfLife <= 0 for halfLife in self.halfLives):
+            raise ValueError(F"half lives must be positive, got {self.halfLives}")
+        super().__init__()
+
+    def reset(self):
+        super().reset()
+        self.lastTimestamp = None
+        self.weightedSums = [0.0] * len(self.halfLives)
+        self.weights = [0.0] * len(self.halfLives)
+
+    def add(self, rssi, record):
+        elapsed = 0.0
+        if self.lastTimestamp is not None:
+            elapsed = (record.timestamp - self.lastTimestamp).total_seconds()
+
+        if elapsed >= 0:
+            # newest record so far: decay the sums.
+            self.lastTimestamp = record.timestamp
+            for i, halfLife in enumerate(self.halfLives):
+                decay = 0.5 ** (elapsed / halfLife)
+                self.weightedSums[i] = self.weightedSums[i] * decay + rssi
+                self.weights[i] = self.weights[i] * decay + 1.0
+        else:
+            # older record: decay the value instead.
+            for i, halfLife in enumerate(self.halfLives):
+                weight = 0.5 ** (-elapsed / halfLife)
+                self.weightedSums[i] += weight * rssi
+                self.weights[i] += weight
+
+    def columnNames(self):
+        return [F"ewma_{halfLife:g}s" for halfLife in self.halfLives]
+
+    def values(self):
+        if self.recordCount == 0:
+            return [""] * len(self.halfLives)
+        return [weightedSum / weight for weightedSum, weight in zip(self.weightedSums, self.weights)]
+
+
+class RssiChannelHistogramFeatures(RssiChannelStreamingFeatures):
+    """
+    Fraction of the rssi values per fixed bin. Rssi values are int8, so every possible value is mapped to its bin
+    once, at construction. Values outside [lower, upper) are counted in the total, but not in any bin.
+
+    Columns are named "hist_<from>_<to>", the bin includes <from> but not <to>.
+    `edges`: ascending bin edges, instead of bins of `binWidth` from `lower` to `upper`.
+    """
+    def __init__(self, lower=-100, upper=-30, binWidth=10, edges=None):
+        if edges is None:
+            if not -128 <= lower < upper <= 128 or binWidth < 1:
+                raise ValueError(F"invalid histogram bins: lower={lower} upper={upper} binWidth={binWidth}")
+            edges = list(range(lower, upper, binWidth)) + [upper]
+        self.edges = [int(edge) for edge in edges]
+        if len(self.edges) < 2 or self.edges != sorted(set(self.edges)) or not -128 <= self.edges[0] <= self.edges[-1] <= 128:
+            raise ValueError(F"invalid histogram edges: {edges}")
+
+        # bin index of all int8 values, offset by 128. -1 for values outside the bins.
+        self.binOfValue = array("b", [-1] * 256)
+        for i in range(len(self.edges) - 1):
+            for value in range(self.edges[i], self.edges[i+1]):
+                self.binOfValue[value + 128] = i
+        super().__init__()
+
+    def reset(self):
+        super().reset()
+        self.counts = array("I", [0] * (len(self.edges) - 1))
+
+    def add(self, rssi, record):
+        # the 'all channels' value is a mean, which may be a float.
+        index = min(max(math.floor(rssi), -128), 127) + 128
+        binIndex = self.binOfValue[index]
+        if binIndex >= 0:
+            self.counts[binIndex] += 1
+
+    def columnNames(self):
+        return [F"hist_{self.edges[i]}_{self.edges[i+1]}" for i in range(len(self.edges) - 1)]
+
+    def values(self):
+        if self.recordCount == 0:
+            return [""] * len(self.counts)
+        return [count / self.recordCount for count in self.counts]
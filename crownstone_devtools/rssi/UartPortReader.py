@@ -0,0 +1,169 @@
+"""
+Reads uart messages from several dev boards in one process.
+
+The crownstone_uart lib publishes all messages on a single global event bus, so when several CrownstoneUart
+instances are used, it is unknown from which port a message came. UartPortReader reads one serial port on its
+own thread and parses the uart wrapper packets itself, so that each message can be tagged with its port.
+"""
+import threading
+
+from crownstone_devtools.util.CRC import crc16ccitt
+
+START_TOKEN = 0x7e
+ESCAPE_TOKEN = 0x5c
+BIT_FLIP_MASK = 0x40
+
+PROTOCOL_MAJOR = 1
+UART_MESSAGE = 0
+
+# size field, wrapper header (protocol major, protocol minor, message type) and crc.
+SIZE_HEADER_SIZE = 2
+WRAPPER_HEADER_SIZE = 3
+CRC_SIZE = 2
+
+
+def escape(data):
+    """ Returns data with start and escape tokens escaped. """
+    result = bytearray()
+    for byte in data:
+        if byte == START_TOKEN or byte == ESCAPE_TOKEN:
+            result.append(ESCAPE_TOKEN)
+            result.append(byte ^ BIT_FLIP_MASK)
+        else:
+            result.append(byte)
+    return bytes(result)
+
+
+def encodeUartMessage(opCode, payload):
+    """ Returns the uart wrapper packet of a message, as a dev board sends it. The inverse of UartFrameReader. """
+    body = bytes([PROTOCOL_MAJOR, 0, UART_MESSAGE, opCode & 0xFF, opCode >> 8]) + bytes(payload)
+    crc = crc16ccitt(body)
+    frame = body + bytes([crc & 0xFF, crc >> 8])
+    return bytes([START_TOKEN]) + escape(bytes([len(frame) & 0xFF, len(frame) >> 8]) + frame)
+
+
+def unescape(data):
+    """ Returns data with escaped bytes restored. A trailing escape token is dropped. """
+    if ESCAPE_TOKEN not in data:
+        return bytes(data)
+    parts = bytes(data).split(bytes([ESCAPE_TOKEN]))
+    result = bytearray(parts[0])
+    for part in parts[1:]:
+        if part:
+            result.append(part[0] ^ BIT_FLIP_MASK)
+            result += part[1:]
+    return bytes(result)
+
+
+class UartFrameReader:
+    """
+    Splits a stream of uart bytes into messages: start token, escaping, size and crc are handled.
+    Works on whole chunks of bytes instead of byte by byte, which keeps the cpu load per port low.
+
+    onMessage(opCode, payload) is called for every valid, unencrypted uart message.
+    """
+    def __init__(self, onMessage):
+        self.onMessage = onMessage
+        self.buffer = bytearray()
+        self.discardedBytes = 0
+        self.failedFrames = 0
+
+    def add(self, data):
+        self.buffer += data
+        while self.buffer:
+            start = self.buffer.find(START_TOKEN)
+            if start < 0:
+                self.discardedBytes += len(self.buffer)
+                self.buffer.clear()
+                return
+            if start > 0:
+                self.discardedBytes += start
+                del self.buffer[:start]
+
+            nextStart = self.buffer.find(START_TOKEN, 1)
+            frame = unescape(self.buffer[1:nextStart] if nextStart >= 0 else self.buffer[1:])
+
+            size = frame[0] | frame[1] << 8 if len(frame) >= SIZE_HEADER_SIZE else None
+            if size is not None and len(frame) >= SIZE_HEADER_SIZE + size:
+                self.handleFrame(frame[SIZE_HEADER_SIZE:SIZE_HEADER_SIZE + size])
+            elif nextStart < 0:
+                # incomplete, wait for more data
+                return
+            else:
+                self.failedFrames += 1
+
+            if nextStart < 0:
+                self.buffer.clear()
+            else:
+                del self.buffer[:nextStart]
+
+    def handleFrame(self, frame):
+        if len(frame) < WRAPPER_HEADER_SIZE + CRC_SIZE:
+            self.failedFrames += 1
+            return
+
+        body = frame[:-CRC_SIZE]
+        crc = frame[-2] | frame[-1] << 8
+        if crc16ccitt(body) != crc:
+            self.failedFrames += 1
+            return
+
+        protocolMajor, protocolMinor, messageType = body[0], body[1], body[2]
+        if protocolMajor != PROTOCOL_MAJOR or messageType != UART_MESSAGE or len(body) < WRAPPER_HEADER_SIZE + 2:
+            return
+
+        opCode = body[3] | body[4] << 8
+        self.onMessage(opCode, body[5:])
+
+
+class UartPortReader(threading.Thread):
+    """
+    Thread that reads a single serial port and calls onMessage(port, opCode, payload) for each uart message.
+    onMessage is called from this thread. Exceptions raised by onMessage are printed and counted, the thread keeps
+    reading.
+    """
+    def __init__(self, port, onMessage, baudrate=230400, verbose=False):
+        super().__init__(name=F"UartPortReader({port})", daemon=True)
+        self.port = port
+        self.baudrate = baudrate
+        self.verbose = verbose
+        self.running = True
+        self.onMessage = onMessage
+        self.failedMessages = 0
+        self.frameReader = UartFrameReader(self.handleMessage)
+
+    def handleMessage(self, opCode, payload):
+        try:
+            self.onMessage(self.port, opCode, payload)
+        except Exception as e:
+            # a failing message must not stop the capture of this port while the other ports keep logging.
+            self.failedMessages += 1
+            print(F"Error: failed to handle message {opCode} of {self.port}: {type(e).__name__}: {e}")
+
+    def run(self):
+        import serial
+
+        try:
+            serialController = serial.Serial(self.port, self.baudrate, timeout=0.25)
+        except (OSError, serial.SerialException) as e:
+            print(F"Failed to open {self.port}: {e}")
+            return
+
+        print(F"reading from {self.port}")
+        with serialController:
+            while self.running:
+                try:
+                    # blocks until a byte is received or the timeout passes, then takes whatever else is waiting.
+                    data = serialController.read(max(1, serialController.in_waiting))
+                except (OSError, serial.SerialException) as e:
+                    print(F"Connection to {self.port} failed: {e}")
+                    break
+                if data:
+                    self.frameReader.add(data)
+
+        if self.verbose:
+            print(F"stopped reading from {self.port}, discarded {self.frameReader.discardedBytes} bytes, "
+                  F"{self.frameReader.failedFrames} failed frames, {self.failedMessages} failed messages")
+
+    def stop(self):
+        self.running = False
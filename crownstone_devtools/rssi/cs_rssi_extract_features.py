@@ -4,13 +4,31 @@ meaningful derrived data such as running averages.
 
 Several parsers can be run sequentially. Intermediate files will be saved to a working directory,
 which can be distinct from input/output dir.
+
+With --checkpoint (or --follow) only the lines that were added since the previous run are processed,
+see FeatureExtractor.parseIncrementally.
+
+With --trace the processing of individual records is written to a file as json lines, see util/Tracing.py.
+--verbose traces everything to stderr.
 """
+import io
 import os
+import time
 import argparse
 from pathlib import Path
 
+from crownstone_devtools.rssi.ExtractionCheckpoint import ExtractionCheckpoint
+from crownstone_devtools.rssi.RssiLogMerger import RssiLogMerger
+from crownstone_devtools.rssi.RssiStratifiedSampler import parseSampleTarget
+from crownstone_devtools.rssi.parsers.DuplicateMessageFilter import DuplicateMessageFilter
 from crownstone_devtools.rssi.parsers.RssiNeighbourMessageAggregator import RssiNeighbourMessageAggregator
+from crownstone_devtools.rssi.parsers.RssiFeatureMatrixPivot import RssiFeatureMatrixPivot
+from crownstone_devtools.rssi.parsers.RssiPresenceInference import RssiPresenceInference
 from crownstone_devtools.rssi.parsers.SenderReceiverFilter import SenderReceiverFilter
+from crownstone_devtools.util.Compression import compressionOf, findLogFiles, openLogFile, openLogFileAt, stripCompressionSuffix
+from crownstone_devtools.util.Tracing import configureTracing, getTracer, parseTraceLevel
+
+_TRACER = getTracer("rssi.pipeline")
 
 class FeatureExtractor:
     # def __init__(self, fileNameRegex, inputDirectory, workDirectory, outputDirectory, parsers, extractedFileSuffix=None, dryRun=False):
@@ -22,14 +40,16 @@ class FeatureExtractor:
         outputDirectory: where the extracted files are placed.
         extractedFileSuffix: will be added to the root of the filename. E.g.: myFile.xyz.csv -> myFile.suffix.xyz.csv
         dryRun: if True, script only produces terminal output. UNTESTED.
+        mergedFileName: name of the (virtual) input file when all files are merged, see parseMergedFiles.
         """
         self.fileNameRegex = kwargs.get("fileNameRegex")
         self.inputDirectory = kwargs.get("inputDirectory", None) or Path('.')
         self.outputDirectory = kwargs.get("outputDirectory",  None) or self.inputDirectory
         self.workDirectory = kwargs.get("workDirectory", None) or self.outputDirectory
-        self.extractedFileSuffix = kwargs.get("suffix", ".features")
+        self.extractedFileSuffix = kwargs.get("suffix", None) or ".features"
         self.verbose = kwargs.get("verbose", False)
         self.dryRun = bool(kwargs.get("dryRun", False)) # UNTESTED
+        self.mergedFileName = kwargs.get("mergedFileName", None) or "merged.csv"
 
         self.inputDirectory = self.validatePath(self.inputDirectory)
         self.workDirectory = self.validatePath(self.workDirectory)
@@ -46,9 +66,15 @@ class FeatureExtractor:
         return p
 
     def parseAllFiles(self):
-        for p in sorted(self.inputDirectory.glob(self.fileNameRegex)):
+        for p in self.findInputFiles():
             self.parseSingleFile(p)
 
+    def findInputFiles(self):
+        """
+        Returns the sorted paths matching fileNameRegex, including compressed versions (e.g. log.csv.gz).
+        """
+        return findLogFiles(self.inputDirectory, self.fileNameRegex)
+
     def parseSingleFile(self, pathToFile):
         """
         Runs the `parsers` on the given path. Intermediate files are written to the `workDir`.
@@ -60,34 +86,232 @@ class FeatureExtractor:
         if not tail:
             raise ValueError(F"filename part of path is empty: {pathToFile}")
 
+        self.runParsers(pathToFile, pathToFile)
+
+    def parseMergedFiles(self):
+        """
+        Merges all matching files into one timestamp ordered stream (see RssiLogMerger) and runs the `parsers`
+        on it, so windows continue across file boundaries. The output is named after `mergedFileName`.
+        """
+        paths = self.findInputFiles()
+        if not paths:
+            print(F"no files found matching {self.fileNameRegex} in {self.inputDirectory}")
+            return
+
+        merger = RssiLogMerger(paths, verbose=self.verbose)
+        self.runParsers(merger, Path(self.inputDirectory, self.mergedFileName))
+
+    def runParsers(self, source, pathToFile):
+        """
+        source: path to the input file, or an iterable of lines such as a RssiLogMerger.
+        pathToFile: determines the names of the intermediate and output files.
+        """
         workfilesOut = self.getWorkFilePaths(pathToFile, len(self.parsers))  # out.0, out.1, ...
-        workfilesIn = [pathToFile] + workfilesOut[:-1]                       # in,    out.0, out.1, ...
+        workfilesIn = [source] + workfilesOut[:-1]                           # in,    out.0, out.1, ...
 
         for index, (parser, inPath, outPath) in enumerate(zip(self.parsers, workfilesIn, workfilesOut)):
             print(F"parsers[{index}].run({inPath}, {outPath})")
 
-            with open(inPath, "r") as inFile:
-                with open(outPath, "w+") as outFile:
-                    parser.run(inFile,outFile)
+            # parsers with a typed output sink write binary files
+            outMode = "wb" if getattr(parser, "binaryOutput", False) else "w+"
+
+            startTime = time.perf_counter()
+            with open(outPath, outMode) as outFile:
+                if isinstance(inPath, Path):
+                    with openLogFile(inPath, "r") as inFile:
+                        parser.run(inFile, outFile)
+                else:
+                    parser.run(inPath, outFile)
+            _TRACER.info("stage", index=index, parser=type(parser).__name__, input=str(inPath), output=str(outPath),
+                         seconds=time.perf_counter() - startTime)
 
         self.moveFileOut(workfilesOut[-1])
 
+    def parseIncrementally(self, checkpointPath, follow=False, liveDirectory=None, pollInterval=1.0):
+        """
+        Only processes the lines that were added to the input files since the previous run with the same
+        checkpoint (see ExtractionCheckpoint), and appends their rows to the output files. The parsers continue
+        with the window state of the checkpoint, so the output equals that of parseAllFiles on the complete files.
+
+        follow: keep processing new lines every `pollInterval` seconds, like tail -f, until interrupted.
+        liveDirectory: where the file that is still being written lives, i.e. the working directory of
+            cs_rssi_neighbour_parser, when it differs from the input directory. Files are identified by their
+            name, so when the parser latches a file to the input directory (and compresses it) it continues at
+            the same offset.
+        """
+        for parser in self.parsers:
+            if not hasattr(parser, "checkpointState"):
+                raise ValueError(F"{type(parser).__name__} does not support incremental extraction")
+            if getattr(parser, "binaryOutput", False):
+                raise ValueError("incremental extraction only supports csv output")
+
+        if liveDirectory is not None:
+            liveDirectory = liveDirectory.expanduser()
+            if liveDirectory.resolve() == self.inputDirectory.resolve():
+                liveDirectory = None
+
+        checkpoint = ExtractionCheckpoint(checkpointPath)
+        columnNames = self.parsers[-1].columnNames()
+        if checkpoint.load():
+            if checkpoint.columnNames != columnNames:
+                raise ValueError(F"the output columns differ from those of checkpoint {checkpointPath}, remove it to start over")
+            for parser, state in zip(self.parsers, checkpoint.parserStates):
+                parser.restoreCheckpointState(state)
+            print(F"continuing from checkpoint {checkpointPath}")
+        checkpoint.columnNames = columnNames
+
+        try:
+            while True:
+                self.parseNewLines(checkpoint, liveDirectory)
+                if not follow:
+                    break
+                time.sleep(pollInterval)
+        except KeyboardInterrupt:
+            print(F"stopped, progress is saved in {checkpointPath}")
+
+    def findFollowedFiles(self, liveDirectory):
+        """
+        Returns (name, path, final) of the input files in the input and live directory, ordered by name.
+        A file is final when it won't grow anymore: when it is compressed, when a newer file exists, or when
+        it was latched from the live directory to the input directory.
+        """
+        paths = {}
+        for directory in [self.inputDirectory] + ([liveDirectory] if liveDirectory else []):
+            for path in findLogFiles(directory, self.fileNameRegex):
+                paths.setdefault(stripCompressionSuffix(path).name, path)
+
+        names = sorted(paths)
+        files = []
+        for index, name in enumerate(names):
+            path = paths[name]
+            final = compressionOf(path) is not None or index + 1 < len(names) or \
+                (liveDirectory is not None and path.parent != liveDirectory)
+            files.append((name, path, final))
+        return files
+
+    def parseNewLines(self, checkpoint, liveDirectory):
+        """
+        Processes the new lines of all files and saves the checkpoint after every batch.
+        """
+        files = self.findFollowedFiles(liveDirectory)
+        for index, (name, path, final) in enumerate(files):
+            entry = checkpoint.fileEntry(name)
+            if entry["final"]:
+                continue
+
+            try:
+                if not final and compressionOf(path) is None and path.stat().st_size == entry["offset"]:
+                    continue
+                outPath = self.getOutputPath(path)
+                self.truncateOutput(outPath, entry)
+
+                while True:
+                    lines, offset = self.readNewLines(path, entry["offset"], final)
+                    # a file without lines still gets an output file with the header.
+                    if not lines and (entry["outputSize"] > 0 or not final):
+                        break
+                    if any(checkpoint.files.get(laterName, {}).get("offset", 0) > 0 for laterName, _, _ in files[index + 1:]):
+                        print(F"Warning: {name} got new lines after a newer file was processed, "
+                              F"its rows differ from those of a full run")
+
+                    startTime = time.perf_counter()
+                    self.runParsersOnLines(lines, outPath, continued=entry["outputSize"] > 0)
+                    entry["offset"] = offset
+                    entry["outputSize"] = outPath.stat().st_size
+                    checkpoint.parserStates = [parser.checkpointState() for parser in self.parsers]
+                    checkpoint.save()
+                    _TRACER.info("batch", input=str(path), lines=len(lines), offset=offset,
+                                 seconds=time.perf_counter() - startTime)
+                    if self.verbose:
+                        print(F"processed {len(lines)} lines of {path}, up to byte {offset}")
+
+            except FileNotFoundError as e:
+                # latched or compressed while reading, it is picked up again on the next pass.
+                print(F"{path} moved while reading it: {e}")
+                continue
+
+            if final:
+                entry["final"] = True
+                checkpoint.save()
+
+    def readNewLines(self, path, offset, final, maxLines=10000):
+        """
+        Returns (lines, offset): at most maxLines complete lines from byte `offset` on, and the offset after them.
+        An incomplete last line is only returned when the file is final.
+        """
+        lines = []
+        with openLogFileAt(path, offset) as logFile:
+            for line in logFile:
+                if not line.endswith(b"\n") and not final:
+                    break
+                offset += len(line)
+                # same line endings as reading the file in text mode
+                lines.append(line.decode().replace("\r\n", "\n"))
+                if len(lines) >= maxLines:
+                    break
+        return lines, offset
+
+    def runParsersOnLines(self, lines, outPath, continued):
+        """
+        Runs the parsers on lines in memory, and writes (continued: appends) the output of the last one to outPath.
+        """
+        for parser in self.parsers[:-1]:
+            buffer = io.StringIO()
+            parser.run(lines, buffer, continued=continued)
+            lines = io.StringIO(buffer.getvalue())
+
+        with open(outPath, "a" if continued else "w") as outFile:
+            self.parsers[-1].run(lines, outFile, continued=continued)
+            # the output must be on disk before the checkpoint that includes it.
+            outFile.flush()
+            os.fsync(outFile.fileno())
+
+    def truncateOutput(self, outPath, entry):
+        """
+        Removes rows that were written after the last checkpoint, e.g. when the previous run was killed.
+        """
+        if entry["outputSize"] == 0:
+            return
+        size = outPath.stat().st_size if outPath.exists() else 0
+        if size < entry["outputSize"]:
+            raise ValueError(F"{outPath} is shorter than recorded in the checkpoint, remove the checkpoint to start over")
+        if size > entry["outputSize"]:
+            print(F"removing {size - entry['outputSize']} bytes of {outPath} that were written after the last checkpoint")
+            os.truncate(outPath, entry["outputSize"])
+
+    def getOutputPath(self, pathToFile):
+        """
+        Returns the path of the output file for pathToFile, as parseSingleFile names it.
+        """
+        workFilePath = self.getWorkFilePaths(pathToFile, len(self.parsers))[-1]
+        return Path(self.outputDirectory, ".".join(workFilePath.name.split(".")[:-1]))
+
     def getWorkFilePaths(self, pathToOriginalFile, count):
         """
         creates an array of paths for the intermediate files.
         They will be in the working directory with an .{index} as suffix.
+        If the last parser sets an `outputExtension` (e.g. npz), it replaces the extension of the last file.
         """
         if not self.workDirectory.is_dir:
             self.workDirectory.mkdir(parents=True)
 
-        head, tail = os.path.split(pathToOriginalFile)
+        head, tail = os.path.split(stripCompressionSuffix(pathToOriginalFile))
 
         # adds the suffix that was set as script arg.
         tailparts = tail.split(".")  # filename and exts
         tailparts[0] += self.extractedFileSuffix
         suffixedtail = ".".join(tailparts)
+        paths = [Path(self.workDirectory, suffixedtail + F".{index}") for index in range(count)]
+
+        outputExtension = getattr(self.parsers[-1], "outputExtension", None)
+        if outputExtension and paths:
+            if len(tailparts) > 1:
+                tailparts[-1] = outputExtension
+            else:
+                tailparts.append(outputExtension)
+            paths[-1] = Path(self.workDirectory, ".".join(tailparts) + F".{count - 1}")
 
-        return [Path(self.workDirectory, suffixedtail + F".{index}") for index in range(count)]
+        return paths
 
     def moveFileOut(self, pathToFile):
         """
@@ -109,7 +333,7 @@ class FeatureExtractor:
         # opt: remove intermediate files
 
 
-if __name__=="__main__":
+def main():
     # simple output dir option
     argparser = argparse.ArgumentParser()
     argparser.add_argument("-i", "--inputDirectory", type=Path)
@@ -119,20 +343,136 @@ if __name__=="__main__":
     argparser.add_argument("--suffix", type=str)
     argparser.add_argument("-d", "--dryRun", action='store_true')
     argparser.add_argument("--debug", action='store_true')
-    argparser.add_argument("-s", "--sender", type=int)
-    argparser.add_argument("-r", "--receiver", type=int)
-    argparser.add_argument("-v", "--verbose", default=False, action='store_true')
+    argparser.add_argument("-s", "--sender", type=int, nargs='+',
+                           help="only keep messages sent by one of these crownstone ids.")
+    argparser.add_argument("-r", "--receiver", type=int, nargs='+',
+                           help="only keep messages received by one of these crownstone ids.")
+    argparser.add_argument("--pair", dest="pairs", type=SenderReceiverFilter.parsePair, action='append',
+                           help="only keep messages of this receiver:sender pair, * is a wildcard, e.g. 7:6 or 8:*. Can be repeated.")
+    argparser.add_argument("--dedup", default=False, action='store_true',
+                           help="drop messages that were captured more than once, e.g. by several dev boards.")
+    argparser.add_argument("--dedupTolerance", type=float, default=10.0,
+                           help="seconds within which a message with the same pair, msgNumber and rssis is a --dedup duplicate, default 10.")
+    argparser.add_argument("-v", "--verbose", default=False, action='store_true',
+                           help="print progress per file, and trace every record to stderr unless --trace is given.")
+    argparser.add_argument("--trace", type=str,
+                           help="write trace events of the processing of individual records to this file as json lines, - for stderr.")
+    argparser.add_argument("--traceLevel", dest="traceLevels", type=parseTraceLevel, action='append',
+                           help="level of a traced component, e.g. rssi.aggregator=DEBUG or rssi.sink=INFO, or a level for all "
+                                "components. DEBUG traces every record, INFO only the stages. Default DEBUG. Can be repeated.")
+    argparser.add_argument("--traceEvery", type=int, default=1,
+                           help="only trace 1 in this many records per component, default 1.")
+    argparser.add_argument("--traceInterval", type=float, default=0.0,
+                           help="trace at most one record per component per this many seconds.")
     argparser.add_argument("-a", "--allowIncompleteRecords", default=False, action='store_true')
+    argparser.add_argument("-m", "--merge", default=False, action='store_true',
+                           help="merge all matching files into one timestamp ordered stream instead of parsing them one by one.")
+    argparser.add_argument("--mergedFileName", type=str,
+                           help="name used for the output of --merge, default: merged.csv")
+    argparser.add_argument("--outputFormat", choices=["csv", "npz", "arrow"], default="csv",
+                           help="csv text (default), or a float32 feature matrix as .npz or Arrow IPC file.")
+    argparser.add_argument("--featureSpec", type=Path,
+                           help="json/yaml file with the channels, windows and statistics to compute. See rssi/feature_spec.template.json.")
+    argparser.add_argument("--chunkSize", type=int, default=4096,
+                           help="number of rows per chunk for npz and arrow output.")
+    argparser.add_argument("--pivot", default=False, action='store_true',
+                           help="instead of per record features, write one row per interval with the latest rssi of "
+                                "every receiver, sender and channel of --nodes. Best combined with --merge.")
+    argparser.add_argument("--nodes", type=int, nargs='+',
+                           help="crownstone ids of the --pivot matrix.")
+    argparser.add_argument("--pivotInterval", type=float, default=1.0,
+                           help="seconds between two rows of the --pivot matrix, default 1.")
+    argparser.add_argument("--pivotMaxAge", type=float,
+                           help="rssi values older than this many seconds are left empty in the --pivot matrix.")
+    argparser.add_argument("--tick", dest="tickInterval", type=float,
+                           help="instead of a row per record, write a row per receiver, sender pair every this many "
+                                "seconds of record time. Records in between only update the windows.")
+    argparser.add_argument("--tickMaxAge", type=float,
+                           help="leave out pairs without a record in this many seconds from the --tick rows, "
+                                "default: the largest time window of the feature spec.")
+    argparser.add_argument("--sampleRatio", dest="sampleRatios", type=parseSampleTarget, action='append',
+                           help="only write this fraction of the rows of a label, per receiver, sender pair, e.g. None=0.05. "
+                                "The label * applies to labels without their own target. Can be repeated.")
+    argparser.add_argument("--sampleCount", dest="sampleCounts", type=parseSampleTarget, action='append',
+                           help="only write this many rows of a label per receiver, sender pair and file, chosen by "
+                                "reservoir sampling, e.g. a=500. Rows are then written when the file is done. Can be repeated.")
+    argparser.add_argument("--sampleSeed", type=int, default=0,
+                           help="seed of the random choices of --sampleCount, default 0.")
+    argparser.add_argument("--inference", dest="inferenceModel", type=Path,
+                           help="instead of features, write the predictions of this model (.npz, .onnx or a pickle) "
+                                "next to the recorded label. See rssi/PresenceModel.py.")
+    argparser.add_argument("--inferenceInterval", type=float, default=1.0,
+                           help="seconds over which updated pairs are collected into one --inference batch, default 1.")
+    argparser.add_argument("--sequenceLength", type=int,
+                           help="instead of features, export the raw records of each pair as a memory mappable .npz, "
+                                "with an index of all windows of this many records. See rssi/RssiSequenceDataset.py.")
+    argparser.add_argument("--checkpoint", type=Path,
+                           help="only process lines that were added since the previous run with this checkpoint file, "
+                                "and append their rows to the output.")
+    argparser.add_argument("--follow", default=False, action='store_true',
+                           help="keep processing new lines as they are written, like tail -f. "
+                                "Uses --checkpoint, default: <outputDirectory>/cs_rssi_extract_features.checkpoint.json")
+    argparser.add_argument("--liveDirectory", type=Path,
+                           help="working directory of cs_rssi_neighbour_parser, where the file that is still written to lives.")
+    argparser.add_argument("--pollInterval", type=float, default=1.0,
+                           help="seconds between checks for new lines with --follow, default 1.")
 
     pargs = argparser.parse_args()
+    # label=value pairs to label -> value
+    pargs.sampleRatios = dict(pargs.sampleRatios) if pargs.sampleRatios else None
+    pargs.sampleCounts = dict(pargs.sampleCounts) if pargs.sampleCounts else None
 
     print(F"{__file__} called as with args: {pargs}")
 
+    if pargs.trace or pargs.verbose:
+        configureTracing(pargs.trace or "-",
+                         levels=dict(pargs.traceLevels or []),
+                         every=pargs.traceEvery,
+                         interval=pargs.traceInterval)
+
     # create parser objects for the pipe line, just passing all command line arguments to constructor
     ioFilter = SenderReceiverFilter(**vars(pargs))
-    featureExtractor = RssiNeighbourMessageAggregator(**vars(pargs))
-    parserPipeline = FeatureExtractor(parsers=[ioFilter, featureExtractor], **vars(pargs))
+    filters = [ioFilter]
+    if pargs.dedup:
+        filters.append(DuplicateMessageFilter(**vars(pargs)))
+    if (pargs.sampleRatios or pargs.sampleCounts) and (pargs.sequenceLength or pargs.inferenceModel or pargs.pivot):
+        raise ValueError("--sampleRatio and --sampleCount only apply to the feature rows, "
+                         "not to --sequenceLength, --inference or --pivot")
+    if pargs.pivot and len(set(pargs.nodes or [])) < 2:
+        argparser.error(F"--pivot needs at least 2 different --nodes, got {pargs.nodes or []}")
+    if pargs.pivot and pargs.pivotInterval <= 0:
+        argparser.error(F"--pivotInterval must be positive, got {pargs.pivotInterval}")
+    if pargs.sequenceLength:
+        # only imported when used, it isn't needed for --help or the other outputs.
+        from crownstone_devtools.rssi.parsers.RssiSequenceExport import RssiSequenceExport
+        featureExtractor = RssiSequenceExport(**vars(pargs))
+    elif pargs.inferenceModel:
+        featureExtractor = RssiPresenceInference(**vars(pargs))
+    elif pargs.pivot:
+        featureExtractor = RssiFeatureMatrixPivot(**vars(pargs))
+    else:
+        featureExtractor = RssiNeighbourMessageAggregator(**vars(pargs))
+    parserPipeline = FeatureExtractor(parsers=filters + [featureExtractor], **vars(pargs))
 
-    parserPipeline.parseAllFiles()
+    if pargs.checkpoint or pargs.follow:
+        if pargs.merge:
+            raise ValueError("--merge can't be combined with --checkpoint or --follow")
+        if pargs.tickInterval:
+            raise ValueError("--tick can't be combined with --checkpoint or --follow")
+        if pargs.sampleRatios or pargs.sampleCounts:
+            raise ValueError("--sampleRatio and --sampleCount can't be combined with --checkpoint or --follow")
+        checkpointPath = pargs.checkpoint or Path(parserPipeline.outputDirectory, "cs_rssi_extract_features.checkpoint.json")
+        parserPipeline.parseIncrementally(checkpointPath,
+                                          follow=pargs.follow,
+                                          liveDirectory=pargs.liveDirectory,
+                                          pollInterval=pargs.pollInterval)
+    elif pargs.merge:
+        parserPipeline.parseMergedFiles()
+    else:
+        parserPipeline.parseAllFiles()
 
     print("done")
+
+
+if __name__ == "__main__":
+    main()
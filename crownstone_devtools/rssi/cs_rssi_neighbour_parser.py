@@ -4,37 +4,55 @@
 This script receives "neighbour rssi" uart messages and logs them to file and the terminal.
 It labels the messages with a time stamp and a short text that describes the physical state
 (a la supervised learning).
+
+Each record gets the port of its dev board as last field.
+Several dev boards can be read at once by passing multiple ports (-p /dev/ttyACM0 -p /dev/ttyACM1).
+All messages then go to one time ordered log.
 """
 import time, datetime
+import threading
 import platform
 import argparse
 import sys, os
 from pathlib import Path
-from sshkeyboard import listen_keyboard
-
-from crownstone_core.Exceptions import CrownstoneException
-from crownstone_uart import UartEventBus, UartTopics
-from crownstone_uart import CrownstoneUart
-from crownstone_uart.core.uart.UartTypes import UartRxType, UartMessageType
-from crownstone_uart.core.uart.uartPackets.UartMessagePacket import UartMessagePacket
-from crownstone_uart.topics.SystemTopics import SystemTopics
 
 from crownstone_devtools.rssi.RssiNeighbourMessage import RssiNeighbourMessage
+from crownstone_devtools.rssi.UartPortReader import UartPortReader
+from crownstone_devtools.util.Compression import BackgroundCompressor
 
 
 class UartRssiMessageParser:
-	def __init__(self, outputDirectory, workingDirectory, logToFile=True, verbose=False):
+	def __init__(self, outputDirectory, workingDirectory, logToFile=True, verbose=False, compression=None):
 		"""
 		logToFile: if false, script only produces terminal output, otherwise a logfile is created.
 		workingDirectory: as long as a log file is actively written to, it will be kept here
 		outputDirectory: when a log file is complete it is copied to this dir. (happens when a new log file is created)
+		compression: gzip, xz, zstd or auto. Completed log files are compressed in the background. None to disable.
 		"""
+		# the uart libs are imported here rather than at module level, so that --help doesn't wait for them.
+		from crownstone_uart import UartEventBus
+		from crownstone_uart.core.uart.UartTypes import UartRxType
+		from crownstone_uart.topics.SystemTopics import SystemTopics
+		from crownstone_core.Exceptions import CrownstoneException
+
+		# kept for handleUartMessage, which is called for every uart message.
+		self.crownstoneException = CrownstoneException
+		self.neighbourRssiOpCode = UartRxType.NEIGHBOUR_RSSI
 		self.uartMessageSubscription = UartEventBus.subscribe(SystemTopics.uartNewMessage, self.handleUartMessage)
+		# port that the uart lib reads, logged with its messages. Set by main.
+		self.uartPort = None
 
 		self.logToFile = logToFile
 		self.verbose = verbose
 		self.logFileName = None
 
+		# messages of multiple ports and keyboard events arrive on different threads.
+		# timestamping and writing under one lock keeps the log time ordered.
+		self.lock = threading.RLock()
+
+		# compresses latched log files without blocking the uart thread
+		self.compressor = BackgroundCompressor(compression, verbose=verbose)
+
 		self.not_labeled = "None, not labeled"
 		self.lastPressed = self.not_labeled
 
@@ -105,27 +123,38 @@ class UartRssiMessageParser:
 			"z": "I am in room: z",
 		}
 
-	def handleUartMessage(self, messagePacket: UartMessagePacket):
+	def handleUartMessage(self, messagePacket):
+		""" UartEventBus callback, messagePacket is a UartMessagePacket """
 		try:
-			if messagePacket.opCode == UartRxType.NEIGHBOUR_RSSI:
-				rssiMessage = RssiNeighbourMessage(messagePacket.payload)
-				self.log(F"{self.getCurrentTimeString()},{rssiMessage},{self.lastPressed}")
-		except CrownstoneException as e:
+			if messagePacket.opCode == self.neighbourRssiOpCode:
+				self.handleRssiMessage(RssiNeighbourMessage(messagePacket.payload), self.uartPort)
+		except self.crownstoneException as e:
 			self.log(f"Parse error: {e}")
 
+	def handlePortMessage(self, port, opCode, payload):
+		""" UartPortReader callback """
+		if opCode == self.neighbourRssiOpCode:
+			self.handleRssiMessage(RssiNeighbourMessage(payload), port)
+
+	def handleRssiMessage(self, rssiMessage, port):
+		""" logs the message with the current label and the port it was received on. """
+		with self.lock:
+			self.log(F"{self.getCurrentTimeString()},{rssiMessage},{self.lastPressed},{port}")
+
 	def press(self, key):
 		""" ssh keyboard callback """
-		keyboardeventstr = self.not_labeled
+		with self.lock:
+			keyboardeventstr = self.not_labeled
 
-		if key in self.special_keys:
-			keyboardeventstr = F"{str(key)}, {self.special_keys.get(key, self.not_labeled)}"
-			if key == 'backspace':
-				self.lastPressed = self.not_labeled
-		elif key in self.labels:
-			self.lastPressed = F"{str(key)}, {self.labels.get(key, self.not_labeled)}"
-			keyboardeventstr = self.lastPressed
+			if key in self.special_keys:
+				keyboardeventstr = F"{str(key)}, {self.special_keys.get(key, self.not_labeled)}"
+				if key == 'backspace':
+					self.lastPressed = self.not_labeled
+			elif key in self.labels:
+				self.lastPressed = F"{str(key)}, {self.labels.get(key, self.not_labeled)}"
+				keyboardeventstr = self.lastPressed
 
-		self.log(F"# {self.getCurrentTimeString()}, keyboard event: {keyboardeventstr}")
+			self.log(F"# {self.getCurrentTimeString()}, keyboard event: {keyboardeventstr}")
 
 	def getCurrentTimeString(self):
 		""" extracted method for uniform formatting. change style here and all logs will be updated. """
@@ -144,8 +173,12 @@ class UartRssiMessageParser:
 
 
 	def latchLogfileFromWorkToOutputDir(self):
-		""" moves current working log file from the work dir to the output dir, possibly overwriting a previous file """
+		"""
+		moves current working log file from the work dir to the output dir, possibly overwriting a previous file.
+		if compression is enabled, the file is queued for compression in the background.
+		"""
 		os.replace(self.workingDirectory / self.logFileName, self.outputDirectory / self.logFileName)
+		self.compressor.submit(self.outputDirectory / self.logFileName)
 
 	def getLogFilename(self):
 		"""
@@ -163,27 +196,33 @@ class UartRssiMessageParser:
 
 	def log(self, logstr, silent=False):
 		""" logs given string to the current log file. set silent to True to prevent a print to std out. """
-		if self.logToFile:
-			with open(self.workingDirectory / self.getLogFilename(), "a+") as logfile:
-				print(logstr, file=logfile)
-		if not silent or self.verbose:
-			print(logstr)
+		with self.lock:
+			if self.logToFile:
+				with open(self.workingDirectory / self.getLogFilename(), "a+") as logfile:
+					print(logstr, file=logfile)
+			if not silent or self.verbose:
+				print(logstr)
 
 	def finish(self):
-		""" cleans up working dir by moving last log file to the output dir. """
-		self.latchLogfileFromWorkToOutputDir()
+		""" cleans up working dir by moving last log file to the output dir, and waits for pending compressions. """
+		with self.lock:
+			self.latchLogfileFromWorkToOutputDir()
+		self.compressor.finish()
 
 
-if __name__=="__main__":
+def main():
 	# simple output dir option
 	argparser = argparse.ArgumentParser()
 	argparser.add_argument("-o", "--outputDirectory", type=Path)
 	argparser.add_argument("-w", "--workingDirectory", type=Path)
-	argparser.add_argument("-p", "--port", type=str)
+	argparser.add_argument("-p", "--port", type=str, action='append',
+						   help="serial port of a dev board. Repeat to capture from several dev boards into one log.")
 	argparser.add_argument("-l", "--logToFile", action='store_false')
 	argparser.add_argument("-v", "--verbose", action='store_true')
 	argparser.add_argument("--no_uart", action='store_true')
 	argparser.add_argument("--no_escape", action='store_true')
+	argparser.add_argument("-c", "--compress", choices=["none", "gzip", "xz", "zstd", "auto"], default="none",
+						   help="compress completed log files in the background. auto uses zstd if installed, gzip otherwise.")
 	pargs = argparser.parse_args()
 
 	print(F"""
@@ -203,28 +242,38 @@ if __name__=="__main__":
 	# parser object waits for events of the uart event bus.
 	outDir = pargs.outputDirectory or Path('.')
 	workDir = pargs.workingDirectory or outDir
-	parser = UartRssiMessageParser(outputDirectory=outDir, workingDirectory=workDir, logToFile=pargs.logToFile, verbose=pargs.verbose)
+	parser = UartRssiMessageParser(outputDirectory=outDir, workingDirectory=workDir, logToFile=pargs.logToFile, verbose=pargs.verbose, compression=pargs.compress)
 
 	if pargs.port:
-		portname = pargs.port
+		portnames = pargs.port
 	else:
-		portname = "/dev/ttyACM0"
+		portnames = ["/dev/ttyACM0"]
 		if platform.uname().system == 'Windows':
 			import serial.tools.list_ports as port_list
 			ports = list(port_list.comports())
 			# bind to the first COM port and hope it is the right one...
-			portname = ports[0].name
+			portnames = [ports[0].name]
 
 	uart = None
+	portReaders = []
 	if pargs.no_uart == False:
-		# Init the Crownstone UART lib.
-		uart = CrownstoneUart()
-		uart.initialize_usb_sync(port=portname)
+		if len(portnames) == 1:
+			# Init the Crownstone UART lib.
+			from crownstone_uart import CrownstoneUart
+			uart = CrownstoneUart()
+			parser.uartPort = portnames[0]
+			uart.initialize_usb_sync(port=portnames[0])
+		else:
+			# the uart lib has a single global event bus, so each port gets its own reader thread instead.
+			portReaders = [UartPortReader(portname, parser.handlePortMessage, verbose=pargs.verbose) for portname in portnames]
+			for portReader in portReaders:
+				portReader.start()
 
 	# The try except part is just to catch a control+c to gracefully stop the UART lib.
 
 	try:
 		if os.isatty(sys.stdin.fileno()):
+			from sshkeyboard import listen_keyboard
 			listen_keyboard(on_press=lambda k: parser.press(k), until=None if pargs.no_escape else "esc")
 			print("space was pressed, exiting")
 		else:
@@ -233,6 +282,11 @@ if __name__=="__main__":
 	except KeyboardInterrupt:
 		print("\nKeyboardInterrupt received, exiting..")
 	finally:
+		for portReader in portReaders:
+			portReader.stop()
+		for portReader in portReaders:
+			portReader.join()
+
 		print("stopping parser")
 		parser.finish()
 
@@ -241,3 +295,7 @@ if __name__=="__main__":
 			uart.stop()
 
 	print("Stopped")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,101 @@
+"""
+This script builds and queries a rollup store (see RssiRollupStore) of csv files generated by cs_rssi_neighbour_parser.py.
+
+The raw logs are read once by 'build', after that 'query' answers long range questions such as
+"mean rssi of 6->7 per hour over the last month" without touching the raw logs.
+
+Examples:
+    python3 cs_rssi_rollup.py build -d rollup.sqlite -i logs -f "NeighborRssiLog_*.csv"
+    python3 cs_rssi_rollup.py query -d rollup.sqlite -r 6 -s 7 --step 3600
+    python3 cs_rssi_rollup.py query -d rollup.sqlite -r 6 -s 7 -c 0 --start 2022-07-02T12:00 --end 2022-07-03
+"""
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+from crownstone_devtools.rssi.RssiRollupStore import RssiRollupStore, ALL_CHANNELS, toSeconds, RESOLUTIONS
+from crownstone_devtools.util.Compression import findLogFiles
+
+
+def build(store, pargs):
+    paths = findLogFiles(pargs.inputDirectory, pargs.fileNameRegex)
+    if not paths:
+        print(F"no files found matching {pargs.fileNameRegex} in {pargs.inputDirectory}")
+        return
+
+    total = 0
+    for path in paths:
+        total += store.ingestFile(path)
+    print(F"ingested {total} records from {len(paths)} files into {pargs.database}")
+
+
+def query(store, pargs):
+    first, last = store.timeRange()
+    if first is None:
+        print(F"{pargs.database} is empty, run build first")
+        return
+
+    # default range: all data, rounded to whole hours so the coarsest level can be used.
+    hour = RESOLUTIONS[-1]
+    start = toSeconds(pargs.start) if pargs.start else first - first % hour
+    end = toSeconds(pargs.end) if pargs.end else last - last % hour + hour
+
+    results = store.query(start, end, step=pargs.step, receiverId=pargs.receiver, senderId=pargs.sender,
+                          channel=pargs.channel)
+
+    def formatValue(value):
+        if value is None:
+            return ""
+        if isinstance(value, float):
+            return F"{value:.2f}"
+        return str(value)
+
+    columnNames = ["start", "count", "mean", "stdev", "min", "max", "drops"]
+    print(", ".join(columnNames))
+    for result in results:
+        print(", ".join([result["start"].isoformat()] + [formatValue(result[name]) for name in columnNames[1:]]))
+
+
+def parseChannel(value):
+    if value == "all":
+        return ALL_CHANNELS
+    channel = int(value)
+    if channel not in range(ALL_CHANNELS):
+        raise argparse.ArgumentTypeError(F"channel must be 0, 1, 2 or all, got {value}")
+    return channel
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Build and query multi-resolution rollups of rssi logs.")
+    argparser.add_argument("-d", "--database", type=Path, default=Path("rollup.sqlite"),
+                           help="the sqlite file of the rollup store, default: rollup.sqlite")
+    argparser.add_argument("-v", "--verbose", default=False, action='store_true')
+    subparsers = argparser.add_subparsers(dest="command", required=True)
+
+    buildParser = subparsers.add_parser("build", help="add raw log files to the store, files that were added before are skipped.")
+    buildParser.add_argument("-i", "--inputDirectory", type=Path, default=Path('.'))
+    buildParser.add_argument("-f", "--fileNameRegex", type=str, default="NeighborRssiLog_*.csv")
+
+    queryParser = subparsers.add_parser("query", help="print count, mean, stdev, min, max and drops per step as csv.")
+    queryParser.add_argument("-r", "--receiver", type=int, help="receiver id, default: any")
+    queryParser.add_argument("-s", "--sender", type=int, help="sender id, default: any")
+    queryParser.add_argument("-c", "--channel", type=parseChannel, default=ALL_CHANNELS,
+                             help="0, 1, 2 or all (the mean of the non-zero channels, default)")
+    queryParser.add_argument("--start", type=datetime.fromisoformat, help="iso timestamp, default: start of the data")
+    queryParser.add_argument("--end", type=datetime.fromisoformat, help="iso timestamp (exclusive), default: end of the data")
+    queryParser.add_argument("--step", type=int, help="seconds per output row, default: a single row for the whole range")
+
+    pargs = argparser.parse_args()
+
+    store = RssiRollupStore(pargs.database, verbose=pargs.verbose)
+    try:
+        if pargs.command == "build":
+            build(store, pargs)
+        else:
+            query(store, pargs)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from crownstone_devtools.util.Tracing import getTracer
+
+_TRACER = getTracer("rssi.dedup")
+
+
+class PairHistory:
+    """
+    The recently seen messages of one (receiver, sender) pair.
+    """
+    __slots__ = ["entries", "lastMsgNumber", "lastSequence"]
+
+    def __init__(self):
+        # (msgNumber, rssi fields) -> (posix timestamp, sequence number), oldest first.
+        self.entries = OrderedDict()
+        self.lastMsgNumber = None
+        # msgNumber without the wraparound, counting from the first message of the pair.
+        self.lastSequence = 0
+
+    def sequenceNumber(self, msgNumber):
+        """
+        Returns msgNumber unwrapped: a message up to half the counter range ahead of the last one is a newer message,
+        otherwise it's an older one that arrives late.
+        """
+        if self.lastMsgNumber is None:
+            self.lastMsgNumber = msgNumber
+            return self.lastSequence
+        delta = (msgNumber - self.lastMsgNumber) % DuplicateMessageFilter.msgNumberRange
+        if delta < DuplicateMessageFilter.msgNumberRange // 2:
+            self.lastMsgNumber = msgNumber
+            self.lastSequence += delta
+            return self.lastSequence
+        return self.lastSequence - (DuplicateMessageFilter.msgNumberRange - delta)
+
+
+class DuplicateMessageFilter:
+    """
+    Filter that expects a file with lines formatted as RssiNeighbourMessageRecord and outputs a file in the same
+    format, without the messages that were already seen. This happens when several dev boards, or a restarted
+    parser, captured the same mesh traffic.
+
+    A message is a duplicate of an earlier one of the same pair with the same msgNumber and rssis, if it was
+    received at most `dedupTolerance` seconds later (default 10) and the msgNumber didn't wrap around in between.
+    Per pair only the messages of the last `dedupTolerance` seconds, and of the last half of the msgNumber range,
+    are kept, so memory is bounded by the number of pairs.
+
+    Lines are matched on their raw fields and forwarded unchanged. The history is kept across files, so
+    duplicates in the next file are found as well. The number of removed duplicates is printed after each file
+    and kept in `removedDuplicates`.
+    """
+    # msgNumber is an uint8
+    msgNumberRange = 256
+
+    def __init__(self, *args, **kwargs):
+        self.verbose = kwargs.get('verbose', False)
+        self.dryRun = kwargs.get('dryRun', False)
+        self.debug = kwargs.get('debug', False)
+        tolerance = kwargs.get('dedupTolerance', None)
+        self.tolerance = float(tolerance) if tolerance is not None else 10.0
+
+        # (receiverId, senderId) fields as they appear in the line -> PairHistory
+        self.pairs = {}
+        self.removedDuplicates = 0
+
+    def run(self, inFile, outFile, continued=False):
+        """
+        outputs lines in inFile to outFile unless they are a duplicate of an earlier message.
+        Comments, lines starting with a #, and empty lines are forwarded unchanged.
+        continued: unused, the output has no header.
+        """
+        if self.verbose:
+            print("running DuplicateMessageFilter")
+        removedBefore = self.removedDuplicates
+        write = outFile.write
+        for line in inFile:
+            if not line or line[0] == "#" or line.isspace():
+                isDuplicate = False
+            else:
+                try:
+                    isDuplicate = self.isDuplicate(line)
+                except (ValueError, IndexError):
+                    # invalid lines are reported and dropped by the next parser.
+                    if self.debug:
+                        raise
+                    isDuplicate = False
+
+            if isDuplicate:
+                self.removedDuplicates += 1
+                if _TRACER.enabled and _TRACER.sampled():
+                    _TRACER.event("duplicate", line=line.rstrip("\n"))
+                continue
+
+            if not line.endswith("\n"):
+                line += "\n"
+            if not self.dryRun:
+                write(line)
+
+        print(F"DuplicateMessageFilter removed {self.removedDuplicates - removedBefore} duplicates, "
+              F"{self.removedDuplicates} in total")
+
+    def isDuplicate(self, line):
+        """
+        Returns whether the record on this line was seen before, and remembers it otherwise.
+        """
+        # timestamp, receiverId, senderId, rssi 0, rssi 1, rssi 2, msgNumber, rest of the record
+        fields = line.split(",", 7)
+        pairKey = (fields[1], fields[2])
+        history = self.pairs.get(pairKey)
+        if history is None:
+            history = self.pairs[pairKey] = PairHistory()
+
+        time = datetime.fromisoformat(fields[0]).replace(tzinfo=timezone.utc).timestamp()
+        msgNumber = int(fields[6])
+        sequence = history.sequenceNumber(msgNumber)
+
+        # expire the oldest messages: too old, or their msgNumber may be reused.
+        entries = history.entries
+        halfRange = self.msgNumberRange // 2
+        while entries:
+            oldestTime, oldestSequence = next(iter(entries.values()))
+            if oldestTime >= time - self.tolerance and oldestSequence > history.lastSequence - halfRange:
+                break
+            entries.popitem(last=False)
+
+        key = (msgNumber, fields[3], fields[4], fields[5])
+        seen = entries.get(key)
+        if seen is not None:
+            seenTime, seenSequence = seen
+            if abs(time - seenTime) <= self.tolerance and seenSequence == sequence:
+                return True
+            del entries[key]
+        entries[key] = (time, sequence)
+        return False
+
+    def checkpointState(self):
+        """
+        Returns the recent messages per pair as a json serializable list, see restoreCheckpointState.
+        """
+        return [[receiverId, senderId, history.lastMsgNumber, history.lastSequence,
+                 [list(key) + list(value) for key, value in history.entries.items()]]
+                for (receiverId, senderId), history in self.pairs.items()]
+
+    def restoreCheckpointState(self, state):
+        self.pairs = {}
+        for receiverId, senderId, lastMsgNumber, lastSequence, entries in state or []:
+            history = self.pairs[(receiverId, senderId)] = PairHistory()
+            history.lastMsgNumber = lastMsgNumber
+            history.lastSequence = lastSequence
+            for msgNumber, rssi0, rssi1, rssi2, time, sequence in entries:
+                history.entries[(msgNumber, rssi0, rssi1, rssi2)] = (time, sequence)
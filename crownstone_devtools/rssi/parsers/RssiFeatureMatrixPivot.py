@@ -0,0 +1,198 @@
+import math
+from array import array
+from datetime import datetime, timezone
+
+from crownstone_devtools.rssi.RssiNeighbourMessageRecord import RssiNeighbourMessageRecord
+from crownstone_devtools.rssi.RssiFeatureSinks import createFeatureSink
+
+
+class RssiFeatureMatrixRow:
+    """
+    The 'record' of a pivoted row, as passed to the sinks. It covers all pairs, so receiverId and senderId are 0.
+    """
+    __slots__ = ["timestamp", "receiverId", "senderId", "labelchr"]
+
+    def __init__(self, timestamp, labelchr):
+        self.timestamp = timestamp
+        self.receiverId = 0
+        self.senderId = 0
+        self.labelchr = labelchr
+
+
+class RssiFeatureMatrixPivot:
+    """
+    Parses a csv file consisting of `RssiNeighbourMessageRecord`s into a wide matrix: one row per time step,
+    with the latest rssi of every (receiver, sender, channel) and the age of that value in seconds.
+
+    The latest values are kept in dense arrays with an entry per (receiver, sender, channel), so memory depends
+    on the number of nodes only. Rows are emitted every `pivotInterval` seconds of record time, aligned to
+    multiples of the interval, and carry the label of the last record.
+
+    `nodes`: crownstone ids of the matrix, records of other nodes are ignored.
+    `pivotInterval`: seconds between two rows, default 1.
+    `pivotMaxAge`: rssi values older than this many seconds are left empty. Intervals in which all values are
+        too old don't produce a row. None (default) keeps values forever.
+    Entries that were never heard or are too old are empty, so rows are written even when they are incomplete,
+    `allowIncompleteRecords` doesn't apply. Only rows without any value are left out.
+
+    Input should be time ordered and contain all receivers, e.g. the merged stream of FeatureExtractor.
+    The rows are written by a sink, see RssiFeatureSinks. `outputFormat` selects csv (default), npz or arrow.
+    """
+    channelCount = 3
+
+    def __init__(self, *args, **kwargs):
+        self.verbose = kwargs.get('verbose', False)
+        self.debug = kwargs.get('debug', False)
+        self.dryRun = kwargs.get('dryRun', False)
+
+        self.nodes = list(kwargs.get('nodes', None) or [])
+        if len(self.nodes) < 2:
+            raise ValueError(F"a feature matrix needs at least 2 nodes, got {self.nodes}")
+        self.nodeIndices = dict((nodeId, index) for index, nodeId in enumerate(self.nodes))
+
+        self.interval = float(kwargs.get('pivotInterval', None) or 1.0)
+        if self.interval <= 0:
+            raise ValueError(F"pivot interval must be positive, got {self.interval}")
+        maxAge = kwargs.get('pivotMaxAge', None)
+        self.maxAge = float(maxAge) if maxAge is not None else math.inf
+
+        # empty entries are part of the matrix.
+        self.sink = createFeatureSink(kwargs.get('outputFormat', None),
+                                      allowIncompleteRecords=True,
+                                      dryRun=self.dryRun,
+                                      verbose=self.verbose,
+                                      chunkSize=kwargs.get('chunkSize', None))
+        # used by FeatureExtractor to open the output file
+        self.binaryOutput = self.sink.binaryOutput
+        self.outputExtension = self.sink.outputExtension
+
+        # the (receiver, sender) pairs of the columns, in column order.
+        self.pairs = [(receiverIndex, senderIndex)
+                      for receiverIndex in range(len(self.nodes))
+                      for senderIndex in range(len(self.nodes))
+                      if receiverIndex != senderIndex]
+        self.reset()
+
+    def reset(self):
+        size = len(self.nodes) * len(self.nodes) * self.channelCount
+        # latest rssi per entry, 0 if never heard.
+        self.rssis = array("b", [0] * size)
+        # posix timestamp of the latest rssi per entry.
+        self.lastSeen = array("d", [-math.inf] * size)
+        # posix timestamp of the latest record of any pair.
+        self.lastRecordTime = -math.inf
+        # rows are written at multiples of the interval, counted as ticks to avoid accumulating rounding errors.
+        self.nextTick = None
+        self.label = None
+        self.ignoredRecords = 0
+
+    def entryIndex(self, receiverIndex, senderIndex, channel):
+        return (receiverIndex * len(self.nodes) + senderIndex) * self.channelCount + channel
+
+    def columnNames(self):
+        """
+        Returns the names of the output columns. The csv output starts with the timestamp of the row,
+        the typed sinks store it in their own timestamp column.
+        """
+        names = [] if self.binaryOutput else ["timestamp"]
+        names.append("keyboard_label")
+        for receiverIndex, senderIndex in self.pairs:
+            for channel in range(self.channelCount):
+                prefix = F"r{self.nodes[receiverIndex]}_s{self.nodes[senderIndex]}_channel-{channel}"
+                names += [F"{prefix}_rssi", F"{prefix}_age"]
+        return names
+
+    def run(self, inFile, outFile):
+        """
+        loads lines in inFile, updates the matrix and writes a row to outFile every interval.
+        """
+        if self.verbose:
+            print("Running RssiFeatureMatrixPivot")
+
+        self.reset()
+        self.sink.open(outFile, self.columnNames())
+
+        for line in inFile:
+            if not line.strip() or line[0] == "#":
+                # a row mixes many records, their comments can't be placed.
+                continue
+
+            try:
+                record = RssiNeighbourMessageRecord.fromString(line)
+            except ValueError as e:
+                print("Error: Failed to construct RssiNeighbourMessageRecord")
+                print(e)
+                print(F"line: \'{line}\'")
+
+                if self.debug:
+                    raise
+                continue
+
+            self.update(record)
+
+        if self.nextTick is not None:
+            # the row of the interval of the last record.
+            self.emitRows(self.lastRecordTime + self.interval)
+
+        if self.ignoredRecords:
+            print(F"RssiFeatureMatrixPivot ignored {self.ignoredRecords} records of nodes outside {self.nodes}")
+        self.sink.close()
+
+    def update(self, record):
+        """
+        Emits the rows of the intervals that ended before this record, then stores its rssi values.
+        """
+        receiverIndex = self.nodeIndices.get(record.receiverId)
+        senderIndex = self.nodeIndices.get(record.senderId)
+        if receiverIndex is None or senderIndex is None:
+            self.ignoredRecords += 1
+            return
+
+        time = record.timestamp.replace(tzinfo=timezone.utc).timestamp()
+        if self.nextTick is None:
+            self.nextTick = math.floor(time / self.interval) + 1
+        self.emitRows(time)
+
+        entry = self.entryIndex(receiverIndex, senderIndex, 0)
+        for channel, rssi in enumerate(record.rssis):
+            if rssi != 0:
+                self.rssis[entry + channel] = rssi
+                self.lastSeen[entry + channel] = time
+        self.lastRecordTime = max(self.lastRecordTime, time)
+        self.label = record.labelchr
+
+    def emitRows(self, time):
+        """
+        Writes the rows of all intervals that end at or before `time`.
+        """
+        while self.nextTick * self.interval <= time:
+            rowTime = self.nextTick * self.interval
+            if self.lastRecordTime < rowTime - self.maxAge:
+                # everything is too old, skip to the interval of `time`.
+                self.nextTick = math.floor(time / self.interval) + 1
+                break
+            self.writeRow(rowTime)
+            self.nextTick += 1
+
+    def writeRow(self, rowTime):
+        timestamp = datetime.fromtimestamp(rowTime, tz=timezone.utc).replace(tzinfo=None)
+        values = [] if self.binaryOutput else [timestamp.isoformat()]
+        values.append(self.label)
+
+        rssis = self.rssis
+        lastSeen = self.lastSeen
+        maxAge = self.maxAge
+        anyValue = False
+        for receiverIndex, senderIndex in self.pairs:
+            entry = self.entryIndex(receiverIndex, senderIndex, 0)
+            for i in range(entry, entry + self.channelCount):
+                age = rowTime - lastSeen[i]
+                if age > maxAge or rssis[i] == 0:
+                    values += ["", ""]
+                else:
+                    values += [rssis[i], round(age, 3)]
+                    anyValue = True
+
+        if not anyValue:
+            return
+        self.sink.write(RssiFeatureMatrixRow(timestamp, self.label), values)
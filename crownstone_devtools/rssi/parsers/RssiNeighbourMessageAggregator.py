@@ -1,10 +1,36 @@
+import copy
+import math
+from datetime import datetime, timezone
+
 from crownstone_devtools.rssi.RssiNeighbourMessageRecord import RssiNeighbourMessageRecord
-from crownstone_devtools.rssi.RssiFeatures import RssiChannelBasicFeatures, RssiChannelExtendedFeatures, RssiRecordFilterByTime, RssiRecordFilterByCount, RssiRecordFilterByChannelNonZero
+from crownstone_devtools.rssi.RssiFeatureSpec import RssiFeatureSpec
+from crownstone_devtools.rssi.RssiFeatureSinks import createFeatureSink
+from crownstone_devtools.rssi.RssiStratifiedSampler import RssiStratifiedSampler
+from crownstone_devtools.util.Tracing import getTracer
+
+_TRACER = getTracer("rssi.aggregator")
 
 class RssiNeighbourMessageAggregator:
     """
     Parses a csv file consisting of `RssiNeighbourMessageRecord`s using several filters to generate
     basic statistics.
+
+    The filters and statistics are described by a RssiFeatureSpec (`featureSpec`: path to a json/yaml file),
+    which is compiled into a plan that shares work between nested windows.
+
+    The rows are written by a sink, see RssiFeatureSinks. `outputFormat` selects csv (default), npz or arrow.
+
+    By default a row is written for every record. With `tickInterval` (seconds) rows are written on a clock instead:
+    records only update the windows of their (receiver, sender) pair, and at every multiple of the interval in
+    record time the plan is evaluated once per pair, giving time aligned rows. Windows stay relative to the last
+    record of the pair. Pairs without a record in the last `tickMaxAge` seconds are left out, by default the
+    largest time window of the spec. The csv output then starts with the timestamp and pair of the row.
+
+    `sampleRatios` and `sampleCounts` (label -> target) only write a stratified sample of the rows, see
+    RssiStratifiedSampler. Every record still updates the windows, the statistics are only evaluated for the
+    sampled rows.
+
+    Per row details are traced as "row" and "tick" events of component rssi.aggregator, see util/Tracing.py.
     """
     def __init__(self, *args, **kwargs):
         self.verbose = kwargs.get('verbose', False)
@@ -12,128 +38,202 @@ class RssiNeighbourMessageAggregator:
         self.dryRun = kwargs.get('dryRun', False)
         self.allowIncompleteRecords = kwargs.get('allowIncompleteRecords',False)
 
-        self.messageList = []
-        self.maxListSize = 50
-
-        self.tailFilters = [
-            RssiRecordFilterByCount("last-1-record", 1, RssiChannelBasicFeatures()),
-            RssiRecordFilterByCount("last-5-records", 5, RssiChannelExtendedFeatures()),
-            RssiRecordFilterByCount("last-10-records", 10, RssiChannelExtendedFeatures()),
-            RssiRecordFilterByCount("last-50-records", 50, RssiChannelExtendedFeatures()),
-            RssiRecordFilterByTime("last-10-seconds", 10, RssiChannelExtendedFeatures()),
-            RssiRecordFilterByTime("last-30-seconds", 30, RssiChannelExtendedFeatures()),
-            RssiRecordFilterByTime("last-5-minutes", 60*5, RssiChannelExtendedFeatures()),
-        ]
-
-        channels = list(range(3)) + [None]
-        names = [F"channel-{i}" if i is not None else "all-channels" for i in channels]
-        self.channelFilters = [
-            RssiRecordFilterByChannelNonZero(name, chan)
-                for chan,name in zip(channels,names)]
-
-    def run(self, inFile, outFile):
+        self.sink = createFeatureSink(kwargs.get('outputFormat', None),
+                                      allowIncompleteRecords=self.allowIncompleteRecords,
+                                      dryRun=self.dryRun,
+                                      verbose=self.verbose,
+                                      chunkSize=kwargs.get('chunkSize', None))
+        sampleRatios = kwargs.get('sampleRatios', None)
+        sampleCounts = kwargs.get('sampleCounts', None)
+        self.sampler = None
+        if sampleRatios or sampleCounts:
+            # the sampler passes the sampled rows on to the sink.
+            self.sampler = RssiStratifiedSampler(self.sink,
+                                                 ratios=sampleRatios,
+                                                 counts=sampleCounts,
+                                                 seed=kwargs.get('sampleSeed', None) or 0,
+                                                 verbose=self.verbose)
+            self.sink = self.sampler
+        # used by FeatureExtractor to open the output file
+        self.binaryOutput = self.sink.binaryOutput
+        self.outputExtension = self.sink.outputExtension
+
+        # channels, windows and statistics to compute, see RssiFeatureSpec.
+        featureSpec = kwargs.get('featureSpec', None)
+        self.featureSpec = RssiFeatureSpec.fromFile(featureSpec) if featureSpec else RssiFeatureSpec.default()
+        self.plan = self.featureSpec.compile()
+        self.state = self.plan.newState()
+
+        tickInterval = kwargs.get('tickInterval', None)
+        self.tickInterval = float(tickInterval) if tickInterval else None
+        if self.tickInterval is not None and self.tickInterval <= 0:
+            raise ValueError(F"tick interval must be positive, got {self.tickInterval}")
+        tickMaxAge = kwargs.get('tickMaxAge', None)
+        if tickMaxAge is None:
+            tickMaxAge = max([seconds.total_seconds() for seconds, _ in self.plan.timeWindows], default=math.inf)
+        self.tickMaxAge = float(tickMaxAge)
+        self.resetTicks()
+
+    def resetTicks(self):
+        # (receiverId, senderId) -> window state, last record and its posix timestamp.
+        self.pairStates = {}
+        self.pairLastRecords = {}
+        self.pairLastTimes = {}
+        self.lastRecordTime = -math.inf
+        # rows are written at multiples of the interval, counted as ticks to avoid accumulating rounding errors.
+        self.nextTick = None
+
+    def run(self, inFile, outFile, continued=False):
         """
-        loads lines in inFile, extract/aggregate features and print to outFile.
-        Applies all the combinations of filters.
-        Comments are forwarded too.
+        loads lines in inFile, extract/aggregate features and write them to outFile through the sink.
+        Applies all the combinations of channels and windows.
+        Comments are forwarded too (csv only).
+        continued: outFile already contains the output of the previous lines, don't write the header again.
         """
         if self.verbose:
             print("Running RssiNeighbourMessageAggregator")
 
-        printColumnHeader = True
+        self.sink.open(outFile, self.columnNames(), writeHeader=not continued)
+
         for lineindex, line in enumerate(inFile):
-            outputline = None
+            if not line.strip() or line[0] == "#":
+                # comments and empty lines go straight into the next file
+                self.sink.writeComment(line)
+                continue
 
-            if printColumnHeader:
-                columnNames = []
-                for channelfilter in self.channelFilters:
-                    for tailfilter in self.tailFilters:
-                        for statisticname in tailfilter.statsGenerator.columnNames():
-                            columnNames.append(F"{channelfilter.name}_{tailfilter.name}_{statisticname}")
-                header = ", ".join(columnNames)
+            # each line, all filters must run to produce their statistics
+            try:
+                record = RssiNeighbourMessageRecord.fromString(line)
 
-                self.output(F"# {header}", outFile)
-                printColumnHeader = False
+                if self.tickInterval is not None:
+                    self.tick(record)
+                    continue
 
-            if self.verbose:
-                # adding 1 to index because most spreadsheet editors start counting at 1.
-                print("")
-                print(F"parsing line #{lineindex + 1}: {line.strip()}")
-                print(F"cached messages: {len(self.messageList)}")
+                self.update(record) # update cached messageList
+                if self.sampler is not None and not self.sampler.select(record, self.isComplete(self.state)):
+                    continue
+                columnValues = self.columnValues()
 
-            if not line.strip() or line[0] == "#":
-                # comments and empty lines go straight into the next file
-                outputline = line
-            else:
-                # each line, all filters must run to produce their statistics
-                try:
-
-                    record = RssiNeighbourMessageRecord.fromString(line)
-                    if self.verbose:
-                        print(F"extracted record: {record.__dict__}")
-
-                    self.update(record) # update cached messageList
-
-                    # create csv line
-                    columnValues = []
-                    for channelfilter in self.channelFilters:
-                        for tailfilter in self.tailFilters:
-                            # apply filters
-                            filteredRecords = self.messageList # start from the cached messageList
-                            filteredRecords = channelfilter.run(filteredRecords) # e.g. channel 2
-                            filteredRecords = tailfilter.run(filteredRecords) # e.g. last-10-records
-
-                            # obtain statistics (possibly multiple per set of filters)
-                            statsGen = tailfilter.statsGenerator
-                            statsGen.setChannel(channelfilter.channel)
-                            statsGen.load(filteredRecords)
-                            statsvalues = statsGen.values()
-
-                            # append
-                            columnValues += statsvalues
-
-                            if self.verbose:
-                                print(F"stats: {channelfilter.name}-{tailfilter.name}:", dict(zip(statsGen.columnNames(), statsvalues)))
-                    outputline = ",".join([str(val) for val in columnValues])
-
-                except ValueError as e:
-                    errormessage = "Failed to construct RssiNeighbourMessageRecord"
-                    print(F"Error: {errormessage}")
-                    print(e)
-                    print(F"line: \'{line}\'")
-
-                    if self.debug:
-                        raise
-
-                    outputline = None
+                if _TRACER.enabled and _TRACER.sampled():
+                    # adding 1 to index because most spreadsheet editors start counting at 1.
+                    _TRACER.event("row", line=lineindex + 1, record=str(record), cached=len(self.messageList),
+                                  stats=dict(zip(self.columnNames(), columnValues)))
+
+            except ValueError as e:
+                errormessage = "Failed to construct RssiNeighbourMessageRecord"
+                print(F"Error: {errormessage}")
+                print(e)
+                print(F"line: \'{line}\'")
+
+                if self.debug:
+                    raise
+                continue
 
             # after parsing line, produce output to file/terminal
-            self.output(outputline, outFile)
+            self.sink.write(record, columnValues)
 
-    def output(self, outputline, outFile):
-        if self.verbose:
-            print(F"output: '{outputline}'")
+        if self.tickInterval is not None and self.nextTick is not None:
+            # the row of the interval of the last record.
+            self.emitTicks(self.lastRecordTime + self.tickInterval)
 
-        if outputline is None:
-            return
+        self.sink.close()
 
-        allValuesAreDefined = all(outputline.split(","))
-        if not self.allowIncompleteRecords and not allValuesAreDefined:
-            print("*** skipping incomplete record ***")
-            return
+    @property
+    def messageList(self):
+        return self.state.records
 
-        if not self.dryRun:
-            print(outputline, file=outFile)
+    def columnNames(self):
+        """
+        Returns the names of the output columns, in the order of `columnValues`.
+        In tick mode the csv output starts with the timestamp and pair of the row, the typed sinks store those
+        in their own columns.
+        """
+        if self.tickInterval is not None and not self.binaryOutput:
+            return ["timestamp", "receiverId", "senderId"] + self.plan.columnNames()
+        return self.plan.columnNames()
 
-    def update(self, rssiNeighbourMessageRecord):
+    def isComplete(self, state):
         """
-        Add record to the end the list, removing oldest entry if max capacity is reached.
+        Returns True if the sink writes the row of the state, without computing its statistics.
         """
-        self.messageList.append(rssiNeighbourMessageRecord)
-        overflow = len(self.messageList) - self.maxListSize
-        if overflow >= 0:
-            self.messageList = self.messageList[overflow:]
+        return self.allowIncompleteRecords or self.plan.isComplete(state)
 
+    def columnValues(self):
+        """
+        Evaluates the plan on the cached messageList and returns the statistics.
+        """
+        return self.plan.evaluate(self.state)
 
+    def tick(self, record):
+        """
+        Writes the rows of the ticks before this record, then adds it to the windows of its pair.
+        """
+        time = record.timestamp.replace(tzinfo=timezone.utc).timestamp()
+        if self.nextTick is None:
+            self.nextTick = math.floor(time / self.tickInterval) + 1
+        self.emitTicks(time)
+
+        key = (record.receiverId, record.senderId)
+        state = self.pairStates.get(key)
+        if state is None:
+            state = self.pairStates[key] = self.plan.newState()
+        state.update(record)
+        self.pairLastRecords[key] = record
+        self.pairLastTimes[key] = time
+        self.lastRecordTime = max(self.lastRecordTime, time)
+
+    def emitTicks(self, time):
+        """
+        Writes the rows of all ticks at or before `time`.
+        """
+        while self.nextTick * self.tickInterval <= time:
+            tickTime = self.nextTick * self.tickInterval
+            if self.lastRecordTime < tickTime - self.tickMaxAge:
+                # all pairs are too old, skip to the interval of `time`.
+                self.nextTick = math.floor(time / self.tickInterval) + 1
+                break
+            self.writeTick(tickTime)
+            self.nextTick += 1
+
+    def writeTick(self, tickTime):
+        timestamp = datetime.fromtimestamp(tickTime, tz=timezone.utc).replace(tzinfo=None)
+        for key in sorted(self.pairStates):
+            if self.pairLastTimes[key] < tickTime - self.tickMaxAge:
+                continue
+            # the row carries the pair and label of the last record, at the time of the tick.
+            row = copy.copy(self.pairLastRecords[key])
+            row.timestamp = timestamp
+            if self.sampler is not None and not self.sampler.select(row, self.isComplete(self.pairStates[key])):
+                continue
+
+            columnValues = self.plan.evaluate(self.pairStates[key])
+            if _TRACER.enabled and _TRACER.sampled():
+                _TRACER.event("tick", time=timestamp.isoformat(), receiverId=key[0], senderId=key[1],
+                              record=str(self.pairLastRecords[key]), stats=dict(zip(self.plan.columnNames(), columnValues)))
+            if not self.binaryOutput:
+                columnValues = [timestamp.isoformat(), key[0], key[1]] + columnValues
+            self.sink.write(row, columnValues)
+
+    def checkpointState(self):
+        """
+        Returns the records in the windows as a json serializable list, see restoreCheckpointState.
+        """
+        if self.tickInterval is not None:
+            raise ValueError("the tick mode of RssiNeighbourMessageAggregator can't be checkpointed")
+        if self.sampler is not None:
+            raise ValueError("the sampled output of RssiNeighbourMessageAggregator can't be checkpointed")
+        return [str(record) for record in self.state.records]
 
+    def restoreCheckpointState(self, state):
+        """
+        Restores the windows from the output of checkpointState, so the next rows equal those of an uninterrupted run.
+        """
+        self.state = self.plan.newState()
+        for line in state or []:
+            self.update(RssiNeighbourMessageRecord.fromString(line))
 
+    def update(self, rssiNeighbourMessageRecord):
+        """
+        Add record to the end the list, removing oldest entry if max capacity is reached.
+        """
+        self.state.update(rssiNeighbourMessageRecord)
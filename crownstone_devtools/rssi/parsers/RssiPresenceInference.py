@@ -0,0 +1,178 @@
+import math
+import time
+from datetime import datetime, timezone
+
+from crownstone_devtools.rssi.RssiNeighbourMessageRecord import RssiNeighbourMessageRecord
+from crownstone_devtools.rssi.RssiFeatureSpec import RssiFeatureSpec
+from crownstone_devtools.rssi.PresenceModel import loadPresenceModel
+from crownstone_devtools.util.Tracing import getTracer
+
+_TRACER = getTracer("rssi.inference")
+
+
+class RssiPresenceInference:
+    """
+    Parses a csv file consisting of `RssiNeighbourMessageRecord`s and predicts a label, e.g. the room someone is in,
+    from the features of each (receiver, sender) pair.
+
+    The features are those of RssiNeighbourMessageAggregator (`featureSpec`), kept per pair, without the label
+    columns. Pairs that received a record are collected for `inferenceInterval` seconds of record time (default 1),
+    then the model predicts all of them in one call. The model is loaded from `inferenceModel`, see PresenceModel.
+
+    Output is csv: per prediction the time of the batch, the pair, the label of the last record of the pair (the
+    ground truth), the prediction and the latency of the predict call in ms. Pairs with missing features are
+    skipped unless `allowIncompleteRecords`. The accuracy over the labeled records and the latency percentiles are
+    printed after each file.
+    """
+    # the label of records that were recorded without a label
+    unlabeled = "None"
+
+    def __init__(self, *args, **kwargs):
+        self.verbose = kwargs.get('verbose', False)
+        self.debug = kwargs.get('debug', False)
+        self.dryRun = kwargs.get('dryRun', False)
+        self.allowIncompleteRecords = kwargs.get('allowIncompleteRecords', False)
+
+        featureSpec = kwargs.get('featureSpec', None)
+        self.featureSpec = RssiFeatureSpec.fromFile(featureSpec) if featureSpec else RssiFeatureSpec.default()
+        self.plan = self.featureSpec.compile()
+        planColumnNames = self.plan.columnNames()
+        # the label statistics are categorical, like in the typed sinks.
+        self.featureIndices = [i for i, name in enumerate(planColumnNames) if not name.endswith("_label")]
+        self.featureNames = [planColumnNames[i] for i in self.featureIndices]
+
+        self.model = loadPresenceModel(kwargs.get('inferenceModel'))
+        if self.model.featureNames is not None and self.model.featureNames != self.featureNames:
+            raise ValueError(F"the model was trained on other features than the feature spec gives: "
+                             F"{len(self.model.featureNames)} model features, {len(self.featureNames)} spec features")
+        self.np = self.model.np
+
+        self.interval = float(kwargs.get('inferenceInterval', None) or 1.0)
+        if self.interval <= 0:
+            raise ValueError(F"inference interval must be positive, got {self.interval}")
+
+        # used by FeatureExtractor to open the output file
+        self.binaryOutput = False
+        self.outputExtension = None
+
+        # (receiverId, senderId) -> window state and last record, kept across files.
+        self.pairStates = {}
+        self.pairLastRecords = {}
+        self.updatedPairs = set()
+        # batches are predicted at multiples of the interval, counted as ticks like RssiFeatureMatrixPivot.
+        self.nextTick = None
+        self.resetStatistics()
+
+    def resetStatistics(self):
+        self.predictions = 0
+        self.labeledPredictions = 0
+        self.correctPredictions = 0
+        self.incompleteVectors = 0
+        # latency of every predict call in seconds, and its batch size.
+        self.latencies = []
+        self.batchSizes = []
+
+    def columnNames(self):
+        return ["timestamp", "receiverId", "senderId", "label", "prediction", "latency_ms"]
+
+    def run(self, inFile, outFile):
+        """
+        loads lines in inFile, updates the features of each pair and writes the predictions to outFile.
+        """
+        if self.verbose:
+            print("Running RssiPresenceInference")
+
+        self.resetStatistics()
+        self.output(F"# {', '.join(self.columnNames())}", outFile)
+
+        for line in inFile:
+            if not line.strip() or line[0] == "#":
+                # predictions are made per batch, comments can't be placed.
+                continue
+
+            try:
+                record = RssiNeighbourMessageRecord.fromString(line)
+            except ValueError as e:
+                print("Error: Failed to construct RssiNeighbourMessageRecord")
+                print(e)
+                print(F"line: \'{line}\'")
+
+                if self.debug:
+                    raise
+                continue
+
+            recordTime = record.timestamp.replace(tzinfo=timezone.utc).timestamp()
+            if self.nextTick is None:
+                self.nextTick = math.floor(recordTime / self.interval) + 1
+            if recordTime >= self.nextTick * self.interval:
+                self.predictBatch(self.nextTick * self.interval, outFile)
+                self.nextTick = math.floor(recordTime / self.interval) + 1
+
+            key = (record.receiverId, record.senderId)
+            state = self.pairStates.get(key)
+            if state is None:
+                state = self.pairStates[key] = self.plan.newState()
+            state.update(record)
+            self.pairLastRecords[key] = record
+            self.updatedPairs.add(key)
+
+        if self.updatedPairs:
+            # the batch of the interval of the last record.
+            self.predictBatch(self.nextTick * self.interval, outFile)
+            self.nextTick += 1
+
+        self.printStatistics()
+
+    def predictBatch(self, batchTime, outFile):
+        """
+        Predicts the pairs that were updated since the previous batch, with one call to the model.
+        """
+        keys = []
+        vectors = []
+        for key in sorted(self.updatedPairs):
+            columnValues = self.plan.evaluate(self.pairStates[key])
+            vector = [math.nan if columnValues[i] in ("", None) else columnValues[i] for i in self.featureIndices]
+            if not self.allowIncompleteRecords and any(math.isnan(value) for value in vector):
+                self.incompleteVectors += 1
+                continue
+            keys.append(key)
+            vectors.append(vector)
+        self.updatedPairs = set()
+        if not keys:
+            return
+
+        features = self.np.array(vectors, dtype=self.np.float32)
+        startTime = time.perf_counter()
+        labels = self.model.predict(features)
+        latency = time.perf_counter() - startTime
+        self.latencies.append(latency)
+        self.batchSizes.append(len(keys))
+
+        timestamp = datetime.fromtimestamp(batchTime, tz=timezone.utc).replace(tzinfo=None).isoformat()
+        for key, prediction in zip(keys, labels):
+            label = str(self.pairLastRecords[key].labelchr)
+            self.predictions += 1
+            if label != self.unlabeled:
+                self.labeledPredictions += 1
+                self.correctPredictions += label == prediction
+            self.output(F"{timestamp},{key[0]},{key[1]},{label},{prediction},{latency * 1000:.3f}", outFile)
+            if _TRACER.enabled and _TRACER.sampled():
+                _TRACER.event("prediction", time=timestamp, receiverId=key[0], senderId=key[1], label=label,
+                              prediction=prediction, batchSize=len(keys), latency_ms=latency * 1000)
+
+    def printStatistics(self):
+        if not self.predictions:
+            print(F"RssiPresenceInference made no predictions, {self.incompleteVectors} incomplete feature vectors")
+            return
+        latencies = sorted(self.latencies)
+        percentile = lambda p: latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+        accuracy = F"{100 * self.correctPredictions / self.labeledPredictions:.1f}%" if self.labeledPredictions else "-"
+        print(F"RssiPresenceInference: {self.predictions} predictions in {len(latencies)} batches, "
+              F"accuracy {accuracy} over {self.labeledPredictions} labeled, "
+              F"{self.incompleteVectors} incomplete feature vectors skipped")
+        print(F"    predict latency per batch p50 {percentile(50):.3f} ms, p99 {percentile(99):.3f} ms, "
+              F"per prediction {1000 * sum(latencies) / self.predictions:.4f} ms")
+
+    def output(self, outputline, outFile):
+        if not self.dryRun:
+            print(outputline, file=outFile)
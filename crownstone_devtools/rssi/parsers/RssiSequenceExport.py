@@ -0,0 +1,151 @@
+import json
+from array import array
+from datetime import timezone
+
+from crownstone_devtools.rssi.RssiNeighbourMessageRecord import RssiNeighbourMessageRecord
+
+
+class RssiPairSequence:
+    """
+    The records of one (receiver, sender) pair, in compact arrays.
+    """
+    __slots__ = ["rssis", "timeDeltas", "msgNumberGaps", "labels", "lastTime", "lastMsgNumber"]
+
+    def __init__(self):
+        self.rssis = array("b")
+        self.timeDeltas = array("f")
+        self.msgNumberGaps = array("B")
+        self.labels = array("h")
+        self.lastTime = None
+        self.lastMsgNumber = None
+
+
+class RssiSequenceExport:
+    """
+    Parses a csv file consisting of `RssiNeighbourMessageRecord`s into a dataset of record sequences, for models
+    that take the last `sequenceLength` records of a pair instead of aggregated features.
+
+    Every record is stored once: the records of a pair are contiguous, and an index lists the start of every
+    window of `sequenceLength` records that lies within one pair. A window is then a view on the arrays, see
+    RssiSequenceDataset, so the file grows with the number of records rather than with the number of windows.
+
+    The output is an uncompressed .npz archive, so each member can be memory mapped. Members:
+        rssis: int8, records x 3, 0 when the channel was not received.
+        timeDeltas: float32, seconds since the previous record of the pair, 0 for the first.
+        msgNumberGaps: uint8, messages missing since the previous record of the pair, 0 for the first.
+        labels: int16, index in labelNames of the label of the record.
+        labelNames: the labels, in order of first appearance.
+        pairs: int64, pairs x 4: receiverId, senderId, first record, number of records.
+        windowStarts: int64, the first record of every window.
+        schema.json: the sequence length and the member names.
+    """
+    # msgNumber is an uint8
+    msgNumberRange = 256
+
+    def __init__(self, *args, **kwargs):
+        self.verbose = kwargs.get('verbose', False)
+        self.debug = kwargs.get('debug', False)
+        self.dryRun = kwargs.get('dryRun', False)
+        self.sequenceLength = int(kwargs.get('sequenceLength', None) or 16)
+        if self.sequenceLength < 1:
+            raise ValueError(F"sequence length must be at least 1, got {self.sequenceLength}")
+
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("RssiSequenceExport requires numpy, install it with: pip install numpy")
+        self.np = numpy
+
+        # used by FeatureExtractor to open the output file
+        self.binaryOutput = True
+        self.outputExtension = "npz"
+
+    def run(self, inFile, outFile):
+        """
+        loads lines in inFile, and writes the sequences of all pairs to outFile.
+        """
+        if self.verbose:
+            print("Running RssiSequenceExport")
+
+        # (receiverId, senderId) -> RssiPairSequence
+        pairs = {}
+        labelIndices = {}
+        for line in inFile:
+            if not line.strip() or line[0] == "#":
+                continue
+
+            try:
+                record = RssiNeighbourMessageRecord.fromString(line)
+            except ValueError as e:
+                print("Error: Failed to construct RssiNeighbourMessageRecord")
+                print(e)
+                print(F"line: \'{line}\'")
+
+                if self.debug:
+                    raise
+                continue
+
+            key = (record.receiverId, record.senderId)
+            sequence = pairs.get(key)
+            if sequence is None:
+                sequence = pairs[key] = RssiPairSequence()
+
+            recordTime = record.timestamp.replace(tzinfo=timezone.utc).timestamp()
+            if sequence.lastTime is None:
+                sequence.timeDeltas.append(0.0)
+                sequence.msgNumberGaps.append(0)
+            else:
+                sequence.timeDeltas.append(recordTime - sequence.lastTime)
+                sequence.msgNumberGaps.append((record.msgNumber - sequence.lastMsgNumber - 1) % self.msgNumberRange)
+            sequence.lastTime = recordTime
+            sequence.lastMsgNumber = record.msgNumber
+            sequence.rssis.extend(record.rssis)
+            sequence.labels.append(labelIndices.setdefault(str(record.labelchr), len(labelIndices)))
+
+        arrays = self.toArrays(pairs, list(labelIndices))
+        print(F"RssiSequenceExport: {len(arrays['labels'])} records of {len(pairs)} pairs, "
+              F"{len(arrays['windowStarts'])} windows of {self.sequenceLength} records")
+        if not self.dryRun:
+            self.write(outFile, arrays)
+
+    def toArrays(self, pairs, labelNames):
+        np = self.np
+        keys = sorted(pairs)
+        counts = [len(pairs[key].labels) for key in keys]
+        starts = np.cumsum([0] + counts[:-1], dtype=np.int64) if keys else np.empty(0, dtype=np.int64)
+
+        pairTable = np.empty((len(keys), 4), dtype=np.int64)
+        windowStarts = []
+        for index, key in enumerate(keys):
+            pairTable[index] = (key[0], key[1], starts[index], counts[index])
+            windowCount = counts[index] - self.sequenceLength + 1
+            if windowCount > 0:
+                windowStarts.append(np.arange(starts[index], starts[index] + windowCount, dtype=np.int64))
+
+        def concatenate(name, dtype):
+            parts = [np.frombuffer(getattr(pairs[key], name), dtype=dtype) for key in keys]
+            return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+        return {
+            "rssis": concatenate("rssis", np.int8).reshape(-1, 3),
+            "timeDeltas": concatenate("timeDeltas", np.float32),
+            "msgNumberGaps": concatenate("msgNumberGaps", np.uint8),
+            "labels": concatenate("labels", np.int16),
+            "labelNames": np.array(labelNames, dtype=str),
+            "pairs": pairTable,
+            "windowStarts": np.concatenate(windowStarts) if windowStarts else np.empty(0, dtype=np.int64),
+        }
+
+    def write(self, outFile, arrays):
+        import zipfile
+
+        schema = {
+            "sequenceLength": self.sequenceLength,
+            "members": list(arrays),
+        }
+        # stored, not compressed, so that the members can be memory mapped.
+        with zipfile.ZipFile(outFile, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+            archive.writestr("schema.json", json.dumps(schema))
+            for name, values in arrays.items():
+                with archive.open(F"{name}.npy", mode="w", force_zip64=True) as member:
+                    self.np.lib.format.write_array(member, values, allow_pickle=False)
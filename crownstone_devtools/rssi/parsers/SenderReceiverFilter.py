@@ -1,56 +1,134 @@
-from crownstone_devtools.rssi.RssiNeighbourMessageRecord import RssiNeighbourMessageRecord
+from crownstone_devtools.util.Tracing import getTracer
+
+_TRACER = getTracer("rssi.filter")
+
 
 class SenderReceiverFilter:
     """
     Filter that expects a file lines formatted as RssiNeighbourMessageRecord and outputs
     a file in the same format, keeping only the records with matching sender/receiver pairs.
-    Use None as wildcard.
+
+    `sender`, `receiver`: a crownstone id, or a list/set of ids. None is a wildcard.
+    `pairs`: list/set of (receiver, sender) tuples, either of which may be None as wildcard.
+        E.g. [(7, 6), (8, None)] keeps the messages from 6 to 7 and all messages received by 8.
+    A record is kept when it matches all of the given constraints.
+
+    Records are matched on their raw id fields, without parsing the rest of the line, and are forwarded unchanged.
+    The result is cached per distinct pair of id fields, so most lines cost a split and a dict lookup.
+    Lines with invalid ids are dropped; other fields are validated by the next parser.
     """
     def __init__(self, *args, **kwargs):
         self.sender = kwargs.get('sender', None)
         self.receiver = kwargs.get('receiver', None)
+        self.pairs = kwargs.get('pairs', None)
         self.verbose = kwargs.get('verbose', False)
         self.dryRun = kwargs.get('dryRun', False)
         self.debug = kwargs.get('debug', False)
         print("SenderReceiverFilter", self.__dict__)
 
-    def run(self, inFile, outFile):
+        self.senders = self.toIdSet(self.sender)
+        self.receivers = self.toIdSet(self.receiver)
+
+        # pairs, split by wildcard so that matching is a few set lookups.
+        self.exactPairs = None
+        self.pairReceivers = set()
+        self.pairSenders = set()
+        self.anyPair = False
+        if self.pairs is not None:
+            self.exactPairs = set()
+            for receiverId, senderId in self.pairs:
+                if receiverId is None and senderId is None:
+                    self.anyPair = True
+                elif senderId is None:
+                    self.pairReceivers.add(int(receiverId))
+                elif receiverId is None:
+                    self.pairSenders.add(int(senderId))
+                else:
+                    self.exactPairs.add((int(receiverId), int(senderId)))
+
+        # (receiverId, senderId) fields as they appear in the line -> whether the record matches.
+        self.matchedKeys = {}
+        self.passAll = self.senders is None and self.receivers is None and (self.pairs is None or self.anyPair)
+
+    @staticmethod
+    def toIdSet(ids):
+        if ids is None:
+            return None
+        if isinstance(ids, int):
+            return {ids}
+        return set(int(crownstoneId) for crownstoneId in ids)
+
+    @staticmethod
+    def parsePair(value):
+        """
+        Parses "receiver:sender" into a (receiver, sender) tuple, with "*" as wildcard. E.g. "7:6" or "8:*".
+        """
+        receiverId, separator, senderId = value.partition(":")
+        if not separator:
+            raise ValueError(F"pair must be formatted as receiver:sender, got {value}")
+        return (None if receiverId.strip() == "*" else int(receiverId),
+                None if senderId.strip() == "*" else int(senderId))
+
+    def matches(self, receiverId, senderId):
+        if self.receivers is not None and receiverId not in self.receivers:
+            return False
+        if self.senders is not None and senderId not in self.senders:
+            return False
+        if self.exactPairs is None or self.anyPair:
+            return True
+        return (receiverId, senderId) in self.exactPairs or receiverId in self.pairReceivers or senderId in self.pairSenders
+
+    def run(self, inFile, outFile, continued=False):
         """
         outputs lines in inPath to outPath if they match sender and receiver.
         Comments, lines starting with a #, are forwarded too.
+        continued: unused, the output has no header.
         """
         print("running SenderReceiverFilter")
+        write = outFile.write
         for line in inFile:
-            outputline = None
-
-            if not line.strip() or line[0] == "#":
-                outputline = line
-            else:
-                try:
-                    record = RssiNeighbourMessageRecord.fromString(line)
-                    if (self.sender is not None and self.sender != record.senderId) or \
-                            (self.receiver is not None and self.receiver != record.receiverId):
-                        # skip record, ids don't match
-                        outputline = None
-                    else:
-                        # accept record
-                        outputline = str(record)
-                except ValueError as e:
-                    errormessage = "Failed to construct RssiNeighbourMessageRecord"
-                    print(F"Error: {errormessage}")
-                    print(e)
-                    print(F"line: \'{line}\'")
-
-                    if self.debug:
-                        raise
-
-                    outputline = None
-
-            self.output(outputline,outFile)
+            if not line or line[0] == "#" or line.isspace():
+                self.output(line, outFile)
+                continue
+
+            if not self.passAll:
+                # timestamp, receiverId, senderId, rest of the record
+                fields = line.split(",", 3)
+                key = (fields[1], fields[2]) if len(fields) == 4 else None
+                matched = self.matchedKeys.get(key)
+                if matched is None:
+                    try:
+                        if key is None:
+                            raise ValueError(F"expected a record with at least 4 fields, got {len(fields)}")
+                        matched = self.matches(int(fields[1]), int(fields[2]))
+                    except ValueError as e:
+                        errormessage = "Failed to read the receiver and sender id of the record"
+                        print(F"Error: {errormessage}")
+                        print(e)
+                        print(F"line: \'{line}\'")
+
+                        if self.debug:
+                            raise
+                        continue
+                    self.matchedKeys[key] = matched
+                if not matched:
+                    continue
+
+            if not line.endswith("\n"):
+                line += "\n"
+            if not self.dryRun:
+                write(line)
+            if _TRACER.enabled and _TRACER.sampled():
+                _TRACER.event("forward", line=line.rstrip("\n"))
+
+    def checkpointState(self):
+        """ The filter has no state, see RssiNeighbourMessageAggregator.checkpointState. """
+        return None
+
+    def restoreCheckpointState(self, state):
+        pass
 
     def output(self, outputline, outFile):
         if outputline is not None:
             if not self.dryRun:
                 print(outputline, file=outFile)
-            if self.verbose:
-                print(outputline)
\ No newline at end of file
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+
+"""
+Client to show binary logs.
+"""
+import time
+import argparse
+import os
+import re
+import signal
+import sys
+import threading
+
+import logging
+
+from crownstone_devtools.logclient.LogFilter import LogFilter
+
+defaultLogStringsFile = os.path.abspath(f"{os.path.dirname(os.path.dirname(os.path.abspath(__file__)))}/../build/default/extracted_logs.json")
+
+bluenet_logs_version_compat = "1.2.0"
+
+
+def versionTuple(version):
+    """ Returns the leading numbers of a version string as tuple, e.g. "1.2.1-git" -> (1, 2, 1) """
+    return tuple(int(x) for x in re.findall(r"\d+", version.split('-')[0]))
+
+
+def checkBluenetLogsVersion(BluenetLogs):
+    try:
+        # When installed from source, the version is prepended with "-git".
+        bluenet_logs_version = BluenetLogs.__version__.split('-')[0]
+        if versionTuple(bluenet_logs_version) < versionTuple(bluenet_logs_version_compat):
+            print("Update BluenetLogs. There's a newer version available!")
+            print(f"Installed version: {bluenet_logs_version}, required version: {bluenet_logs_version_compat}")
+    except (AttributeError, ValueError):
+        print("Couldn't check version of BluenetLogs.")
+
+
+def createArgParser():
+    argParser = argparse.ArgumentParser(description="Client to show binary logs")
+    argParser.add_argument('--logStringsFile',
+                           '-l',
+                           dest='logStringsFileName',
+                           metavar='path',
+                           type=str,
+                           default=f"{defaultLogStringsFile}",
+                           help='The path of the file with the extracted logs on your system.')
+    argParser.add_argument('--device',
+                           '-d',
+                           dest='device',
+                           metavar='path',
+                           type=str,
+                           default=None,
+                           help='The UART device to use, for example: /dev/ttyACM0')
+    argParser.add_argument('--verbose',
+                           '-v',
+                           dest="verbose",
+                           action='store_true',
+                           help='Show verbose output')
+    argParser.add_argument('--plaintext',
+                           '-p',
+                           dest="plaintext",
+                           action='store_true',
+                           help='Also print plaintext logs')
+    argParser.add_argument('--raw',
+                           '-r',
+                           dest="raw",
+                           action='store_true',
+                           help='Show raw output (may result in interleaved print statements)')
+    argParser.add_argument('--hex',
+                           '-H',
+                           dest="hex",
+                           action='store_true',
+                           help='Show raw output as hex values')
+    LogFilter.addArguments(argParser)
+    argParser.add_argument('--no-decode',
+                           dest="noDecode",
+                           action='store_true',
+                           help="Don't decode and print the binary logs, e.g. to only collect --stats")
+    argParser.add_argument('--stats',
+                           dest="stats",
+                           action='store_true',
+                           help='Count messages and bytes per log statement, and regularly print the top statements')
+    argParser.add_argument('--stats-interval',
+                           dest="statsInterval",
+                           metavar='seconds',
+                           type=float,
+                           default=5.0,
+                           help='Seconds between two --stats tables, each table covers the last 6 intervals. Default: 5')
+    argParser.add_argument('--stats-top',
+                           dest="statsTop",
+                           metavar='N',
+                           type=int,
+                           default=20,
+                           help='Number of log statements in the --stats table. Default: 20')
+    argParser.add_argument('--stats-file',
+                           dest="statsFileName",
+                           metavar='path',
+                           type=str,
+                           default=None,
+                           help='Write the --stats summary of the whole run as json to this file, instead of printing it')
+    argParser.add_argument('--flight-recorder',
+                           dest="flightRecorderSize",
+                           metavar='SIZE',
+                           type=str,
+                           default=None,
+                           help="Don't decode and print the logs, but keep the last SIZE bytes of them (e.g. 64M) and only "
+                                "decode and write those to a file when a trigger fires: --trigger-regex, --trigger-line, "
+                                "SIGUSR1, pressing enter, or stopping the client")
+    argParser.add_argument('--flight-recorder-dir',
+                           dest="flightRecorderDir",
+                           metavar='path',
+                           type=str,
+                           default=".",
+                           help='Directory of the --flight-recorder dumps. Default: the current directory')
+    argParser.add_argument('--trigger-regex',
+                           dest="triggerRegex",
+                           metavar='regex',
+                           type=str,
+                           default=None,
+                           help='Dump the --flight-recorder when a line of plaintext output matches this regular expression')
+    argParser.add_argument('--trigger-line',
+                           dest="triggerLines",
+                           metavar='file:line',
+                           type=str,
+                           action='append',
+                           default=None,
+                           help='Dump the --flight-recorder when this log statement is received, e.g. cs_MeshCore.cpp:120. Can be repeated')
+    return argParser
+
+
+def readKeypresses(flightRecorder):
+    """ Dumps the flight recorder every time enter is pressed. """
+    for _ in sys.stdin:
+        flightRecorder.trigger("keypress")
+
+
+def main():
+    args = createArgParser().parse_args()
+
+    # The uart and log libs take a while to import, so only do that once we know they are needed.
+    from crownstone_uart import CrownstoneUart
+    from crownstone_uart.topics.SystemTopics import SystemTopics
+    from crownstone_uart.core.UartEventBus import UartEventBus
+    from bluenet_logs import BluenetLogs
+
+    checkBluenetLogsVersion(BluenetLogs)
+
+    if args.verbose:
+        logging.basicConfig(format='%(asctime)s %(levelname)-7s: %(message)s', level=logging.DEBUG)
+
+    logStringsFileName = args.logStringsFileName
+
+    print(f"Listening for logs on port {args.device}, and using \"{logStringsFileName}\" to find the log formats.")
+
+    # Init bluenet logs, it will listen to events from the Crownstone lib.
+    bluenetLogs = None
+    if not args.noDecode and not args.flightRecorderSize:
+        logFilter = LogFilter.fromArgs(args)
+        if logFilter.isEnabled():
+            # Drops logs that don't pass the filter before they are formatted.
+            from crownstone_devtools.logclient.FilteredBluenetLogs import FilteredBluenetLogs
+            bluenetLogs = FilteredBluenetLogs(logFilter)
+        else:
+            from crownstone_devtools.logclient.CompiledBluenetLogs import CompiledBluenetLogs
+            bluenetLogs = CompiledBluenetLogs()
+
+
+        # Set the dir containing the bluenet source code files.
+        bluenetLogs.setLogStringsFile(logStringsFileName)
+        if logFilter.isEnabled():
+            print(f"Showing {len(logFilter.allowedKeys)} of the log statements.")
+
+    logStatistics = None
+    if args.stats:
+        from crownstone_devtools.logclient.LogStatistics import LogStatistics
+        logStatistics = LogStatistics(logStringsFileName, interval=args.statsInterval, top=args.statsTop, summaryFileName=args.statsFileName)
+        logStatistics.subscribe()
+
+    flightRecorder = None
+    if args.flightRecorderSize:
+        from crownstone_devtools.logclient.FlightRecorder import FlightRecorder, parseSize, parseTriggerLine
+        flightRecorder = FlightRecorder(parseSize(args.flightRecorderSize),
+                                        logStringsFileName=logStringsFileName,
+                                        outputDirectory=args.flightRecorderDir,
+                                        plaintextRegex=args.triggerRegex,
+                                        triggerLines=[parseTriggerLine(value) for value in args.triggerLines or []])
+        flightRecorder.subscribe()
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: flightRecorder.trigger("signal"))
+        if sys.stdin.isatty():
+            threading.Thread(target=readKeypresses, args=(flightRecorder,), daemon=True).start()
+        print(f"Flight recorder keeps the last {flightRecorder.size} bytes of logs, press enter to dump them.")
+
+    def onRawDataReceived(data):
+        if args.hex:
+            for b in data:
+                print(f"{b:02X} ", end='', flush=True)
+        else:
+            for b in data:
+                print(chr(b), end='', flush=True)
+
+    if args.raw:
+        try:
+            UartEventBus.subscribe(SystemTopics.uartRawData, onRawDataReceived)
+        except AttributeError as e:
+            print("Failed enabling raw data printer. Are your crownstone python libs up to date?")
+
+    if args.plaintext and bluenetLogs is not None:
+        try:
+            bluenetLogs.printPlaintextLogs(True)
+        except AttributeError as e:
+            print("Failed enabling plaintext logging. Are your crownstone python libs up to date?")
+
+
+    # Init the Crownstone UART lib.
+    uart = CrownstoneUart()
+    uart.initialize_usb_sync(port=args.device)
+
+    # The try except part is just to catch a control+c to gracefully stop the libs.
+    try:
+        # Simply keep the program running.
+        while True:
+            time.sleep(0.1)
+            if logStatistics is not None:
+                logStatistics.tick()
+            if flightRecorder is not None:
+                flightRecorder.tick()
+
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("\nStopping UART..")
+        uart.stop()
+        print("Stopped")
+        if logStatistics is not None:
+            logStatistics.finish()
+        if flightRecorder is not None:
+            flightRecorder.dump("stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+"""The microapp make-helper."""
+
+import argparse
+import mmap
+import sys
+
+from crownstone_devtools.util.CRC import crc16ccitt, crc16ccittChunked
+
+from crownstone_devtools.util.MicroappBinaryHeaderPacket import MicroappBinaryHeaderPacket
+
+
+def createArgParser():
+    parser = argparse.ArgumentParser(description='Manipulate microapp binary')
+    parser.add_argument('-i', '--input',
+            help='The binary file to be processed. If no input is given, the fields will be set to dummy values.')
+    parser.add_argument('--in-place', dest='inPlace', action='store_true',
+            help='Write the header fields into the header of the input binary, instead of linking the microapp a second time with the generated .ld file. '
+                 'The binary is memory mapped, and the header is read back and checked after writing.')
+    parser.add_argument('output', nargs='?',
+            help='The .ld file to write output to. Optional with --in-place.')
+    return parser
+
+
+def patchHeaderInPlace(inputFilename):
+    """
+    Fills the header fields of the binary in inputFilename, and writes them into its header region.
+    The binary is memory mapped: the checksum is calculated over the body in chunks, and only the header bytes are written.
+    :return: the header that was written.
+    """
+    header = MicroappBinaryHeaderPacket()
+    headerSize = len(header.toBuffer())
+
+    with open(inputFilename, "r+b") as f, mmap.mmap(f.fileno(), 0) as binary:
+        size = len(binary)
+        if size < headerSize:
+            raise ValueError(f"{inputFilename} is {size} bytes, smaller than the header of {headerSize} bytes")
+        if size > 0xFFFF:
+            raise ValueError(f"{inputFilename} is {size} bytes, the size field of the header is only 16 bits")
+
+        # Fill fields from binary, as some fields are already set.
+        header.fromBuffer(binary[:headerSize])
+        print(f"Read header: {header}")
+
+        header.startOffset = headerSize
+        header.size = size
+        header.checksum = crc16ccittChunked(binary, start=headerSize)
+        # The header checksum is calculated with its own field set to 0, so the result doesn't depend on a previous run.
+        header.checksumHeader = 0
+        header.checksumHeader = crc16ccitt(header.toBuffer())
+        print(f"Final header: {header}")
+
+        binary[:headerSize] = bytes(header.toBuffer())
+        binary.flush()
+
+    validateHeader(inputFilename, header)
+    return header
+
+
+def validateHeader(inputFilename, expectedHeader):
+    """
+    Reads the header back from the file, and checks that it matches the expected header and its own checksum.
+    """
+    readHeader = MicroappBinaryHeaderPacket()
+    headerSize = len(readHeader.toBuffer())
+    with open(inputFilename, "rb") as f:
+        buf = f.read(headerSize)
+    readHeader.fromBuffer(buf)
+
+    if readHeader.toBuffer() != expectedHeader.toBuffer():
+        raise ValueError(f"Header read back from {inputFilename} differs from the written header: {readHeader}")
+
+    checksumHeader = readHeader.checksumHeader
+    readHeader.checksumHeader = 0
+    if crc16ccitt(readHeader.toBuffer()) != checksumHeader:
+        raise ValueError(f"Header checksum read back from {inputFilename} is invalid: {checksumHeader}")
+    print(f"Validated header of {inputFilename}")
+
+
+def main():
+    args = createArgParser().parse_args()
+
+    inputFilename=args.input
+    outputFilename=args.output
+
+    if args.inPlace:
+        if inputFilename is None:
+            print("--in-place requires an input binary")
+            sys.exit(1)
+        try:
+            header = patchHeaderInPlace(inputFilename)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        if outputFilename is not None:
+            writeLinkerFile(outputFilename, header)
+        return
+
+    if outputFilename is None:
+        print("An output file is required, unless --in-place is given")
+        sys.exit(1)
+
+    header = MicroappBinaryHeaderPacket()
+    if inputFilename != None:
+        # The input file includes the header.
+        with open(inputFilename, "rb") as f:
+            buf = f.read()
+
+        size = len(buf)
+
+        # Fill fields from binary, as some fields are already set.
+        header.fromBuffer(buf)
+        print(f"Read header: {header}")
+
+        # Set header fields that are not set yet.
+        headerSize = len(header.toBuffer())
+
+        header.startOffset = headerSize
+        header.size = len(buf)
+
+        # # Test value: remove on release:
+        # header.appBuildVersion = 987654321
+
+        header.checksum = crc16ccitt(buf[headerSize:])
+        print(f"Calculate header checksum from: {header} {header.toBuffer()}")
+        print_buf = bytearray(header.toBuffer())
+        print(print_buf)
+        header.checksumHeader = crc16ccitt(bytearray(header.toBuffer()))
+        print(f"Final header: {header}")
+
+    writeLinkerFile(outputFilename, header)
+
+
+def writeLinkerFile(outputFilename, header):
+    with open(outputFilename, "w") as outputFile:
+        outputFile.write(f"APP_BINARY_SIZE = {header.size};\n")
+        outputFile.write(f"CHECKSUM = {header.checksum};\n")
+        outputFile.write(f"CHECKSUM_HEADER = {header.checksumHeader};\n")
+        outputFile.write(f"APP_BUILD_VERSION = {header.appBuildVersion};\n")
+        outputFile.write(f"START_OFFSET = {header.startOffset};\n")
+        outputFile.write(f"HEADER_RESERVED = {header.reserved};\n")
+        outputFile.write(f"HEADER_RESERVED2 = {header.reserved2};\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -50,11 +50,28 @@ def crc16ccitt(data: bytearray or list, crc=None):
     else:
         crc = crc & 0xFFFF
 
-    for i in range(0, len(data)):
-        index = ((crc >> 8) ^ data[i]) & 0xFF
-        crc = (_crc16ccitt_table[index] ^ (crc << 8)) & 0xFFFF
+    table = _crc16ccitt_table
+    for byte in data:
+        crc = (table[((crc >> 8) ^ byte) & 0xFF] ^ (crc << 8)) & 0xFFFF
     return crc & 0xFFFF
 
+def crc16ccittChunked(data, start=0, chunkSize=65536, crc=None):
+    """
+    Calculates the CRC-16-CCITT for given data, chunk by chunk, so that a memory mapped file is never copied as a whole.
+    :param data:      data as bytes-like object, e.g. an mmap
+    :param start:     offset in data to start at
+    :param chunkSize: number of bytes per chunk
+    :param crc:       previous CRC
+    :return:          CRC, the same as crc16ccitt(data, crc)
+    """
+    view = memoryview(data)
+    try:
+        for chunkStart in range(start, len(view), chunkSize):
+            crc = crc16ccitt(view[chunkStart:chunkStart + chunkSize], crc)
+    finally:
+        view.release()
+    return crc16ccitt(b"", crc)
+
 # As indicated at http://srecord.sourceforge.net/crc16-ccitt.html this is the "bad" CRC
 # We are using what Nordic is using though...
 # Hence, there is no padding in the Nordic code... 
@@ -0,0 +1,198 @@
+"""
+Provides functions to compress log files and to read them back transparently.
+
+gzip and xz are always available, zstd requires the zstandard package.
+The compression modules are only imported when a compressed file is actually read or written.
+"""
+import io
+import os
+from pathlib import Path
+
+# Compression method -> file name suffix.
+compressionSuffixes = {
+    "gzip": ".gz",
+    "xz": ".xz",
+    "zstd": ".zst",
+}
+
+def zstdAvailable():
+    try:
+        import zstandard
+        return True
+    except ImportError:
+        return False
+
+def resolveCompression(method):
+    """
+    Returns the compression method to use for `method`, or None for no compression.
+    "auto" selects zstd when the zstandard package is installed, gzip otherwise.
+    """
+    if method in (None, "none"):
+        return None
+    if method == "auto":
+        return "zstd" if zstdAvailable() else "gzip"
+    if method not in compressionSuffixes:
+        raise ValueError(F"unknown compression method: {method}, expected one of {list(compressionSuffixes)}")
+    if method == "zstd" and not zstdAvailable():
+        raise ImportError("zstd compression requires zstandard, install it with: pip install zstandard")
+    return method
+
+def compressionOf(path):
+    """
+    Returns the compression method of the file, based on its suffix. None if it is not compressed.
+    """
+    for method, suffix in compressionSuffixes.items():
+        if str(path).endswith(suffix):
+            return method
+    return None
+
+def stripCompressionSuffix(path):
+    """
+    Returns path without its compression suffix, e.g. log.csv.gz -> log.csv
+    """
+    method = compressionOf(path)
+    if method is None:
+        return Path(path)
+    return Path(str(path)[:-len(compressionSuffixes[method])])
+
+def findLogFiles(directory, pattern):
+    """
+    Returns the sorted paths in directory matching the glob pattern, including compressed versions (e.g. log.csv.gz).
+    When both a file and its compressed version exist, only the uncompressed one is returned.
+    """
+    patterns = [pattern] + [pattern + suffix for suffix in compressionSuffixes.values()]
+    paths = {}
+    for p in patterns:
+        for path in Path(directory).expanduser().glob(p):
+            key = stripCompressionSuffix(path)
+            if key not in paths or compressionOf(path) is None:
+                paths[key] = path
+    return [paths[key] for key in sorted(paths)]
+
+def openLogFile(path, mode="r"):
+    """
+    Opens a (possibly compressed) file as a text stream. Only reading is supported for compressed files.
+    """
+    method = compressionOf(path)
+    if method is None:
+        return open(path, mode)
+    if mode not in ("r", "rt"):
+        raise ValueError(F"compressed files can only be opened for reading, got mode {mode}")
+
+    if method == "gzip":
+        import gzip
+        return gzip.open(path, "rt")
+    if method == "xz":
+        import lzma
+        return lzma.open(path, "rt")
+
+    import zstandard
+    reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return io.TextIOWrapper(reader)
+
+def openLogFileAt(path, offset=0):
+    """
+    Opens a (possibly compressed) file as a binary stream, positioned `offset` bytes into its uncompressed content.
+    Compressed files are decompressed up to the offset, plain files are seeked.
+    """
+    method = compressionOf(path)
+    if method is None:
+        logFile = open(path, "rb")
+        logFile.seek(offset)
+        return logFile
+
+    if method == "gzip":
+        import gzip
+        logFile = gzip.open(path, "rb")
+    elif method == "xz":
+        import lzma
+        logFile = lzma.open(path, "rb")
+    else:
+        import zstandard
+        logFile = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True))
+
+    remaining = offset
+    while remaining > 0:
+        skipped = len(logFile.read(min(remaining, 1 << 20)))
+        if skipped == 0:
+            break
+        remaining -= skipped
+    return logFile
+
+def compressFile(path, method):
+    """
+    Compresses the file at path and removes the original. Returns the path of the compressed file.
+    The compressed file is written under a temporary name first, so it only appears when it is complete.
+    """
+    import shutil
+
+    path = Path(path)
+    compressedPath = Path(str(path) + compressionSuffixes[method])
+    temporaryPath = Path(str(compressedPath) + ".tmp")
+
+    with open(path, "rb") as inFile:
+        if method == "gzip":
+            import gzip
+            with gzip.open(temporaryPath, "wb") as outFile:
+                shutil.copyfileobj(inFile, outFile)
+        elif method == "xz":
+            import lzma
+            with lzma.open(temporaryPath, "wb") as outFile:
+                shutil.copyfileobj(inFile, outFile)
+        elif method == "zstd":
+            import zstandard
+            with open(temporaryPath, "wb") as outFile:
+                zstandard.ZstdCompressor().copy_stream(inFile, outFile)
+        else:
+            raise ValueError(F"unknown compression method: {method}")
+
+    os.replace(temporaryPath, compressedPath)
+    os.remove(path)
+    return compressedPath
+
+
+class BackgroundCompressor:
+    """
+    Compresses files on a worker thread, so that the caller is never blocked by it.
+    Call finish() to wait for all submitted files before the process exits.
+    """
+    def __init__(self, method, verbose=False):
+        import queue
+
+        self.method = resolveCompression(method)
+        self.verbose = verbose
+        self.queue = queue.Queue()
+        self.thread = None
+
+    def submit(self, path):
+        if self.method is None:
+            return
+        if self.thread is None:
+            import threading
+            self.thread = threading.Thread(target=self._run, name="BackgroundCompressor", daemon=True)
+            self.thread.start()
+        self.queue.put(Path(path))
+
+    def _run(self):
+        while True:
+            path = self.queue.get()
+            try:
+                if path is None:
+                    return
+                compressedPath = compressFile(path, self.method)
+                if self.verbose:
+                    print(F"compressed {path} -> {compressedPath}")
+            except OSError as e:
+                print(F"Failed to compress {path}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def finish(self):
+        """ waits until all submitted files are compressed and stops the worker thread. """
+        if self.thread is None:
+            return
+        if self.queue.unfinished_tasks:
+            print("waiting for log file compression to finish")
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
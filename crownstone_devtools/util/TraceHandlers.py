@@ -0,0 +1,53 @@
+"""
+The logging formatter and handler of the trace events, see Tracing.py.
+Only imported by configureTracing, so that logging isn't loaded while tracing is disabled.
+"""
+import json
+import logging
+import sys
+
+from crownstone_devtools.util.Tracing import TRACE_LOGGER_NAME
+
+
+class TraceJsonFormatter(logging.Formatter):
+    """
+    Formats a trace event as one json line. Values that json can't represent are written as their str().
+    """
+    def format(self, record):
+        event = {
+            "time": record.created,
+            "component": record.name[len(TRACE_LOGGER_NAME) + 1:],
+            "event": record.getMessage(),
+        }
+        event.update(getattr(record, "traceFields", {}))
+        return json.dumps(event, default=str)
+
+
+class TraceFileHandler(logging.Handler):
+    """
+    Writes formatted events to a file through a large buffer. Only flushed when the buffer is full and on close,
+    unlike logging.FileHandler which flushes every event.
+    """
+    def __init__(self, path, bufferSize=1 << 20):
+        super().__init__()
+        if path == "-":
+            self.stream = sys.stderr
+            self.ownsStream = False
+        else:
+            self.stream = open(path, "a", buffering=bufferSize)
+            self.ownsStream = True
+
+    def emit(self, record):
+        try:
+            self.stream.write(self.format(record) + "\n")
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        self.flush()
+        if self.ownsStream:
+            self.stream.close()
+        super().close()
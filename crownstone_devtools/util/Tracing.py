@@ -0,0 +1,175 @@
+"""
+Structured tracing of the processing of individual records, built on logging.
+
+Each component gets a Tracer, a logger below "crownstone_devtools.trace". Per record events are logged at DEBUG,
+per file or per stage events at INFO. The hot path only checks a flag:
+
+    _TRACER = getTracer("rssi.aggregator")
+    ...
+    if _TRACER.enabled and _TRACER.sampled():
+        _TRACER.event("row", line=lineNumber, stats=dict(zip(names, values)))
+
+`enabled` is False unless configureTracing enabled DEBUG for the component. `sampled` keeps 1 in `every`
+events, and at most one event per `interval` seconds, so a trace of a production size input stays small.
+
+The events are handed to a queue and written as json lines by a background thread, with a buffered file:
+    {"time": 1656763201.84, "component": "rssi.aggregator", "event": "row", "seq": 0, "line": 1, ...}
+"seq" counts the sampled and skipped events of the tracer, so gaps show the sampling.
+
+Every parser imports this module while tracing is usually disabled, so logging, its handlers and the queue are
+only imported by configureTracing. See TraceHandlers for the formatter and file handler.
+"""
+import atexit
+import time
+
+TRACE_LOGGER_NAME = "crownstone_devtools.trace"
+
+# logging.INFO, without importing logging.
+INFO = 20
+
+# component -> Tracer
+_tracers = {}
+# the listener of the configured handler, see configureTracing.
+_listener = None
+# sampling of the per record events, applies to all tracers.
+_sampleEvery = 1
+_sampleInterval = 0.0
+
+
+class Tracer:
+    __slots__ = ["component", "logger", "enabled", "every", "interval", "count", "nextTime"]
+
+    def __init__(self, component):
+        self.component = component
+        # the logger is only looked up once tracing is configured.
+        self.logger = None
+        self.refresh()
+
+    def refresh(self):
+        """
+        Updates the flag and sampling after the configuration changed.
+        """
+        self.enabled = False
+        if _listener is not None:
+            import logging
+            self.logger = logging.getLogger(F"{TRACE_LOGGER_NAME}.{self.component}")
+            self.enabled = self.logger.isEnabledFor(logging.DEBUG)
+        self.every = _sampleEvery
+        self.interval = _sampleInterval
+        self.count = -1
+        self.nextTime = 0.0
+
+    def sampled(self):
+        """
+        Returns True if the next per record event should be logged. Counts every call, check `enabled` first.
+        """
+        self.count += 1
+        if self.every > 1 and self.count % self.every:
+            return False
+        if self.interval > 0:
+            now = time.monotonic()
+            if now < self.nextTime:
+                return False
+            self.nextTime = now + self.interval
+        return True
+
+    def event(self, name, **fields):
+        """
+        Logs a per record event at DEBUG, call it after `enabled` and `sampled`.
+        """
+        fields["seq"] = self.count
+        self.logger.debug(name, extra={"traceFields": fields})
+
+    def info(self, name, **fields):
+        """
+        Logs a per file or per stage event at INFO. Not sampled.
+        """
+        if _listener is not None and self.logger.isEnabledFor(INFO):
+            self.logger.info(name, extra={"traceFields": fields})
+
+
+def getTracer(component):
+    """
+    Returns the Tracer of a component, e.g. "rssi.aggregator". Tracers are shared per component.
+    """
+    tracer = _tracers.get(component)
+    if tracer is None:
+        tracer = _tracers[component] = Tracer(component)
+    return tracer
+
+
+def parseTraceLevel(string):
+    """
+    Parses a command line level "component=LEVEL", or "LEVEL" for all components, into (component, level).
+    E.g. "rssi.aggregator=DEBUG", "rssi=INFO" or "INFO".
+    """
+    import logging
+
+    component, separator, level = string.rpartition("=")
+    level = level.strip().upper()
+    if not isinstance(logging.getLevelName(level), int):
+        raise ValueError(F"unknown level {level}, expected e.g. DEBUG or INFO")
+    return component.strip(), level
+
+
+def configureTracing(path, levels=None, every=1, interval=0.0):
+    """
+    Writes the trace events to `path` as json lines, "-" for stderr.
+    levels: component -> level name, e.g. {"": "INFO", "rssi.aggregator": "DEBUG"}. Components inherit the level
+        of their parent, "" is the default for all components, DEBUG if not given.
+    every, interval: per tracer, log 1 in `every` per record events, at most one per `interval` seconds.
+    """
+    global _listener, _sampleEvery, _sampleInterval
+    import logging
+    import logging.handlers
+    import queue
+    from crownstone_devtools.util.TraceHandlers import TraceFileHandler, TraceJsonFormatter
+
+    stopTracing()
+
+    if every < 1:
+        raise ValueError(F"trace sampling must keep 1 in at least 1 event, got {every}")
+    _sampleEvery = int(every)
+    _sampleInterval = float(interval or 0.0)
+
+    levels = dict(levels or {})
+    rootLogger = logging.getLogger(TRACE_LOGGER_NAME)
+    rootLogger.setLevel(levels.pop("", "DEBUG"))
+    # trace events only go to the trace file, not to handlers of the root logger.
+    rootLogger.propagate = False
+    for component, level in levels.items():
+        logging.getLogger(F"{TRACE_LOGGER_NAME}.{component}").setLevel(level)
+
+    fileHandler = TraceFileHandler(path)
+    fileHandler.setFormatter(TraceJsonFormatter())
+    rootLogger.addHandler(logging.handlers.QueueHandler(queue.SimpleQueue()))
+    _listener = logging.handlers.QueueListener(rootLogger.handlers[-1].queue, fileHandler)
+    _listener.start()
+    atexit.register(stopTracing)
+
+    for tracer in _tracers.values():
+        tracer.refresh()
+
+
+def stopTracing():
+    """
+    Writes the queued events, closes the trace file and disables all tracers.
+    """
+    global _listener
+    if _listener is None:
+        return
+    import logging
+    import logging.handlers
+
+    listener, _listener = _listener, None
+
+    rootLogger = logging.getLogger(TRACE_LOGGER_NAME)
+    for handler in list(rootLogger.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            rootLogger.removeHandler(handler)
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+    for tracer in _tracers.values():
+        tracer.refresh()
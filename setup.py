@@ -8,17 +8,25 @@ with open("README.md", "r") as fh:
 setup(
     name='crownstone-devtools',
     version="0.4.0",
-    packages=find_packages(exclude=["examples","testing"]),
+    packages=find_packages(exclude=["examples","testing","benchmarks"]),
     author="Crownstone B.V.",
     long_description=long_description,
     long_description_content_type="text/markdown",
     url="https://github.com/crownstone/crownstone-python-devtools",
     install_requires=list(package.strip() for package in open('requirements.txt')),
-    scripts=[
-        'crownstone_devtools/cs_microapp_create_header',
-        'crownstone_devtools/cs_bluenet_log_client',
-        'crownstone_devtools/cs_bluenet_extract_log_strings',
-    ],
+    entry_points={
+        'console_scripts': [
+            'cs_microapp_create_header=crownstone_devtools.scripts.cs_microapp_create_header:main',
+            'cs_bluenet_log_client=crownstone_devtools.scripts.cs_bluenet_log_client:main',
+            'cs_bluenet_extract_log_strings=crownstone_devtools.scripts.cs_bluenet_extract_log_strings:main',
+            'cs_rssi_neighbour_parser=crownstone_devtools.rssi.cs_rssi_neighbour_parser:main',
+            'cs_rssi_extract_features=crownstone_devtools.rssi.cs_rssi_extract_features:main',
+            'cs_rssi_rollup=crownstone_devtools.rssi.cs_rssi_rollup:main',
+        ],
+    },
+    package_data={
+        'crownstone_devtools.rssi': ['feature_spec.template.json'],
+    },
     classifiers=[
         'Programming Language :: Python :: 3.7'
     ],